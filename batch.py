@@ -0,0 +1,19 @@
+import src_py.controller.batch as batch
+import sys
+import argparse
+
+def main(arg):
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("proc", help="the processor the code will run on, can be 'cpu', 'opencl', 'cuda', or 'numpy'.")
+    parser.add_argument("manifest", help="manifest file; each line contains data file name and configuration file name.")
+    parser.add_argument("--processes", type=int, default=1, help="number of worker processes.")
+
+    args = parser.parse_args()
+    batch.batch_reconstruction(args.proc, args.manifest, args.processes)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
+
+#python batch.py 'opencl' 'scans.txt' --processes 2
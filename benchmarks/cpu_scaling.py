@@ -0,0 +1,63 @@
+"""
+This script measures how the reconstruction time scales with number of cpu cores. Each measurement runs in a new
+process bound to the first 1, 2, 4, ... cores, as the libraries set their number of threads when they start. The
+reconstruction is configured as in the iteration_time benchmark, and runs on synthetic data of standard sizes.
+
+usage: python -m benchmarks.cpu_scaling [proc] [size ...]
+"""
+
+import sys
+import os
+import time
+import tempfile
+import multiprocessing as mp
+import src_py.controller.reconstruction as rec
+import src_py.utilities.cpu_resources as cpu
+from benchmarks.iteration_time import CONFIG, synthetic_data
+
+
+def core_counts(max_cores):
+    counts = []
+    count = 1
+    while count < max_cores:
+        counts.append(count)
+        count *= 2
+    counts.append(max_cores)
+    return counts
+
+
+def iteration_time(proc, size, conf, cores):
+    data = synthetic_data(size)
+    start = time.time()
+    image, support, coherence, errors = rec.fast_module_reconstruction(proc, data, conf, seed=0, cores=cores)
+    return (time.time() - start) / len(errors)
+
+
+def main(proc, sizes):
+    cores = cpu.get_cores()
+    fd, conf = tempfile.mkstemp(suffix='.conf')
+    with os.fdopen(fd, 'w') as f:
+        f.write(CONFIG)
+    try:
+        print ('%6s %6s %12s %8s %10s' % ('size', 'cores', 'iter [s]', 'speedup', 'efficiency'))
+        for size in sizes:
+            base = None
+            for count in core_counts(len(cores)):
+                pool = mp.Pool(1)
+                try:
+                    elapsed = pool.apply(iteration_time, (proc, size, conf, cores[:count]))
+                finally:
+                    pool.close()
+                    pool.join()
+                if base is None:
+                    base = elapsed
+                speedup = base / elapsed
+                print ('%6i %6i %12.4f %8.2f %10.2f' % (size, count, elapsed, speedup, speedup / count))
+    finally:
+        os.remove(conf)
+
+
+if __name__ == '__main__':
+    proc = sys.argv[1] if len(sys.argv) > 1 else 'numpy'
+    sizes = [int(size) for size in sys.argv[2:]] if len(sys.argv) > 2 else [64, 128, 256]
+    main(proc, sizes)
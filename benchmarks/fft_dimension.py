@@ -0,0 +1,133 @@
+"""
+This script justifies the choice of get_fft_dim, the smallest supported dimension not smaller than the given one.
+For each dimension it times the dimension chosen from the table of the backend, and the next supported dimensions,
+which are the alternatives a cost model of the prime factors may choose. The report counts the dimensions for which
+the chosen dimension is the fastest, and compares the total time of the chosen dimensions with the total time of the
+fastest candidates, which is the most any choice among the candidates could gain.
+The numpy and scipy backends time a 3D FFT of a complex64 cube with the numpy module table. The compiled backends
+(cpu, opencl, cuda) time a reconstruction iteration with their own table, and are skipped if the bridge is not built.
+
+usage: python -m benchmarks.fft_dimension [start] [stop] [backend ...]
+"""
+
+import sys
+import os
+import time
+import tempfile
+import numpy as np
+import src_py.utilities.utils as ut
+
+
+# number of supported dimensions following the chosen one that are timed as alternatives
+ALTERNATIVES = 2
+# the dimensions of the data are even, as in the reconstruction
+STEP = 2
+
+
+def numpy_time(dim, repeat=3):
+    arr = np.ones((dim, dim, dim), dtype=np.complex64)
+    return min(_elapsed(np.fft.fftn, arr) for i in range(repeat))
+
+
+def scipy_time(dim, repeat=3):
+    import scipy.fft as sfft
+    arr = np.ones((dim, dim, dim), dtype=np.complex64)
+    return min(_elapsed(sfft.fftn, arr) for i in range(repeat))
+
+
+def _elapsed(fft, arr):
+    start = time.time()
+    fft(arr)
+    return time.time() - start
+
+
+def bridge_timer(proc):
+    """
+    Returns function timing an iteration of reconstruction with the compiled bridge, or None if it is not built.
+    """
+    # the reconstruction module is loaded only for the compiled backends
+    try:
+        import src_py.controller.reconstruction as rec
+        from benchmarks.iteration_time import CONFIG, synthetic_data
+    except (ImportError, SyntaxError):
+        # the reconstruction module runs on Python 2 only
+        return None
+    if rec.get_bridge(proc) is None:
+        return None
+
+    def iteration_time(dim):
+        fd, conf = tempfile.mkstemp(suffix='.conf')
+        with os.fdopen(fd, 'w') as f:
+            f.write(CONFIG)
+        try:
+            start = time.time()
+            errors = rec.fast_module_reconstruction(proc, synthetic_data(dim), conf, seed=0)[3]
+            return (time.time() - start) / len(errors)
+        finally:
+            os.remove(conf)
+
+    return iteration_time
+
+
+def get_timer(backend):
+    if backend == 'numpy':
+        return numpy_time
+    if backend == 'scipy':
+        try:
+            import scipy.fft
+        except ImportError:
+            return None
+        return scipy_time
+    return bridge_timer(backend)
+
+
+def candidates(dim, table):
+    """
+    Returns the dimension chosen by get_fft_dim, followed by the next supported dimensions of the same step.
+    """
+    dims = [ut.get_fft_dim(dim, STEP, table)]
+    while len(dims) <= ALTERNATIVES:
+        dims.append(ut.get_fft_dim(dims[-1] + STEP, STEP, table))
+    return dims
+
+
+def main(start, stop, backends):
+    for backend in backends:
+        timer = get_timer(backend)
+        if timer is None:
+            print (backend + ': not available, skipped')
+            continue
+        # the python backends use the dimensions supported by the numpy module
+        table = backend if backend in ut.FFT_PRIMES else 'numpy'
+        print (backend + ': primes ' + str(ut.FFT_PRIMES[table]))
+        header = '  '.join('%16s' % 'alternative [s]' for i in range(ALTERNATIVES))
+        print ('%6s %16s  %s' % ('dim', 'chosen [s]', header))
+        times = {}
+        chosen_best = 0
+        count = 0
+        chosen_time = 0
+        fastest_time = 0
+        for dim in range(start, stop + 1, STEP):
+            dims = candidates(dim, table)
+            for d in dims:
+                if d not in times:
+                    times[d] = timer(d)
+            fastest = min(dims, key=lambda d: times[d])
+            count += 1
+            if fastest == dims[0]:
+                chosen_best += 1
+            chosen_time += times[dims[0]]
+            fastest_time += times[fastest]
+            print ('%6i %5i %10.4f  %s' % (dim, dims[0], times[dims[0]],
+                                            '  '.join('%5i %9.4f%s' % (d, times[d], '*' if d == fastest else ' ')
+                                                      for d in dims[1:])))
+        print (backend + ': the chosen dimension is the fastest for ' + str(chosen_best) + ' of ' + str(count) +
+               ' dimensions, * marks a faster alternative; the fastest candidates take ' +
+               '%.1f' % (100.0 * (chosen_time - fastest_time) / chosen_time) + '% less time in total')
+
+
+if __name__ == '__main__':
+    start = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    stop = int(sys.argv[2]) if len(sys.argv) > 2 else 160
+    backends = sys.argv[3:] if len(sys.argv) > 3 else ['numpy', 'scipy', 'cpu', 'opencl', 'cuda']
+    main(start, stop, backends)
@@ -0,0 +1,62 @@
+"""
+This script measures time of a reconstruction iteration on synthetic data for the given processor types. The
+reconstruction runs ER and HIO iterations with support updates and partial coherence, as configured below.
+Run it on two versions of the code to compare per-iteration time. The ER/HIO update step is significant for large
+arrays, compare it with sizes 256 and 512.
+
+usage: python -m benchmarks.iteration_time [size] [proc ...]
+"""
+
+import sys
+import os
+import time
+import tempfile
+import numpy as np
+import src_py.controller.reconstruction as rec
+
+
+CONFIG = '''
+algorithm_sequence = ((1, ("ER",20), ("HIO", 20)), (1,("ER",20)))
+twin = 2;
+beta = .9;
+support_triggers = ((1, 5));
+support_type = "GAUSS";
+support_threshold = 0.1;
+support_sigma = 1;
+support_area = [.5,.5,.5];
+partial_coherence_type = "LUCY";
+partial_coherence_triggers = ((20, 10));
+partial_coherence_iteration_num = 20;
+partial_coherence_normalize = true;
+partial_coherence_roi = [16,16,16];
+partial_coherence_kernel = [16,16,16];
+avg_iterations = 10;
+'''
+
+
+def synthetic_data(size):
+    obj = np.zeros((size, size, size), dtype=np.complex64)
+    quarter = size // 4
+    obj[quarter:size - quarter, quarter:size - quarter, quarter:size - quarter] = np.exp(0.3j)
+    return np.fft.fftshift(np.abs(np.fft.fftn(obj))).astype(np.float32)
+
+
+def main(size, procs):
+    data = synthetic_data(size)
+    fd, conf = tempfile.mkstemp(suffix='.conf')
+    with os.fdopen(fd, 'w') as f:
+        f.write(CONFIG)
+    try:
+        for proc in procs:
+            start = time.time()
+            image, support, coherence, errors = rec.fast_module_reconstruction(proc, data, conf, seed=0)
+            elapsed = time.time() - start
+            print (proc + ': ' + str(len(errors)) + ' iterations, ' + str(elapsed / len(errors)) + ' seconds per iteration')
+    finally:
+        os.remove(conf)
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    procs = sys.argv[2:] if len(sys.argv) > 2 else ['numpy']
+    main(size, procs)
@@ -0,0 +1,82 @@
+"""
+This script compares peak memory of the data preparation with the peak memory of the previous implementation, where
+each step materialized a new full size array.
+Each preparation is run in a separate process, and the reported value is the increase of the process peak resident
+set size over the size after the raw data was created.
+
+usage: python -m benchmarks.prepare_data_memory [size]
+"""
+
+import sys
+import resource
+import multiprocessing as mp
+import numpy as np
+import scipy.fftpack as sf
+import src_py.utilities.utils as ut
+import src_py.controller.reconstruction as rec
+
+
+class Config:
+    amp_threshold = 2.0
+    aliens = ((10, 10, 10, 20, 20, 20),)
+    binning = [2, 2, 1]
+    center_shift = [0, 0, 0]
+    zero_pad = [0, 4, 0]
+
+
+def legacy_binning(array, binsizes):
+    data_dims = array.shape
+    for ax in range(len(binsizes)):
+        cut_slices = range(data_dims[ax] - data_dims[ax] % binsizes[ax], data_dims[ax])
+        array = np.delete(array, cut_slices, ax)
+
+    binned_array = array
+    new_shape = list(array.shape)
+    for ax in range(len(binsizes)):
+        if binsizes[ax] > 1:
+            new_shape[ax] = binsizes[ax]
+            new_shape.insert(ax, array.shape[ax] // binsizes[ax])
+            binned_array = np.reshape(binned_array, tuple(new_shape))
+            binned_array = np.sum(binned_array, axis=ax+1)
+            new_shape = list(binned_array.shape)
+    return binned_array
+
+
+def legacy_prepare_data(config_map, data):
+    data = np.where(data < config_map.amp_threshold, 0, data)
+    for alien in config_map.aliens:
+        data[alien[0]:alien[3], alien[1]:alien[4], alien[2]:alien[5]] = 0
+    data = legacy_binning(data, config_map.binning)
+    data = np.sqrt(data)
+    data = ut.get_centered(data, tuple(config_map.center_shift))
+    data = ut.zero_pad(data, tuple(config_map.zero_pad))
+    return sf.fftshift(data)
+
+
+def measure(prepare, size, result_q):
+    data = np.random.randint(0, 1000, (size, size, size)).astype(np.uint16)
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    prepared = prepare(Config, data)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result_q.put((peak - base, data.nbytes, prepared.shape))
+
+
+def run(prepare, size):
+    result_q = mp.Queue()
+    p = mp.Process(target=measure, args=(prepare, size, result_q))
+    p.start()
+    result = result_q.get()
+    p.join()
+    return result
+
+
+def main(arg):
+    size = int(arg[0]) if len(arg) > 0 else 256
+    for name, prepare in (('legacy', legacy_prepare_data), ('fused', rec.prepare_data)):
+        peak_kb, input_bytes, shape = run(prepare, size)
+        print ('%s: peak rss increase %.1f MB (%.2f x raw data), prepared shape %s' %
+               (name, peak_kb / 1024.0, peak_kb * 1024.0 / input_bytes, str(shape)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
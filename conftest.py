@@ -0,0 +1 @@
+# the repository root is added to the path by pytest, so the tests import the src_py package
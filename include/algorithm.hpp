@@ -9,7 +9,13 @@ using namespace af;
 
 class Algorithm
 {
+protected:
+    // the reconstruction the algorithm is currently run on
+    Reconstruction * rec;
+
 public:   
+    virtual ~Algorithm() {}
+
     // Using strategy pattern. The RunAlgorihm calls sequence of methods
     // overridden by concrete classes
     void RunAlgorithm(Reconstruction * reconstruction);
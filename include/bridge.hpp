@@ -12,20 +12,45 @@
 #include "vector"
 #include "string"
 #include "common.h"
+#include "manager.hpp"
 
+// The Bridge passes the data between python and the calculation module. The buffers are contiguous C buffers owned by
+// the caller (numpy arrays on the python side). The input buffers are read directly, and the results are copied
+// directly into the buffers provided by the caller, so no intermediate vectors are created.
 class Bridge
 {
+private:
+// The manager owned by this instance, so each bridge runs own calculations
+Manager mgr;
+
 public:
-void StartCalcWithGuess(std::vector<float> data_buffer_r, std::vector<float> guess_buffer_r, std::vector<float> guess_buffer_i, std::vector<int> dim, const std::string & config);
+void StartCalcWithGuess(d_type * data_buffer_r, d_type * guess_buffer_r, d_type * guess_buffer_i, std::vector<int> dim, const std::string & config);
+void StartCalcWithGuessSupport(d_type * data_buffer_r, d_type * guess_buffer_r, d_type * guess_buffer_i, float * support_buffer, std::vector<int> dim, const std::string & config);
 
-void StartCalc(std::vector<float> data_buffer_r, std::vector<int> dim, std::string const & config);
-void StartCalcMultiple(std::vector<float> data_buffer_r, std::vector<int> dim, std::string const & config, int nu_threads);
+void StartCalc(d_type * data_buffer_r, std::vector<int> dim, std::string const & config);
+void StartCalcMultiple(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, int nu_threads);
+void StartCalcWithSeed(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, unsigned int seed);
+void StartCalcGenerations(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, int generations, int population);
+void Resume(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, std::string const & checkpoint_file);
+void SetCheckpoints(bool enabled);
 
-std::vector<float> GetSupportV();
-std::vector<d_type> GetCoherenceV();
-std::vector<d_type> GetImageR();
-std::vector<d_type> GetImageI();
+void GetSupport(float * support_buffer);
+int GetCoherenceSize();
+void GetCoherence(d_type * coherence_buffer);
+void GetImageR(d_type * image_buffer_r);
+void GetImageI(d_type * image_buffer_i);
+std::vector<int> GetSupportBounds();
+void GetImageBox(d_type * image_buffer_r, d_type * image_buffer_i);
 std::vector<d_type> GetErrors();
+std::vector<d_type> GetGenerationErrors();
+std::vector<double> GetGenerationTimes();
+std::vector<int> GetMetricIterations();
+std::vector<std::string> GetMetricNames();
+std::vector<double> GetMetricValues();
+void GetProgress(std::vector<int> & iterations, std::vector<d_type> & errors);
+bool HasStatistics();
+void GetAmplitudeVariance(d_type * variance_buffer);
+void GetAveragePhase(d_type * phase_buffer);
  
 };
 
@@ -9,8 +9,12 @@
 #ifndef common_h
 #define common_h
 
-// defines the type of the data; can be float or double. The def_type will get replaced when running initializing script.
-typedef def_type d_type;
+// defines the type of the data; can be float or double. The DATA_TYPE is defined by each bridge module, as the engine
+// is built once for each precision.
+#ifndef DATA_TYPE
+#define DATA_TYPE float
+#endif
+typedef DATA_TYPE d_type;
 const int nD = 3;
 
 
@@ -41,6 +45,18 @@ const int ALGORITHM_GAUSS_PERCENT = 19;
 const int ALGORITHM_PERCENT_AUTO = 20;
 const int ALGORITHM_GAUSS_MINAREA = 21;
 
+// diagnostics levels; with NONE no metrics are calculated, BASIC adds metrics calculated once per iteration or on
+// triggers, DETAILED adds intermediate norms in each iteration
+const int DIAGNOSTICS_NONE = 0;
+const int DIAGNOSTICS_BASIC = 1;
+const int DIAGNOSTICS_DETAILED = 2;
+
+// reasons the iterations were stopped before the configured number of iterations
+const int STOP_NONE = 0;
+const int STOP_CONVERGED = 1;
+const int STOP_DIVERGED = 2;
+const int STOP_TIME_BUDGET = 3;
+
 const int REGULARIZED_AMPLITUDE_NONE = 0;
 const int REGULARIZED_AMPLITUDE_GAUSS = 1;
 const int REGULARIZED_AMPLITUDE_POISSON = 2;
@@ -0,0 +1,46 @@
+//
+//  diagnostics.hpp
+//  ArrayFire-OpenCL
+//
+
+#ifndef diagnostics_hpp
+#define diagnostics_hpp
+
+#include "vector"
+#include "string"
+
+// This class collects diagnostic metrics of a reconstruction. The metrics are calculated only if the configured
+// diagnostics level enables them, so with the default level no reductions are done for diagnostics. The metrics are
+// kept in a ring buffer of configured capacity, the oldest metrics are overwritten.
+class Diagnostics
+{
+private:
+    int level;
+    int capacity;
+    // index of the next record, and number of records in the buffer
+    int next;
+    int count;
+    std::vector<int> iterations;
+    std::vector<std::string> names;
+    std::vector<double> values;
+
+    // Returns buffer index of the i-th oldest record.
+    int GetIndex(int i);
+
+public:
+    Diagnostics(int diagnostics_level, int buffer_capacity);
+
+    // Returns true if metrics of the given level are collected. The metric should be calculated only if this
+    // returns true.
+    bool IsEnabled(int metric_level);
+
+    // Records a metric calculated at the iteration.
+    void Record(int iteration, std::string name, double value);
+
+    // Return the recorded iterations, names and values, from the oldest.
+    std::vector<int> GetIterations();
+    std::vector<std::string> GetNames();
+    std::vector<double> GetValues();
+};
+
+#endif /* diagnostics_hpp */
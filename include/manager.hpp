@@ -12,52 +12,180 @@
 #include "vector"
 #include "string"
 #include "common.h"
+#include "progress.hpp"
 
 class Reconstruction;
+namespace af {
+    class array;
+    class dim4;
+}
+
+// number of FFT plans kept by ArrayFire
+const int FFT_PLAN_CACHE_SIZE = 16;
 
 class Manager
 {
 private:
-    // A worker instance managed by the Manager
+    // A worker instance managed by the Manager. The instance is kept after the calculations are completed, so the
+    // results can be retrieved.
     Reconstruction *rec;
 
+    // A queue of errors reported by the reconstructions while they run.
+    Progress progress;
+
+    // If false, the single reconstructions do not write the configured checkpoints.
+    bool checkpoints;
+
+    // The best error and calculation time in seconds of each generation, when running generations
+    std::vector<d_type> generation_errors;
+    std::vector<double> generation_times;
+
+    // Releases the worker instance from previous calculations, if any.
+    void ReleaseReconstruction();
+
+    // Initializes the given worker instance and runs the reconstruction. It is run in a separate thread when multiple
+    // reconstructions are calculated concurrently.
+    static void Iterate(Reconstruction * reconstruction);
+
+    // Runs the reconstruction on the given worker instance that was already initialized or reset.
+    static void Continue(Reconstruction * reconstruction);
+
+    // Creates given number of worker instances for the data, each starting from a random guess generated with
+    // consecutive seeds.
+    std::vector<Reconstruction *> CreatePopulation(af::array data, std::string const & config, int size, unsigned int seed);
+
+    // Runs the given function on each worker instance in a separate thread, and waits until all are completed.
+    static void RunConcurrently(std::vector<Reconstruction *> & reconstructions, void (*run)(Reconstruction *));
+
+    // Returns the error of the last iteration of the given worker instance.
+    static d_type FinalError(Reconstruction * reconstruction);
+
+    static bool CompareErrors(Reconstruction * first, Reconstruction * second);
+
+    // Orders the worker instances by the final error, the best first.
+    static void Rank(std::vector<Reconstruction *> & reconstructions);
+
+    // Returns an image combining the best image with the other image. The amplitudes are geometric mean of the
+    // amplitudes, and the phases are average of the phases.
+    static af::array Breed(af::array best, af::array other);
+
+    // Creates a worker instance for the given data and guess, and runs the reconstruction. If the support is not
+    // empty, it replaces the configured initial support.
+    void Run(af::array data, af::array guess, af::array support, const std::string & config);
+
+    // Returns a complex random array of given dimensions, generated with the given seed.
+    af::array RandomGuess(af::dim4 dims, unsigned int seed);
+
 public:
+    Manager();
+
+    ~Manager();
+
     // This method starts calculations. The Manager uses workers to perform the calculations. The parameters define
     // calculations type.
     // This method takes data, real and imaginary guess for the reconstruction algorithm. The dim parameter conveys the
     // data and guess dimensions, since the data and guess are passed in a c-like buffer.
     // The config parameter defines configuration file.
-    void StartCalc(std::vector<d_type> data_buffer_r, std::vector<d_type> guess_buffer_r, std::vector<d_type> guess_buffer_i, std::vector<int> dim, const std::string & config);
+    void StartCalc(d_type * data_buffer_r, d_type * guess_buffer_r, d_type * guess_buffer_i, std::vector<int> dim, const std::string & config);
+
+    // This method starts calculations the same way as the method above, and the initial support is given in the
+    // support buffer of data size instead of the configured support area. It is used to continue from an image and
+    // support calculated at lower resolution.
+    void StartCalc(d_type * data_buffer_r, d_type * guess_buffer_r, d_type * guess_buffer_i, float * support_buffer, std::vector<int> dim, const std::string & config);
 
     // This method starts calculations. The Manager uses workers to perform the calculations. The parameters define
     // calculations type.
     // This method takes data, for the reconstruction algorithm. To perform the reconstruction the code will generate 
     // the guess parameter. The dim parameter conveys data dimensions, since the data is passed in a c-like buffer.
     // The config parameter defines configuration file.
-    void StartCalc(std::vector<d_type> data_buffer_r, std::vector<int> dim, std::string const & config);
+    void StartCalc(d_type * data_buffer_r, std::vector<int> dim, std::string const & config);
 
     // This method starts calculations. The Manager uses workers to perform the calculations. The parameters define
     // calculations type. 
     // This method is aimed for multi-threaded calculations. User defines number of threads through parameter.
+    // Each thread runs an independent reconstruction from a different random guess, and the reconstruction with the
+    // smallest final error is kept as the result.
     // This method takes data, for the reconstruction algorithm. To perform the reconstruction the code will generate 
     // the guess parameter. The dim parameter conveys data dimensions, since the data is passed in a c-like buffer.
     // The config parameter defines configuration file.
-    void StartCalc(std::vector<d_type> data_buffer_r, std::vector<int> dim, std::string const & config, int nu_threads);
+    void StartCalc(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, int nu_threads);
+
+    // This method starts calculations the same way as the method above that does not take guess. The random guess is
+    // generated with the given seed, so independent runs on the same data (i.e. multiple starts) can be reproduced.
+    void StartCalcWithSeed(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, unsigned int seed);
+
+    // This method runs the reconstruction in generations. In each generation a population of reconstructions is run
+    // concurrently. After each generation the reconstructions are ranked by final error, and each of the images is
+    // replaced by the image bred from the best image and itself. The next generation starts from the bred images, and
+    // the images are kept on the device between generations. The best reconstruction of last generation is the result.
+    // Throws std::invalid_argument if the population is smaller than one.
+    void StartCalcGenerations(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, int generations, int population);
 
-    // This method returns calculation results. The returned buffer contains a real part of reconstructed image.
-    std::vector<d_type> GetImageR();
+    // This method resumes a reconstruction from the checkpoint file written by an interrupted single reconstruction
+    // of the same data and configuration. The iterations continue after the iteration at which the checkpoint was
+    // saved, and the results are the same as from uninterrupted reconstruction.
+    // Throws std::invalid_argument if the checkpoint does not match the data dimensions or precision, and
+    // af::exception if the checkpoint file cannot be read.
+    void Resume(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, std::string const & checkpoint_file);
+
+    // This method enables or disables writing the configured checkpoints by the following single reconstructions; they
+    // are enabled by default. They are disabled when other processes run reconstructions with the same configuration,
+    // i.e. the starts of multi-start reconstruction, as they would write to the same file.
+    void SetCheckpoints(bool enabled);
+
+    // This method copies calculation results into the given buffer. The buffer receives a real part of reconstructed
+    // image, and must be of data size.
+    void GetImageR(d_type * image_buffer_r);
  
-    // This method returns calculation results. The returned buffer contains a imaginary part of reconstructed image.
-    std::vector<d_type> GetImageI();
+    // This method copies calculation results into the given buffer. The buffer receives a imaginary part of
+    // reconstructed image, and must be of data size.
+    void GetImageI(d_type * image_buffer_i);
+
+    // This method returns the bounding box of the final support, the beginning and end (exclusive) of each dimension.
+    // The reconstructed image is zero outside of the box.
+    std::vector<int> GetSupportBounds();
+
+    // This method copies the real and imaginary part of the reconstructed image within the support bounding box into
+    // the given buffers, which must be of the box size.
+    void GetImageBox(d_type * image_buffer_r, d_type * image_buffer_i);
  
     // This method returns calculation results. The returned vector contains error values for each iteration.
     std::vector<d_type> GetErrors();
  
-    // This method returns final support array.
-    std::vector<float> GetSupportV();
+    // This method returns the best final error in each generation.
+    std::vector<d_type> GetGenerationErrors();
+
+    // This method returns calculation time in seconds of each generation.
+    std::vector<double> GetGenerationTimes();
+
+    // These methods return the iterations, names and values of diagnostic metrics collected by the reconstruction,
+    // from the oldest. The metrics are collected only if enabled by diagnostics_level configuration parameter.
+    std::vector<int> GetMetricIterations();
+    std::vector<std::string> GetMetricNames();
+    std::vector<double> GetMetricValues();
+
+    // This method moves the errors reported by the running reconstructions since the last call to the given vectors.
+    // It can be called from another thread while the calculations run.
+    void GetProgress(std::vector<int> & iterations, std::vector<d_type> & errors);
+
+    // This method returns true if the variance of amplitudes and average phase were collected, i.e. the avg_statistics
+    // configuration parameter is set and averaging iterations were run.
+    bool HasStatistics();
+
+    // These methods copy the variance of amplitudes and average phase over the averaging iterations into the given
+    // buffer, which must be of data size. They are copied only if the statistics were collected.
+    void GetAmplitudeVariance(d_type * variance_buffer);
+    void GetAveragePhase(d_type * phase_buffer);
+
+    // This method copies final support array into the given buffer. The buffer must be of data size.
+    void GetSupport(float * support_buffer);
+
+    // This method returns number of elements in final coherence array, or zero if coherence was not calculated.
+    int GetCoherenceSize();
 
-    // This method returns final coherence array.
-    std::vector<d_type> GetCoherenceV();
+    // This method copies final coherence array into the given buffer. The buffer must be of size returned by
+    // GetCoherenceSize.
+    void GetCoherence(d_type * coherence_buffer);
 
 };
 
@@ -11,6 +11,8 @@
 
 #include "common.h"
 #include "vector"
+#include "map"
+#include "string"
 #include "arrayfire.h"
 
 using namespace af;
@@ -32,18 +34,75 @@ typedef struct Trigger_setting trigger_setting;
 class Reconstruction;
 class Support;
 class PartialCoherence;
+namespace libconfig {
+    class Setting;
+}
 
 // This class holds parameters defining the reconstruction process. The parameters are set based on configuration file.
 // Methods of this class are getters.
 class Params
 {
 private:
-    std::vector<int> ParseTriggers(std::string trigger_name);
+    // maps algorithm name to algorithm number
+    std::map<std::string, int> algorithm_id_map;
+    // vector holding algorithm run sequence, where algorithm run is a pair of algorithm and number of iterations
+    std::vector<alg_switch> alg_switches;
+
+    std::string data_type;
+
+    //use the matlab order (fft/ifft in modulus projector)
+    bool matlab_order;
+
+    // amplitude threshold
+    d_type amp_threshold;
+    bool amp_threshold_fill_zeros;
+
+    d_type phase_min;
+    d_type phase_max;
+    float beta;
+
+    // support
+    Support *support_attr;
+    PartialCoherence *partial_coherence;
+
+    // number of iterates to average
+    int avg_iterations;
+    // if true, the variance of amplitudes and average phase are accumulated with the averaged amplitudes
+    bool avg_statistics;
+    // if true, the errors, averages and support convolution are accumulated in double precision, while the
+    // iterations run in d_type
+    bool mixed_precision;
+
+    // calculated number of iterations
+    int number_iterations;
+
+    int twin;
+
+    int regularized_amp;
+    int gc;
+    int diagnostics_level;
+    int diagnostics_capacity;
+    int error_batch;
+
+    // early stopping criteria; each is disabled when zero
+    int convergence_window;
+    float convergence_threshold;
+    float divergence_factor;
+    double time_budget;
+
+    // checkpoint file, and number of iterations between checkpoints; no checkpoints are written if zero
+    std::string checkpoint_file;
+    int checkpoint_interval;
+
+    std::vector<int> ParseTriggers(std::string trigger_name, const libconfig::Setting & root);
     void BuildAlgorithmMap();
 
 public:
     // Constructor. Takes in configuration file, parses the configuration and sets the parameters accordingly.
     Params(const char* config_file, const dim4 data_dim);
+
+    // Destructor. Releases the Support and PartialCoherence objects created by this instance.
+    ~Params();
     
     // returns data type (float/double). Used by python code
     std::string GetDataType();
@@ -78,6 +137,12 @@ public:
     // Returns iteration number at which the amplitudes are averaged.
     int GetAvgIterations();
 
+    // Returns true if the variance of amplitudes and average phase are collected during averaging iterations.
+    bool IsAvgStatistics();
+
+    // Returns true if the errors, averages and support convolution are accumulated in double precision.
+    bool IsMixedPrecision();
+
     // Returns iteration number at which the "twin" gets zeroed out.
     int GetTwin();
 
@@ -92,6 +157,35 @@ public:
     // Returns number of iterations between calling garbage collection.
     int GetGC();
 
+    // Returns the diagnostics level, one of DIAGNOSTICS_* constants.
+    int GetDiagnosticsLevel();
+
+    // Returns the number of diagnostic metrics kept.
+    int GetDiagnosticsCapacity();
+
+    // Returns number of iterations after which the errors are copied from device.
+    int GetErrorBatch();
+
+    // Returns number of iterations over which the relative change of error is compared to the convergence
+    // threshold, or zero if the convergence is not checked.
+    int GetConvergenceWindow();
+
+    // Returns the relative change of error over the convergence window below which the iterations are stopped.
+    float GetConvergenceThreshold();
+
+    // Returns the factor of the minimal error above which the iterations are considered diverging and are stopped,
+    // or zero if the divergence is not checked.
+    float GetDivergenceFactor();
+
+    // Returns time in seconds after which the iterations are stopped, or zero if there is no time limit.
+    double GetTimeBudget();
+
+    // Returns name of the file the reconstruction state is saved to.
+    std::string GetCheckpointFile();
+
+    // Returns number of iterations between checkpoints, or zero if the checkpoints are not written.
+    int GetCheckpointInterval();
+
 };
 
 
@@ -3,11 +3,10 @@
 #define pcdi_hpp
 
 #include "vector"
+#include "common.h"
+#include "arrayfire.h"
 
 //class Reconstruction;
-namespace af {
-    class array;
-}
 
 class PartialCoherence
 {
@@ -22,6 +21,17 @@ private:
     int iteration_num;
     bool clip;
 
+    af::array kernel_array;
+    af::array roi_amplitudes_prev;
+    af::array roi_data_abs;
+    d_type sum_roi_data;
+    af::dim4 roi_dims;
+    af::dim4 dims;
+    // dimensions of FFT used to convolve the amplitudes with the kernel, and the kernel spectrum; the spectrum is
+    // calculated when the kernel changes
+    af::dim4 conv_dims;
+    af::array kernel_spectrum;
+
     void DeconvLucy(af::array image, af::array filter, int iter_num);
     void OnTrigger(af::array abs_image);
     void TuneLucyCoherence(af::array);
@@ -29,14 +39,25 @@ private:
     std::vector<int> GetRoi();
     int * GetKernel();
     af::array fftConvolve(af::array arr, af::array kernel);
+    // returns the FFT dimensions used to convolve arrays of the given dimensions
+    af::dim4 GetConvolutionDims(af::dim4 dims_input, af::dim4 dims_kernel);
+    // returns the spectrum of the kernel zero padded to the FFT dimensions
+    af::array GetKernelSpectrum(af::array kernel, af::dim4 fft_dims);
+    // convolves the array with the kernel given by its spectrum
+    af::array ConvolveSpectrum(af::array arr, af::array spectrum, af::dim4 fft_dims, af::dim4 dims_kernel);
 
 public:
     PartialCoherence(std::vector<int> roi, int * kernel, std::vector<int> partial_coherence_trigger, int alg, bool pcdi_normalize, int pcdi_iter, bool pcdi_clip);
+    ~PartialCoherence();
     void Init(af::array data);
     void SetPrevious(af::array abs_amplitudes);
     std::vector<int> GetTriggers();
     af::array ApplyPartialCoherence(af::array abs_image, int current_iteration);
     af::array GetKernelArray();
+    // appends the coherence kernel and previous amplitudes to the checkpoint file, and restores them from the file;
+    // the restore must be called after Init
+    void SaveCheckpoint(const char * filename);
+    void LoadCheckpoint(const char * filename);
 };
 
 #endif /* pcdi_hpp */
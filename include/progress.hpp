@@ -0,0 +1,34 @@
+//
+//  progress.hpp
+//  ArrayFire-OpenCL
+//
+
+#ifndef progress_hpp
+#define progress_hpp
+
+#include "vector"
+#include "mutex"
+#include "common.h"
+
+// This class is a queue of errors reported by reconstructions while they run. The reconstructions push the errors
+// when they are copied from the device, and the caller takes them from another thread, so the progress can be
+// observed without synchronizing with the calculations.
+class Progress
+{
+private:
+    std::mutex mtx;
+    std::vector<int> iterations;
+    std::vector<d_type> errors;
+
+public:
+    // Adds errors of consecutive iterations, starting at the first_iteration.
+    void Push(int first_iteration, const std::vector<d_type> & batch);
+
+    // Moves the queued iterations and errors to the given vectors. The queue is empty after this call.
+    void Pop(std::vector<int> & iterations_out, std::vector<d_type> & errors_out);
+
+    // Removes the queued errors.
+    void Clear();
+};
+
+#endif /* progress_hpp */
@@ -10,24 +10,90 @@
 #define state_hpp
 
 #include "vector"
+#include "map"
 #include "common.h"
+#include "arrayfire.h"
 
 class Params;
 class Reconstruction;
 class Algorithm;
-namespace af {
-    class array;
-}
+class Progress;
 
 // This class maintain the state of the reconstruction process.
 class State
 {
 private:
+    // a reference to params object
+    Params *params;
+
+    // current iteration
+    int current_iter;
+    // number of configured iterations for reconstruction
+    int total_iter_num;
+
+    // The vector of errors indexed by iteration
+    std::vector<d_type> errors;
+    // The errors of last iterations are kept on the device, and copied to the errors vector in batches, so the
+    // iterations do not wait for the error calculation
+    af::array error_buffer;
+    int buffered_errors;
+    int error_batch;
+    // a queue the copied errors are reported to, may be NULL
+    Progress *progress;
+
+    // current algorithm
+    Algorithm * current_alg;
+    // current index of index switches vector
+    int alg_switch_index;
+
+    // mapping of algorithm id to an Algorithm object
+    std::map<int, Algorithm*> algorithm_map;
+
+    // a flag indicating whether to update support
+    bool update_support;
+    // current index in support_triggers vector
+    int support_triggers_index;
+
+    // partial coherence state
+    // a flag indicating whether to update partial coherence
+    bool run_convolution;
+    bool update_kernel;
+    // current index in support_partial_coherence vector
+    int partial_coherence_triggers_index;
+
+    bool averaging;
+
+    bool apply_twin;
+    // iteration at which the twin is applied, moved into the final iterations if the iterations stop early
+    int twin_iter;
+
+    // early stopping state
+    int stop_reason;
+    d_type min_error;
+    // set when min_error holds an error, as zero is a valid error
+    bool has_min_error;
+    af::timer start_time;
+    // time in seconds the iterations ran before they were resumed from a checkpoint
+    double elapsed_before;
+
     void MapAlgorithmObject(int alg_id);
 
+    // Checks the errors copied from device against the convergence and divergence criteria.
+    void CheckConvergence();
+
+    // Ends the iterations early. A diverged reconstruction ends after the current iteration. Otherwise the
+    // iterations continue with the last algorithm of the sequence for the averaging iterations, and the twin is
+    // applied in the first of them if it was not applied yet.
+    void StopEarly(int reason);
+
+    // Copies the buffered errors from device to the errors vector, and reports them to progress. The convergence is
+    // not checked here, as the errors are also flushed for the checkpoints.
+    void FlushErrors();
+
 public:
-    // Constructor. Takes pointer to the Param object. Uses the Param object to set the initial values.
-    State(Params *params);
+    // Constructor. Takes pointer to the Param object. Uses the Param object to set the initial values. The errors are
+    // reported to progress, if not NULL.
+    State(Params *params, Progress *progress = NULL);
     
     // Needs destructor to free allocated memory.
     ~State();
@@ -63,11 +129,21 @@ public:
     // Returns the difference of current iteration and iteration of averaging start
     bool IsAveragingIteration();
     
-    // Stores the error
-    void RecordError(d_type error);
+    // Stores the error given as one element array. The error stays on the device until a batch of errors is
+    // collected, or the iterations end.
+    void RecordError(af::array error);
     
     // Returns vector containing errors
     std::vector<d_type> GetErrors();
+
+    // Returns the reason the iterations were stopped early, one of STOP_* constants.
+    int GetStopReason();
+
+    // Appends the iteration counters and errors to the checkpoint file.
+    void SaveCheckpoint(const char * filename);
+
+    // Restores the iteration counters and errors from the checkpoint file. It must be called after Init.
+    void LoadCheckpoint(const char * filename);
 };
 
 
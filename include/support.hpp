@@ -19,6 +19,10 @@ class Support
 {
 private:
     af::array support_array;
+    // bounding box of the support, the beginning and end (exclusive) of each dimension
+    std::vector<int> bounds;
+    // gaussian distribution in unshifted frequency order, half of the first dimension; the convolution runs in the
+    // type of the distribution
     af::array distribution;   
     std::vector<int> triggers;
     int algorithm;
@@ -27,15 +31,28 @@ private:
     int sigma;
     int twin;
     af::array GaussConvFft(af::array ds_image);
+    // calculates the bounding box of the support array
+    void UpdateBounds();
     
 public:
-    Support(const dim4 data_dim, std::vector<int> area, float threshold, bool threshold_adjust, int sigma, std::vector<int> support_triggers, int alg);
+    Support(const dim4 data_dim, std::vector<int> area, float threshold, bool threshold_adjust, int sigma, std::vector<int> support_triggers, int alg, bool double_convolution=false);
     void Update(const af::array ds_image);
     std::vector<int> GetTriggers();
     int GetTriggerAlgorithm();
     int GetSigma();
     float GetThreshold();
     af::array GetSupportArray(bool twin=false);
+    // replaces the support array, i.e. with support of an image calculated at lower resolution
+    void SetSupportArray(af::array support);
+    // returns the bounding box of the support, the beginning and end (exclusive) of each dimension; if the support is
+    // empty, the box is the whole array
+    std::vector<int> GetBounds();
+    // returns the fraction of the array points that are in support; the support is summed, so this is synchronized
+    // with the device
+    d_type GetFillFraction();
+    // appends the support array to the checkpoint file, and restores it from the file
+    void SaveCheckpoint(const char * filename);
+    void LoadCheckpoint(const char * filename);
 };
 
 #endif /* support_hpp */
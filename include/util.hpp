@@ -3,6 +3,7 @@
 
 #include "arrayfire.h"
 #include "common.h"
+#include <vector>
 
 namespace af {
     class array;
@@ -12,12 +13,18 @@ class Utils
 {
 public:
     // This method takes in an array dimension and returns a new number (i.e. dimension) that is not
-    // smaller than the given value, and is supported by opencl library (i.e. divisible by powers of 2, 3, and 5 only)
-    static int GetDimension(int dim);
+    // smaller than the given value, is spaced from it by multiple of step, and is supported by FFT library of the
+    // active backend (i.e. divisible by powers of 2, 3, and 5 only, and also 7 on cpu). The smallest such dimension is
+    // returned, as get_fft_dim in Python utils does.
+    static int GetDimension(int dim, int step=1);
 
-    // This is a helper method. Returns true if the given dimension is supported by opencl library, and false otherwise.
+    // This is a helper method. Returns true if the given dimension is supported by FFT library of the active backend,
+    // and false otherwise.
     static bool IsDimCorrect(int dim);
 
+    // Returns sorted table of dimensions supported by FFT library of the active backend. The table is calculated once.
+    static const std::vector<int> & GetSmoothNumbers();
+
     // Returns dim4 instance with given dimensions.
     static af::dim4 Int2Dim4(std::vector<int> dim);
 
@@ -25,12 +32,22 @@ public:
     // dimensions.
     // The method returns a cropped array to the given dimensions with the maximum centered and preserved values. 
     static af::array CropCenter(af::array arr, af::dim4 roi);
+
+    // Returns the index sequence of the given dimension of a box. The box is given by bounds vector containing the
+    // beginning and end (exclusive) of each dimension.
+    static af::seq BoxSeq(std::vector<int> bounds, int dim);
     
     static af::array fftshift(af::array arr);
     static af::array ifftshift(af::array arr);
     static af::array fft(af::array arr);
     static af::array ifft(af::array arr);
 
+    // Returns inverse FFT of the array multiplied by norm_factor. With norm_factor 1 the result is not normalized.
+    static af::array ifft(af::array arr, double norm_factor);
+
+    // Calculates FFT of the array in place, the result is multiplied by norm_factor.
+    static void FftInPlace(af::array & arr, double norm_factor);
+
     // This method takes a 3D array, and dimensions of sub-array. It is assumed that the dimensions do not extend array
     // dimensions.
     // The method returns the sub-array centered and preserved values.
@@ -62,7 +79,13 @@ public:
     static af::array PadAround(af::array arr, af::dim4 new_dims, d_type pad);
     static af::array PadAround(af::array arr, af::dim4 new_dims, int pad);
 
+    // Returns divident divided by divisor, the divident is returned where the divisor is zero. The operation is
+    // evaluated in a single kernel.
     static af::array GetRatio(af::array, af::array );
+
+private:
+    // calculates sorted numbers up to the table limit that have no other prime factors than 2, 3, 5, and optionally 7
+    static std::vector<int> CalcSmoothNumbers(bool with_seven);
 };
 
 #endif /* util_hpp */
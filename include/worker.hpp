@@ -12,6 +12,7 @@
 #include "stdio.h"
 #include "vector"
 #include "map"
+#include "string"
 #include "common.h"
 
 
@@ -19,6 +20,8 @@ class Params;
 class State;
 class Support;
 class PartialCoherence;
+class Diagnostics;
+class Progress;
 #include "arrayfire.h"
 
 using namespace af;
@@ -42,29 +45,67 @@ private:
     Support *support;
     // A reference to PartialCoherence
     PartialCoherence *partialCoherence;
+    // Diagnostics object constructed by the Reconstruction class, collects metrics enabled by configuration
+    Diagnostics *diagnostics;
+    // A reference to queue the errors are reported to, may be NULL
+    Progress *progress;
+
+    // data array, this is abs
+    af::array data;
+    int num_points;
+    d_type norm_data;
+    int current_iteration;
+    // the image being reconstructed
+    af::array ds_image;
+    // number of accumulated averaging iterations
+    int aver_count;
+    // running sums of amplitudes, squared amplitudes, and unit phase factors of the image over the averaging
+    // iterations; they are kept on the device, the squares and phase factors only if configured, in double precision
+    // if the accumulations run in mixed precision
+    // the sums cover only the bounding box of the support, given by aver_bounds; the box grows to the union of the
+    // support bounding boxes of the averaging iterations
+    std::vector<int> aver_bounds;
+    af::array aver_amplitudes;
+    af::array aver_sq_amplitudes;
+    af::array aver_phase_factors;
+    // if false, the configured checkpoints are not written
+    bool checkpoints;
+    // support array that replaces the configured initial support, if not empty
+    af::array initial_support;
 
     // This method returns sum of squares of all elements in the array
     double GetNorm(af::array arr);
+    // returns the array converted to double precision if the accumulations run in mixed precision, otherwise the
+    // array itself
+    af::array Accumulated(af::array arr);
+
+    // Records norm of the array as a metric with the given name, if the diagnostics level is enabled. Otherwise the
+    // norm is not calculated.
+    void RecordNorm(int level, const char * name, af::array arr);
     
     // This method calculates ratio of amplitudes and correction arrays replacing zero divider with 1.
     af::array GetRatio(af::array ar, af::array correction);
 
-    // Averages amplitudes
+    // Adds the amplitudes of the image to the running sums if this is an averaging iteration.
     void Average();
 
-    // vectorize support array at the end of iterations
-    void VectorizeSupport();
-
-    // vectorize coherence array at the end of iterations
-    void VectorizeCoherence();
+    // Grows the box of the running sums to the union with the given support bounds, padding the sums with zeros.
+    void GrowAverageBox(std::vector<int> bounds);
 
     d_type CalculateError();
+
+    // Saves the checkpoint if configured, and the current iteration completes a checkpoint interval.
+    void Checkpoint();
     
 public:
     // The class constructor takes data array, an image guess array in reciprocal space, and configuration file. The image guess
     // is typically generated as an complex random array. This image can be also the best outcome of previous calculations. The
     // data is saved and is used for processing. Configuration file is used to construct the Param object.
-    Reconstruction(af::array data, af::array guess, const char* config);
+    // The errors are reported to the progress queue, if not NULL.
+    Reconstruction(af::array data, af::array guess, const char* config, Progress *progress = NULL);
+
+    // Destructor. Releases the Params and State objects created by this instance.
+    ~Reconstruction();
     
     // This initializes the object. It must be called after object is created.
     // 1. it calculates and sets norm of the data
@@ -73,7 +114,15 @@ public:
     // 4. it normalizes the image with the first element of the data array
     // 5. it initializes other components (i.e. state)
     void Init();
+
+    // Sets the support array used instead of the configured initial support. It must be called before Init.
+    void SetInitialSupport(af::array support);
     
+    // This restarts the initialized object with a new image guess, without parsing the configuration again. The image
+    // is typically bred from the results of previous reconstructions, so it is not scaled as the random guess in Init.
+    // The iterations state is restarted, and the support is updated from the new image.
+    void Reset(af::array guess);
+
     // Each iteration of the image, is considered as a new state. This method executes one iteration.
     // First it calls Next() on State, which determines which algorithm should be run in this state. It also determines whether the
     // algorithms should be modified by applying convolution or updating support. This method returns false if all iterations have
@@ -88,15 +137,47 @@ public:
     // Runs one iteration of ER algorithm.
     void ModulusConstrainEr(af::array);
 
-    // Runs one iteration of HIO algorithm. 
+    // Runs one iteration of HIO algorithm. The update is a single select expression; other algorithms that combine
+    // the current and the raw image (e.g. RAAR, DM) should be written the same way, so ArrayFire evaluates them in
+    // one kernel.
     void ModulusConstrainHio(af::array);
 
     af::array GetImage();
+
+    // Enables or disables writing the configured checkpoints; they are enabled by default. The checkpoints are
+    // disabled when the reconstruction runs concurrently with others, in this or other processes, as they would write
+    // to the same file.
+    void SetCheckpoints(bool enabled);
+
+    // Saves the image, support, coherence, averaged amplitudes and iteration state to the file. The file is written
+    // under a temporary name and renamed, so an interrupted write does not destroy the previous checkpoint.
+    void SaveCheckpoint(std::string filename);
+
+    // Restores the state saved by SaveCheckpoint. It must be called after Init; the iterations then continue after
+    // the saved iteration. Throws std::invalid_argument if the saved image does not have the dimensions and type of
+    // the image, and af::exception if the file cannot be read.
+    void LoadCheckpoint(std::string filename);
+
+    // Returns the diagnostics with the collected metrics.
+    Diagnostics * GetDiagnostics();
     std::vector<d_type>  GetErrors();
-    std::vector<float> GetSupportVector();
-    std::vector<d_type> GetCoherenceVector();
-    std::vector<d_type> GetCoherenceVectorR();
-    std::vector<d_type> GetCoherenceVectorI();
+
+    // Returns final support array.
+    af::array GetSupportArray();
+
+    // Returns final coherence array, or an empty array if partial coherence is not configured.
+    af::array GetCoherenceArray();
+
+    // Returns the variance of amplitudes over the averaging iterations, or an empty array if the statistics are not
+    // configured.
+    af::array GetAmplitudeVariance();
+
+    // Returns the average phase over the averaging iterations, or an empty array if the statistics are not configured.
+    af::array GetAveragePhase();
+
+    // Returns the bounding box of the final support, the beginning and end (exclusive) of each dimension. The image
+    // is zero outside of the box.
+    std::vector<int> GetSupportBounds();
 
 };
 
@@ -18,12 +18,15 @@ read cuda_dir
 
 export LD_LIBRARY_PATH=$lc_dir/lib/.libs:/usr/local/lib:$af_dir/lib/:$cuda_dir/lib64:$cuda_dir/nvvm/lib64
 
-echo -n "enter data type (float/double) > "
-read data_type
-
+# the bridges are built for both float and double data type, and the precision is selected when running
 def='def_type'
-sed -i 's?'$def'?'$data_type'?g' src_py/cyth/*.pyx
-sed -i 's?'$def'?'$data_type'?g' include/common.h
+for proc in cpu opencl cuda
+do
+    for data_type in float double
+    do
+        sed 's?'$def'?'$data_type'?g' src_py/cyth/bridge_$proc.pyx > src_py/cyth/bridge_${proc}_$data_type.pyx
+    done
+done
 
 
 python setup.py build_ext --inplace
@@ -1,10 +1,28 @@
+import os
 from distutils.core import setup
 from distutils.extension import Extension
+from distutils.command.build_ext import build_ext
 from Cython.Build import cythonize
 
+
+class BuildExt(build_ext):
+    # the C++ sources are compiled into each bridge with its data type, so each bridge has its own build_temp, and the
+    # object files of one precision are not reused for the other
+    def build_extension(self, ext):
+        build_temp = self.build_temp
+        self.build_temp = os.path.join(build_temp, ext.name)
+        try:
+            build_ext.build_extension(self, ext)
+        finally:
+            self.build_temp = build_temp
+
+
+# the bridge modules of each precision are generated from the bridge_<processor>.pyx templates by init.sh
 setup(ext_modules = cythonize(
-           ["src_py/cyth/bridge_cpu.pyx", "src_py/cyth/bridge_opencl.pyx", "src_py/cyth/bridge_cuda.pyx",],
-           language="c++",)
+           ["src_py/cyth/bridge_%s_%s.pyx" % (proc, precision) for proc in ("cpu", "opencl", "cuda",)
+            for precision in ("float", "double",)],
+           language="c++",),
+      cmdclass = {'build_ext': BuildExt},
 )
 
 
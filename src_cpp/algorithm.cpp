@@ -3,8 +3,6 @@
 #include "worker.hpp"
 #include "common.h"
 
-Reconstruction * rec;
-
 void Algorithm::RunAlgorithm(Reconstruction * reconstruction)
 {
     rec = reconstruction;
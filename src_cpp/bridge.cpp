@@ -11,39 +11,64 @@
 #include "bridge.hpp"
 #include "manager.hpp"
 
-Manager mgr;
+void Bridge::StartCalcWithGuess(d_type * data_buffer_r, d_type * guess_buffer_r, d_type * guess_buffer_i, std::vector<int> dim, const std::string & config)
+{
+    mgr.StartCalc(data_buffer_r, guess_buffer_r, guess_buffer_i, dim, config);
+}
 
-void Bridge::StartCalcWithGuess(std::vector<float> data_buffer_r, std::vector<float> guess_buffer_r, std::vector<float> guess_buffer_i, std::vector<int> dim, const std::string & config)
+void Bridge::StartCalcWithGuessSupport(d_type * data_buffer_r, d_type * guess_buffer_r, d_type * guess_buffer_i, float * support_buffer, std::vector<int> dim, const std::string & config)
 {
-    std::vector<d_type> data_r(data_buffer_r.begin(), data_buffer_r.end());
-    std::vector<d_type> guess_i(guess_buffer_i.begin(), guess_buffer_i.end());
-    std::vector<d_type> guess_r(guess_buffer_r.begin(), guess_buffer_r.end());
-    mgr.StartCalc(data_r, guess_r, guess_i, dim, config);
-    //mgr.StartCalc(data_buffer_r, guess_buffer_r, guess_buffer_i, dim, config);
+    mgr.StartCalc(data_buffer_r, guess_buffer_r, guess_buffer_i, support_buffer, dim, config);
 }
 
-void Bridge::StartCalc(std::vector<float> data_buffer_r, std::vector<int> dim, std::string const & config)
+void Bridge::StartCalc(d_type * data_buffer_r, std::vector<int> dim, std::string const & config)
 {
-    std::vector<d_type> data_r(data_buffer_r.begin(), data_buffer_r.end());
-    mgr.StartCalc(data_r, dim, config);
-//    mgr.StartCalc(data_buffer_r, dim, config);
+    mgr.StartCalc(data_buffer_r, dim, config);
 }
 
-void Bridge::StartCalcMultiple(std::vector<float> data_buffer_r, std::vector<int> dim, std::string const & config, int nu_threads)
+void Bridge::StartCalcMultiple(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, int nu_threads)
 {
-    std::vector<d_type> data_r(data_buffer_r.begin(), data_buffer_r.end());
-    mgr.StartCalc(data_r, dim, config, nu_threads);
-//    mgr.StartCalc(data_buffer_r, dim, config, nu_threads);
+    mgr.StartCalc(data_buffer_r, dim, config, nu_threads);
 }
 
-std::vector<d_type> Bridge::GetImageR()
+void Bridge::StartCalcWithSeed(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, unsigned int seed)
 {
-    return mgr.GetImageR();
+    mgr.StartCalcWithSeed(data_buffer_r, dim, config, seed);
 }
 
-std::vector<d_type> Bridge::GetImageI()
+void Bridge::StartCalcGenerations(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, int generations, int population)
 {
-    return mgr.GetImageI();
+    mgr.StartCalcGenerations(data_buffer_r, dim, config, generations, population);
+}
+
+void Bridge::Resume(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, std::string const & checkpoint_file)
+{
+    mgr.Resume(data_buffer_r, dim, config, checkpoint_file);
+}
+
+void Bridge::SetCheckpoints(bool enabled)
+{
+    mgr.SetCheckpoints(enabled);
+}
+
+void Bridge::GetImageR(d_type * image_buffer_r)
+{
+    mgr.GetImageR(image_buffer_r);
+}
+
+void Bridge::GetImageI(d_type * image_buffer_i)
+{
+    mgr.GetImageI(image_buffer_i);
+}
+
+std::vector<int> Bridge::GetSupportBounds()
+{
+    return mgr.GetSupportBounds();
+}
+
+void Bridge::GetImageBox(d_type * image_buffer_r, d_type * image_buffer_i)
+{
+    mgr.GetImageBox(image_buffer_r, image_buffer_i);
 }
 
 std::vector<d_type> Bridge::GetErrors()
@@ -51,14 +76,64 @@ std::vector<d_type> Bridge::GetErrors()
     return mgr.GetErrors();
 }
 
-std::vector<float> Bridge::GetSupportV()
+std::vector<d_type> Bridge::GetGenerationErrors()
+{
+    return mgr.GetGenerationErrors();
+}
+
+std::vector<double> Bridge::GetGenerationTimes()
+{
+    return mgr.GetGenerationTimes();
+}
+
+std::vector<int> Bridge::GetMetricIterations()
+{
+    return mgr.GetMetricIterations();
+}
+
+std::vector<std::string> Bridge::GetMetricNames()
+{
+    return mgr.GetMetricNames();
+}
+
+std::vector<double> Bridge::GetMetricValues()
+{
+    return mgr.GetMetricValues();
+}
+
+void Bridge::GetProgress(std::vector<int> & iterations, std::vector<d_type> & errors)
+{
+    mgr.GetProgress(iterations, errors);
+}
+
+bool Bridge::HasStatistics()
+{
+    return mgr.HasStatistics();
+}
+
+void Bridge::GetAmplitudeVariance(d_type * variance_buffer)
+{
+    mgr.GetAmplitudeVariance(variance_buffer);
+}
+
+void Bridge::GetAveragePhase(d_type * phase_buffer)
+{
+    mgr.GetAveragePhase(phase_buffer);
+}
+
+void Bridge::GetSupport(float * support_buffer)
+{
+    mgr.GetSupport(support_buffer);
+}
+
+int Bridge::GetCoherenceSize()
 {
-    return mgr.GetSupportV();
+    return mgr.GetCoherenceSize();
 }
 
-std::vector<d_type> Bridge::GetCoherenceV()
+void Bridge::GetCoherence(d_type * coherence_buffer)
 {
-    return mgr.GetCoherenceV();
+    mgr.GetCoherence(coherence_buffer);
 }
 
 
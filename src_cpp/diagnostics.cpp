@@ -0,0 +1,77 @@
+//
+//  diagnostics.cpp
+//  ArrayFire-OpenCL
+//
+
+#include "diagnostics.hpp"
+#include "common.h"
+
+
+Diagnostics::Diagnostics(int diagnostics_level, int buffer_capacity)
+{
+    level = diagnostics_level;
+    capacity = buffer_capacity > 0 ? buffer_capacity : 1;
+    next = 0;
+    count = 0;
+}
+
+bool Diagnostics::IsEnabled(int metric_level)
+{
+    return level >= metric_level;
+}
+
+void Diagnostics::Record(int iteration, std::string name, double value)
+{
+    if (iterations.size() < capacity)
+    {
+        iterations.push_back(iteration);
+        names.push_back(name);
+        values.push_back(value);
+    }
+    else
+    {
+        iterations[next] = iteration;
+        names[next] = name;
+        values[next] = value;
+    }
+    next = (next + 1) % capacity;
+    if (count < capacity)
+    {
+        count++;
+    }
+}
+
+int Diagnostics::GetIndex(int i)
+{
+    return (next - count + i + capacity) % capacity;
+}
+
+std::vector<int> Diagnostics::GetIterations()
+{
+    std::vector<int> ordered;
+    for (int i = 0; i < count; i++)
+    {
+        ordered.push_back(iterations[GetIndex(i)]);
+    }
+    return ordered;
+}
+
+std::vector<std::string> Diagnostics::GetNames()
+{
+    std::vector<std::string> ordered;
+    for (int i = 0; i < count; i++)
+    {
+        ordered.push_back(names[GetIndex(i)]);
+    }
+    return ordered;
+}
+
+std::vector<double> Diagnostics::GetValues()
+{
+    std::vector<double> ordered;
+    for (int i = 0; i < count; i++)
+    {
+        ordered.push_back(values[GetIndex(i)]);
+    }
+    return ordered;
+}
@@ -7,90 +7,305 @@
 //
 
 #include "typeinfo"
+#include "thread"
+#include "algorithm"
+#include "limits"
+#include "stdexcept"
 #include "arrayfire.h"
 #include "worker.hpp"
 #include "manager.hpp"
 #include "util.hpp"
+#include "diagnostics.hpp"
 
 
 using namespace af;
 
-void Manager::StartCalc(std::vector<d_type> data_buffer_r, std::vector<d_type> guess_buffer_r, std::vector<d_type> guess_buffer_i, std::vector<int> dim, const std::string & config)
+Manager::Manager()
+{
+    rec = NULL;
+    checkpoints = true;
+    // a reconstruction uses FFTs of several sizes and types, the plans of all of them are kept in the cache, so
+    // they are not created again in each iteration
+    af::setFFTPlanCacheSize(FFT_PLAN_CACHE_SIZE);
+}
+
+Manager::~Manager()
+{
+    ReleaseReconstruction();
+}
+
+void Manager::ReleaseReconstruction()
+{
+    if (rec != NULL)
+    {
+        delete rec;
+        rec = NULL;
+    }
+}
+
+void Manager::Iterate(Reconstruction * reconstruction)
+{
+    reconstruction->Init();
+    Continue(reconstruction);
+}
+
+void Manager::Continue(Reconstruction * reconstruction)
+{
+    af::timer t = timer::start();
+    reconstruction->Iterate();
+    // the calculations are asynchronous, so they are completed before the time is taken
+    af::sync();
+    double seconds = timer::stop(t);
+    int iterations = reconstruction->GetErrors().size();
+    printf("iterate function took %g seconds, %g seconds per iteration\n", seconds, seconds/std::max(iterations, 1));
+}
+
+void Manager::Run(af::array data, af::array guess, af::array support, const std::string & config)
+{
+    ReleaseReconstruction();
+    progress.Clear();
+    rec = new Reconstruction(data, guess, config.c_str(), &progress);
+    rec->SetCheckpoints(checkpoints);
+    if (! support.isempty())
+    {
+        rec->SetInitialSupport(support);
+    }
+    Iterate(rec);
+}
+
+af::array Manager::RandomGuess(dim4 dims, unsigned int seed)
+{
+    af::randomEngine r(AF_RANDOM_ENGINE_MERSENNE, seed);
+    d_type test1 = 0;
+    double test2 = 0;
+    if (typeid(test1) == typeid(test2))
+    {
+        return randu(dims, c64, r);
+    }
+    else
+    {
+        return randu(dims, c32, r);
+    }
+}
+
+void Manager::StartCalc(d_type * data_buffer_r, d_type * guess_buffer_r, d_type * guess_buffer_i, std::vector<int> dim, const std::string & config)
 {
     dim4 af_dims = Utils::Int2Dim4(dim);
-    af::array real_d(af_dims, &data_buffer_r[0]);
+    af::array real_d(af_dims, data_buffer_r);
     //saving abs(data)
     af::array data = abs(real_d);
     
 
-    af::array real_g(af_dims, &guess_buffer_r[0]);
-    af::array imag_g(af_dims, &guess_buffer_i[0]);
+    af::array real_g(af_dims, guess_buffer_r);
+    af::array imag_g(af_dims, guess_buffer_i);
     af::array guess = complex(real_g, imag_g);
        
-    Reconstruction reconstruction(data, guess, config.c_str());
-    reconstruction.Init();
-    rec = &reconstruction;
-    timer::start();
+    Run(data, guess, af::array(), config);
+}
 
-    reconstruction.Iterate();	
+void Manager::StartCalc(d_type * data_buffer_r, d_type * guess_buffer_r, d_type * guess_buffer_i, float * support_buffer, std::vector<int> dim, const std::string & config)
+{
+    dim4 af_dims = Utils::Int2Dim4(dim);
+    af::array real_d(af_dims, data_buffer_r);
+    //saving abs(data)
+    af::array data = abs(real_d);
 
-    printf("iterate function took %g seconds\n", timer::stop());
+    af::array real_g(af_dims, guess_buffer_r);
+    af::array imag_g(af_dims, guess_buffer_i);
+    af::array guess = complex(real_g, imag_g);
+    af::array support(af_dims, support_buffer);
+
+    Run(data, guess, support != 0, config);
 }
 
-void Manager::StartCalc(std::vector<d_type> data_buffer_r, std::vector<int> dim, std::string const & config)
+void Manager::StartCalc(d_type * data_buffer_r, std::vector<int> dim, std::string const & config)
 {
     StartCalc(data_buffer_r, dim, config, 1);
 }
 
-void Manager::StartCalc(std::vector<d_type> data_buffer_r, std::vector<int> dim, std::string const & config, int nu_threads)
+void Manager::StartCalc(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, int nu_threads)
 {
-    af::array real_d(Utils::Int2Dim4(dim), &data_buffer_r[0]);
+    unsigned int seed = (unsigned int)time(0);
+    if (nu_threads <= 1)
+    {
+        StartCalcWithSeed(data_buffer_r, dim, config, seed);
+        return;
+    }
+
+    af::array real_d(Utils::Int2Dim4(dim), data_buffer_r);
     //saving abs(data)
     af::array data = abs(real_d);
 
+    std::vector<Reconstruction *> reconstructions = CreatePopulation(data, config, nu_threads, seed);
+    RunConcurrently(reconstructions, Iterate);
+    Rank(reconstructions);
 
-    af::randomEngine r(AF_RANDOM_ENGINE_MERSENNE, (uint)time(0));
-    d_type test1 = 0;
-    double test2 = 0;
-    af::array guess;
-    if (typeid(test1) == typeid(test2))
+    // keep the reconstruction with the smallest final error
+    ReleaseReconstruction();
+    rec = reconstructions[0];
+    for (int i = 1; i < reconstructions.size(); i++)
     {
-        guess = randu(data.dims(), c64, r);
+        delete reconstructions[i];
     }
-    else
+}
+
+void Manager::StartCalcGenerations(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, int generations, int population)
+{
+    af::array real_d(Utils::Int2Dim4(dim), data_buffer_r);
+    //saving abs(data)
+    af::array data = abs(real_d);
+
+    if (population < 1)
     {
-        guess = randu(data.dims(), c32, r);
+        throw std::invalid_argument("population must be at least 1");
     }
-    Reconstruction reconstruction(data, guess, config.c_str());
-    reconstruction.Init();
-    rec = &reconstruction;
+    generation_errors.clear();
+    generation_times.clear();
+    std::vector<Reconstruction *> reconstructions = CreatePopulation(data, config, population, (unsigned int)time(0));
+    for (int g = 0; g < generations; g++)
+    {
+        af::timer t = timer::start();
+        if (g == 0)
+        {
+            RunConcurrently(reconstructions, Iterate);
+        }
+        else
+        {
+            // breed the population with the best image of previous generation, the images stay on the device
+            af::array best = reconstructions[0]->GetImage();
+            for (int i = 1; i < reconstructions.size(); i++)
+            {
+                reconstructions[i]->Reset(Breed(best, reconstructions[i]->GetImage()));
+            }
+            reconstructions[0]->Reset(best);
+            RunConcurrently(reconstructions, Continue);
+        }
+        Rank(reconstructions);
 
-    timer::start();
-    reconstruction.Iterate();
-    printf("iterate function took %g seconds\n", timer::stop());
-	
+        d_type error_sum = 0;
+        for (int i = 0; i < reconstructions.size(); i++)
+        {
+            error_sum += FinalError(reconstructions[i]);
+        }
+        generation_errors.push_back(FinalError(reconstructions[0]));
+        generation_times.push_back(timer::stop(t));
+        printf("generation %i took %g seconds, best error %f, mean error %f\n", g, generation_times.back(), generation_errors.back(), error_sum/reconstructions.size());
+    }
+
+    ReleaseReconstruction();
+    rec = reconstructions[0];
+    for (int i = 1; i < reconstructions.size(); i++)
+    {
+        delete reconstructions[i];
+    }
 }
 
-std::vector<d_type> Manager::GetImageR()
+std::vector<Reconstruction *> Manager::CreatePopulation(af::array data, std::string const & config, int size, unsigned int seed)
 {
-    af::array image = rec->GetImage();
-    
-    d_type *image_r = real(image).host<d_type>();
-    std::vector<d_type> v(image_r, image_r + image.elements());
+    // each reconstruction gets own copy of data and own seed
+    progress.Clear();
+    std::vector<Reconstruction *> reconstructions;
+    for (int i = 0; i < size; i++)
+    {
+        reconstructions.push_back(new Reconstruction(data.copy(), RandomGuess(data.dims(), seed + i), config.c_str(), &progress));
+        reconstructions[i]->SetCheckpoints(false);
+    }
+    return reconstructions;
+}
 
-    delete [] image_r;
-    return v;
+void Manager::RunConcurrently(std::vector<Reconstruction *> & reconstructions, void (*run)(Reconstruction *))
+{
+    std::vector<std::thread> threads;
+    for (int i = 0; i < reconstructions.size(); i++)
+    {
+        threads.push_back(std::thread(run, reconstructions[i]));
+    }
+    for (int i = 0; i < threads.size(); i++)
+    {
+        threads[i].join();
+    }
 }
 
-std::vector<d_type> Manager::GetImageI()
+d_type Manager::FinalError(Reconstruction * reconstruction)
 {
-    af::array image = rec->GetImage();
+    std::vector<d_type> errors = reconstruction->GetErrors();
+    if (errors.size() == 0)
+    {
+        return std::numeric_limits<d_type>::max();
+    }
+    return errors.back();
+}
 
-    d_type *image_i = imag(image).host<d_type>();
-    std::vector<d_type> v(image_i, image_i + image.elements());
+bool Manager::CompareErrors(Reconstruction * first, Reconstruction * second)
+{
+    return FinalError(first) < FinalError(second);
+}
+
+void Manager::Rank(std::vector<Reconstruction *> & reconstructions)
+{
+    std::sort(reconstructions.begin(), reconstructions.end(), CompareErrors);
+}
+
+af::array Manager::Breed(af::array best, af::array other)
+{
+    // geometric mean of amplitudes and average of phases; the phase difference is taken from the product with the
+    // conjugate, so the average does not break where the phases wrap at pi
+    af::array amplitudes = sqrt(abs(best) * abs(other));
+    af::array phases = arg(best) + arg(other * conjg(best)) / 2;
+    return complex(amplitudes * cos(phases), amplitudes * sin(phases));
+}
+
+void Manager::StartCalcWithSeed(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, unsigned int seed)
+{
+    af::array real_d(Utils::Int2Dim4(dim), data_buffer_r);
+    //saving abs(data)
+    af::array data = abs(real_d);
 
-    delete [] image_i;
-    return v;
+    Run(data, RandomGuess(data.dims(), seed), af::array(), config);
+}
+
+void Manager::Resume(d_type * data_buffer_r, std::vector<int> dim, std::string const & config, std::string const & checkpoint_file)
+{
+    af::array real_d(Utils::Int2Dim4(dim), data_buffer_r);
+    //saving abs(data)
+    af::array data = abs(real_d);
+
+    ReleaseReconstruction();
+    progress.Clear();
+    // the guess is replaced by the image from the checkpoint
+    rec = new Reconstruction(data, RandomGuess(data.dims(), 0), config.c_str(), &progress);
+    rec->SetCheckpoints(checkpoints);
+    rec->Init();
+    rec->LoadCheckpoint(checkpoint_file);
+    Continue(rec);
+}
+
+void Manager::SetCheckpoints(bool enabled)
+{
+    checkpoints = enabled;
+}
+
+void Manager::GetImageR(d_type * image_buffer_r)
+{
+    real(rec->GetImage()).host(image_buffer_r);
+}
+
+void Manager::GetImageI(d_type * image_buffer_i)
+{
+    imag(rec->GetImage()).host(image_buffer_i);
+}
+
+std::vector<int> Manager::GetSupportBounds()
+{
+    return rec->GetSupportBounds();
+}
+
+void Manager::GetImageBox(d_type * image_buffer_r, d_type * image_buffer_i)
+{
+    std::vector<int> bounds = rec->GetSupportBounds();
+    af::array image_box = rec->GetImage()(Utils::BoxSeq(bounds, 0), Utils::BoxSeq(bounds, 1), Utils::BoxSeq(bounds, 2));
+    real(image_box).host(image_buffer_r);
+    imag(image_box).host(image_buffer_i);
 }
 
 std::vector<d_type> Manager::GetErrors()
@@ -98,14 +313,81 @@ std::vector<d_type> Manager::GetErrors()
     return rec->GetErrors();
 }
 
-std::vector<float> Manager::GetSupportV()
+std::vector<d_type> Manager::GetGenerationErrors()
+{
+    return generation_errors;
+}
+
+std::vector<double> Manager::GetGenerationTimes()
 {
-    return rec->GetSupportVector();
+    return generation_times;
 }
 
-std::vector<d_type> Manager::GetCoherenceV()
+std::vector<int> Manager::GetMetricIterations()
 {
-    return rec->GetCoherenceVector();
+    return rec->GetDiagnostics()->GetIterations();
+}
+
+std::vector<std::string> Manager::GetMetricNames()
+{
+    return rec->GetDiagnostics()->GetNames();
+}
+
+std::vector<double> Manager::GetMetricValues()
+{
+    return rec->GetDiagnostics()->GetValues();
+}
+
+void Manager::GetProgress(std::vector<int> & iterations, std::vector<d_type> & errors)
+{
+    progress.Pop(iterations, errors);
+}
+
+bool Manager::HasStatistics()
+{
+    return ! rec->GetAmplitudeVariance().isempty();
+}
+
+void Manager::GetAmplitudeVariance(d_type * variance_buffer)
+{
+    af::array variance = rec->GetAmplitudeVariance();
+    if (! variance.isempty())
+    {
+        variance.host(variance_buffer);
+    }
+}
+
+void Manager::GetAveragePhase(d_type * phase_buffer)
+{
+    af::array phase = rec->GetAveragePhase();
+    if (! phase.isempty())
+    {
+        phase.host(phase_buffer);
+    }
+}
+
+void Manager::GetSupport(float * support_buffer)
+{
+    rec->GetSupportArray().as(f32).host(support_buffer);
+}
+
+int Manager::GetCoherenceSize()
+{
+    af::array coherence = rec->GetCoherenceArray();
+    if (coherence.isempty())
+    {
+        return 0;
+    }
+    return coherence.elements();
+}
+
+void Manager::GetCoherence(d_type * coherence_buffer)
+{
+    af::array coherence = rec->GetCoherenceArray();
+    if (! coherence.isempty())
+    {
+        coherence.host(coherence_buffer);
+    }
 }
 
 
@@ -20,49 +20,35 @@
 
 using namespace af;
 using namespace libconfig;
-Config cfg;
-
-// maps algorithm name to algorithm number
-std::map<std::string, int> algorithm_id_map;
-// vector holding algorithm run sequence, where algorithm run is a pair of algorithm and number of iterations
-std::vector<alg_switch> alg_switches;
-
-std::string data_type;
-
-//use the matlab order (fft/ifft in modulus projector)
-bool matlab_order = true;
-
-// amplitude threshold
-d_type amp_threshold;
-bool amp_threshold_fill_zeros;
-
-d_type phase_min = 120;
-d_type phase_max = 10;
-float beta = .9;
-
-// support
-Support *support_attr;
-PartialCoherence *partial_coherence = NULL;
-
-bool d_type_precision;
-
-// number of iterates to average
-int avg_iterations;
-
-// calculated number of iterations
-int number_iterations;
-
-int twin;
-
-int regularized_amp = REGULARIZED_AMPLITUDE_NONE;
-int gc = -1;
-
-
 
 Params::Params(const char* config_file, const dim4 data_dim)
 {
+    matlab_order = true;
+    amp_threshold = 0;
+    amp_threshold_fill_zeros = false;
+    phase_min = 120;
+    phase_max = 10;
+    beta = .9;
+    support_attr = NULL;
+    partial_coherence = NULL;
+    avg_iterations = 0;
+    avg_statistics = false;
+    mixed_precision = false;
+    number_iterations = 0;
+    regularized_amp = REGULARIZED_AMPLITUDE_NONE;
+    gc = -1;
+    diagnostics_level = DIAGNOSTICS_NONE;
+    diagnostics_capacity = 10000;
+    error_batch = 50;
+    convergence_window = 0;
+    convergence_threshold = 0;
+    divergence_factor = 0;
+    time_budget = 0;
+    checkpoint_interval = 0;
+
     BuildAlgorithmMap();
     
+    Config cfg;
     // Read the file. If there is an error, report.
     try
     {
@@ -112,6 +98,86 @@ Params::Params(const char* config_file, const dim4 data_dim)
         printf("No 'gcd' parameter in configuration file.");
     }
 
+    try {
+        diagnostics_level = cfg.lookup("diagnostics_level");
+    }
+    catch ( const SettingNotFoundException &nfex)
+    {
+        printf("No 'diagnostics_level' parameter in configuration file.");
+    }
+
+    try {
+        diagnostics_capacity = cfg.lookup("diagnostics_capacity");
+    }
+    catch ( const SettingNotFoundException &nfex)
+    {
+        printf("No 'diagnostics_capacity' parameter in configuration file.");
+    }
+
+    try {
+        error_batch = cfg.lookup("error_batch");
+    }
+    catch ( const SettingNotFoundException &nfex)
+    {
+        printf("No 'error_batch' parameter in configuration file.");
+    }
+
+    try {
+        convergence_window = cfg.lookup("convergence_window");
+    }
+    catch ( const SettingNotFoundException &nfex)
+    {
+        printf("No 'convergence_window' parameter in configuration file.");
+    }
+
+    try {
+        convergence_threshold = cfg.lookup("convergence_threshold");
+    }
+    catch ( const SettingNotFoundException &nfex)
+    {
+        printf("No 'convergence_threshold' parameter in configuration file.");
+    }
+
+    try {
+        divergence_factor = cfg.lookup("divergence_factor");
+    }
+    catch ( const SettingNotFoundException &nfex)
+    {
+        printf("No 'divergence_factor' parameter in configuration file.");
+    }
+
+    try {
+        time_budget = cfg.lookup("time_budget");
+    }
+    catch ( const SettingNotFoundException &nfex)
+    {
+        printf("No 'time_budget' parameter in configuration file.");
+    }
+
+    try {
+        checkpoint_file = (const char *) cfg.lookup("checkpoint_file");
+        checkpoint_interval = cfg.lookup("checkpoint_interval");
+    }
+    catch ( const SettingNotFoundException &nfex)
+    {
+        printf("No 'checkpoint_file' or 'checkpoint_interval' parameter in configuration file.");
+    }
+
+    try {
+        // "float" and "double" select the build of the bridge, "mixed" runs the float build with double accumulations
+        std::string precision = (const char *) cfg.lookup("precision");
+        mixed_precision = (precision == "mixed");
+    }
+    catch ( const SettingNotFoundException &nfex)
+    {
+        printf("No 'precision' parameter in configuration file.");
+    }
+    if (mixed_precision && !af::isDoubleAvailable(af::getDevice()))
+    {
+        printf("double precision is not available on the device, accumulating in single precision\n");
+        mixed_precision = false;
+    }
+
     std::vector<int> support_area;
     try {
         const Setting& root = cfg.getRoot();
@@ -158,7 +224,7 @@ Params::Params(const char* config_file, const dim4 data_dim)
     {
         printf("No 'support_sigma' parameter in configuration file.");
     }
-    std::vector<int> support_triggers = ParseTriggers("support");
+    std::vector<int> support_triggers = ParseTriggers("support", cfg.getRoot());
     int support_alg = -1;
     try {
         support_alg = algorithm_id_map[cfg.lookup("support_type")];
@@ -167,7 +233,7 @@ Params::Params(const char* config_file, const dim4 data_dim)
     {
         printf((std::string("'No support_type' parameter in configuration file.")).c_str());
     }
-    support_attr = new Support(data_dim, support_area, support_threshold, support_threshold_adjust, support_sigma, support_triggers, support_alg);
+    support_attr = new Support(data_dim, support_area, support_threshold, support_threshold_adjust, support_sigma, support_triggers, support_alg, mixed_precision);
     printf("created support\n");
 
     int pcdi_alg = 0;
@@ -226,7 +292,7 @@ Params::Params(const char* config_file, const dim4 data_dim)
             printf("No 'partial_coherence_kernel' parameter in configuration file.");
         }
 
-        std::vector<int> partial_coherence_trigger = ParseTriggers("partial_coherence");
+        std::vector<int> partial_coherence_trigger = ParseTriggers("partial_coherence", cfg.getRoot());
         bool pcdi_normalize = false;
         try {
             pcdi_normalize = cfg.lookup("partial_coherence_normalize");
@@ -266,6 +332,15 @@ Params::Params(const char* config_file, const dim4 data_dim)
         printf("No 'avg_iterations' parameter in configuration file.");
     }
 
+    try
+    {
+        avg_statistics = cfg.lookup("avg_statistics");
+    }
+    catch(const SettingNotFoundException &nfex)
+    {
+        printf("No 'avg_statistics' parameter in configuration file.");
+    }
+
     try
     {
         amp_threshold = cfg.lookup("amp_threshold");
@@ -356,6 +431,15 @@ Params::Params(const char* config_file, const dim4 data_dim)
 
 }
 
+Params::~Params()
+{
+    delete support_attr;
+    if (partial_coherence != NULL)
+    {
+        delete partial_coherence;
+    }
+}
+
 void Params::BuildAlgorithmMap()
 {
     // hardcoded
@@ -366,10 +450,9 @@ void Params::BuildAlgorithmMap()
     algorithm_id_map.insert(std::pair<char*,int>("GAUSS", ALGORITHM_GAUSS));
 }
 
-std::vector<int> Params::ParseTriggers(std::string trigger_name)
+std::vector<int> Params::ParseTriggers(std::string trigger_name, const Setting & root)
 {
     std::vector<int> trigger_iterations;
-    const Setting& root = cfg.getRoot();
     std::vector<trigger_setting> triggers;
 
     try {
@@ -378,6 +461,7 @@ std::vector<int> Params::ParseTriggers(std::string trigger_name)
         {
             int start = tmp[i][0];
             int step = tmp[i][1];
+            int end;
             if (tmp[i].getLength() > 2)
             {
                 end = tmp[i][2];
@@ -451,6 +535,16 @@ int Params::GetAvgIterations()
     return avg_iterations;
 }
 
+bool Params::IsAvgStatistics()
+{
+    return avg_statistics;
+}
+
+bool Params::IsMixedPrecision()
+{
+    return mixed_precision;
+}
+
 int Params::GetRegularizedAmp()
 {
     return regularized_amp;
@@ -481,4 +575,50 @@ int Params::GetGC()
     return gc;
 }
 
+int Params::GetDiagnosticsLevel()
+{
+    return diagnostics_level;
+}
+
+int Params::GetDiagnosticsCapacity()
+{
+    return diagnostics_capacity;
+}
+
+int Params::GetErrorBatch()
+{
+    return error_batch;
+}
+
+int Params::GetConvergenceWindow()
+{
+    return convergence_window;
+}
+
+float Params::GetConvergenceThreshold()
+{
+    return convergence_threshold;
+}
+
+float Params::GetDivergenceFactor()
+{
+    return divergence_factor;
+}
+
+double Params::GetTimeBudget()
+{
+    return time_budget;
+}
+
+std::string Params::GetCheckpointFile()
+{
+    return checkpoint_file;
+}
+
+int Params::GetCheckpointInterval()
+{
+    // a checkpoint without file is not written
+    return checkpoint_file.empty() ? 0 : checkpoint_interval;
+}
+
 
@@ -8,13 +8,6 @@
 
 using namespace af;
 
-af::array kernel_array;
-af::array roi_amplitudes_prev;
-af::array roi_data_abs;
-d_type sum_roi_data;
-af::dim4 roi_dims;
-af::dim4 dims;
-
 PartialCoherence::PartialCoherence(std::vector<int> roi_area, int * kernel_area,  std::vector<int> partial_coherence_trigger, int alg, bool pcdi_normalize, int pcdi_iter, bool pcdi_clip)
 {
     roi= roi_area;
@@ -25,10 +18,17 @@ PartialCoherence::PartialCoherence(std::vector<int> roi_area, int * kernel_area,
     normalize = pcdi_normalize;
     iteration_num = pcdi_iter;
     clip = pcdi_clip;
+    sum_roi_data = 0;
+}
+
+PartialCoherence::~PartialCoherence()
+{
+    delete [] kernel;
 }
 
 void PartialCoherence::Init(af::array data)
 {
+    trigger_index = 0;
     roi_dims = Utils::Int2Dim4(roi);
     dims = data.dims();
 
@@ -39,6 +39,8 @@ void PartialCoherence::Init(af::array data)
         sum_roi_data = sum<d_type>(pow(roi_data_abs, 2));
     } 
     kernel_array = constant(0.5, roi_dims);
+    conv_dims = GetConvolutionDims(dims, roi_dims);
+    kernel_spectrum = GetKernelSpectrum(kernel_array, conv_dims);
 }
 
 void PartialCoherence::SetPrevious(af::array abs_amplitudes)
@@ -77,18 +79,16 @@ af::array PartialCoherence::ApplyPartialCoherence(af::array abs_amplitudes, int
 
         af::array roi_combined_amp = 2*roi_abs_amplitudes - roi_amplitudes_prev;
         OnTrigger(roi_combined_amp);   // use_2k_1 from matlab program
-        printf("Updating coherence, current iter %i\n", current_iteration);
         trigger_index++;
     }
 
     // apply coherence
     af::array abs_amplitudes_2 = pow(abs_amplitudes, 2);
-    af::array converged_2 = af::fftConvolve(abs_amplitudes_2, kernel_array);
+    // the kernel spectrum is calculated only when the kernel changes
+    af::array converged_2 = ConvolveSpectrum(abs_amplitudes_2, kernel_spectrum, conv_dims, roi_dims);
     af::array converged = sqrt(converged_2);
     //af::array converged = sqrt(fftConvolve(pow(abs_amplitudes, 2), kernel_array));  // implemented here, but works different than af::fftConvolve
 
-    printf("coherence norm %f\n", sum<d_type>(pow(abs(kernel_array), 2)));
-    printf("converged norm %f\n", sum<d_type>(pow(abs(converged), 2)));
     return converged;
 }
 
@@ -128,24 +128,39 @@ void PartialCoherence::OnTrigger(af::array arr)
 }
 
 af::array PartialCoherence::fftConvolve(af::array arr, af::array kernel)
-{  
-    af::dim4 dims_input = arr.dims();
-    af::dim4 dims_kernel = kernel.dims();    
-
-    int dims_fft_padded [nD];
+{
+    af::dim4 fft_dims = GetConvolutionDims(arr.dims(), kernel.dims());
+    return ConvolveSpectrum(arr, GetKernelSpectrum(kernel, fft_dims), fft_dims, kernel.dims());
+}
 
-    for(unsigned int i = 0; i < nD; i++)
+af::dim4 PartialCoherence::GetConvolutionDims(af::dim4 dims_input, af::dim4 dims_kernel)
+{
+    af::dim4 fft_dims(1, 1, 1, 1);
+    for (unsigned int i = 0; i < nD; i++)
     {
-        dim_t d = Utils::GetDimension(dims_input[i] + dims_kernel[i] - 1);
-        dims_fft_padded[i] = Utils::GetDimension(dims_input[i] + dims_kernel[i] - 1);
+        fft_dims[i] = Utils::GetDimension(dims_input[i] + dims_kernel[i] - 1);
     }
-    
-    d_type pad = 0;
-    af::array kernel_padded = Utils::PadAround(kernel, dims_input, pad);
-    
-    af::array coh_padded = real( Utils::ifft( Utils::fft(arr) * Utils::fft(kernel_padded) ) ); 
-    return coh_padded;
+    return fft_dims;
+}
+
+af::array PartialCoherence::GetKernelSpectrum(af::array kernel, af::dim4 fft_dims)
+{
+    return fftR2C<nD>(kernel, fft_dims);
+}
 
+af::array PartialCoherence::ConvolveSpectrum(af::array arr, af::array spectrum, af::dim4 fft_dims, af::dim4 dims_kernel)
+{
+    // the arrays are real, so R2C FFT calculates only half of the spectrum in the first dimension, and the inverse
+    // C2R FFT returns real array; the result has the dimensions of arr, and is aligned as af::fftConvolve result
+    af::dim4 dims_input = arr.dims();
+    af::array convolved = fftC2R<nD>(fftR2C<nD>(arr, fft_dims) * spectrum, fft_dims[0] % 2 == 1);
+
+    int beginning[4];
+    for (int i = 0; i < 4; i++)
+    {
+        beginning[i] = dims_kernel[i]/2;
+    }
+    return convolved(seq(beginning[0], beginning[0] + dims_input[0]-1), seq(beginning[1], beginning[1] + dims_input[1]-1), seq(beginning[2], beginning[2] + dims_input[2]-1), seq(beginning[3], beginning[3] + dims_input[3]-1));
 }
 
 void PartialCoherence::DeconvLucy(af::array amplitudes, af::array data, int iterations)
@@ -155,15 +170,19 @@ void PartialCoherence::DeconvLucy(af::array amplitudes, af::array data, int iter
     //set it to the last coherence instead
     af::array coherence = kernel_array;
     af::array data_mirror = af::flip(af::flip(af::flip(af::flip(data, 0),1),2),3).copy();
+    // the data does not change during deconvolution, so its spectra are calculated once
+    af::dim4 lucy_dims = GetConvolutionDims(coherence.dims(), data.dims());
+    af::array data_spectrum = GetKernelSpectrum(data, lucy_dims);
+    af::array data_mirror_spectrum = GetKernelSpectrum(data_mirror, lucy_dims);
 
     for (int i = 0; i < iterations; i++)
     {
-        af::array convolve = af::fftConvolve(coherence, data);
+        af::array convolve = ConvolveSpectrum(coherence, data_spectrum, lucy_dims, data.dims());
         //af::array convolve = af::convolve3(im_deconv, psf);
         convolve(convolve == 0) = 1.0;   // added to the algorithm from scikit to prevet division by 0
 
         af::array relative_blurr = amplitudes/convolve;
-        coherence *= af::fftConvolve(relative_blurr, data_mirror);
+        coherence *= ConvolveSpectrum(relative_blurr, data_mirror_spectrum, lucy_dims, data.dims());
     }
     coherence = real(coherence);
     // clip
@@ -175,12 +194,34 @@ void PartialCoherence::DeconvLucy(af::array amplitudes, af::array data, int iter
     //coherence = abs(coherence)/sum<d_type>(abs(coherence)); 
     d_type coh_sum = sum<d_type>(abs(coherence));
     coherence = abs(coherence)/coh_sum;    
-    printf("coherence norm ,  %f\n", sum<d_type>(pow(abs(coherence), 2)));
     kernel_array = coherence;
+    kernel_spectrum = GetKernelSpectrum(kernel_array, conv_dims);
 }
 
 
 af::array PartialCoherence::GetKernelArray()
 {
     return kernel_array;
-}
\ No newline at end of file
+}
+
+void PartialCoherence::SaveCheckpoint(const char * filename)
+{
+    int index[] = {trigger_index};
+    saveArray("coherence_trigger_index", af::array(1, index), filename, true);
+    saveArray("coherence", kernel_array, filename, true);
+    if (! roi_amplitudes_prev.isempty())
+    {
+        saveArray("coherence_previous", roi_amplitudes_prev, filename, true);
+    }
+}
+
+void PartialCoherence::LoadCheckpoint(const char * filename)
+{
+    readArray(filename, "coherence_trigger_index").host(&trigger_index);
+    kernel_array = readArray(filename, "coherence");
+    kernel_spectrum = GetKernelSpectrum(kernel_array, conv_dims);
+    if (readArrayCheck(filename, "coherence_previous") >= 0)
+    {
+        roi_amplitudes_prev = readArray(filename, "coherence_previous");
+    }
+}
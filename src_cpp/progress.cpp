@@ -0,0 +1,33 @@
+//
+//  progress.cpp
+//  ArrayFire-OpenCL
+//
+
+#include "progress.hpp"
+
+
+void Progress::Push(int first_iteration, const std::vector<d_type> & batch)
+{
+    std::lock_guard<std::mutex> lock(mtx);
+    for (int i = 0; i < batch.size(); i++)
+    {
+        iterations.push_back(first_iteration + i);
+        errors.push_back(batch[i]);
+    }
+}
+
+void Progress::Pop(std::vector<int> & iterations_out, std::vector<d_type> & errors_out)
+{
+    std::lock_guard<std::mutex> lock(mtx);
+    iterations_out.swap(iterations);
+    errors_out.swap(errors);
+    iterations.clear();
+    errors.clear();
+}
+
+void Progress::Clear()
+{
+    std::lock_guard<std::mutex> lock(mtx);
+    iterations.clear();
+    errors.clear();
+}
@@ -9,65 +9,56 @@
 #include "stdio.h"
 #include "vector"
 #include "map"
+#include <algorithm>
+#include <cmath>
 #include "state.hpp"
 #include "parameters.hpp"
 #include "support.hpp"
 #include "algorithm.hpp"
 #include "pcdi.hpp"
+#include "progress.hpp"
 #include "arrayfire.h"
 
 using namespace af;
 
-// a reference to params object
-Params *params;
-
-// current iteration
-int current_iter = -1;
-// number of configured iterations for reconstruction
-int total_iter_num = 0;
-
-// The vector of errors indexed by iteration
-std::vector<d_type>  errors;
-
-// current algorithm
-Algorithm * current_alg = NULL;
-// current index of index switches vector
-int alg_switch_index = 0;
-
-// mapping of algorithm id to an Algorithm object
-std::map<int, Algorithm*> algorithm_map;
-
-// a flag indicating whether to update support
-bool update_support = false;
-// current index in support_triggers vector
-int support_triggers_index = 0;
-
-// partial coherence state
-// a flag indicating whether to update partial coherence
-bool run_convolution = false;
-bool update_kernel = false;
-// current index in support_partial_coherence vector
-int partial_coherence_triggers_index = 0;
-
-bool averaging = false;
-
-bool apply_twin = false;
-
-
-State::State(Params* parameters)
+State::State(Params* parameters, Progress* progress_queue)
 {
     params = parameters;
+    progress = progress_queue;
+    buffered_errors = 0;
+    error_batch = 1;
+    current_iter = -1;
+    total_iter_num = 0;
+    current_alg = NULL;
+    alg_switch_index = 0;
+    update_support = false;
+    support_triggers_index = 0;
+    run_convolution = false;
+    update_kernel = false;
+    partial_coherence_triggers_index = 0;
+    averaging = false;
+    apply_twin = false;
+    twin_iter = -1;
+    stop_reason = STOP_NONE;
+    min_error = 0;
+    has_min_error = false;
+    elapsed_before = 0;
 }
 
 void State::Init()
 {
     total_iter_num = params->GetNumberIterations();
+    error_batch = std::max(params->GetErrorBatch(), 1);
+    error_buffer = constant(0, error_batch, (af_dtype) dtype_traits<d_type>::af_type);
+    buffered_errors = 0;
+    twin_iter = params->GetTwin();
+    start_time = timer::start();
     // create algorithms that are used in algorithm sequence
     // and load the objects into a map
     for (int i = 0; i < params->GetAlgSwitches().size(); i++)
     {
         int alg_id = params->GetAlgSwitches()[i].algorithm_id;
-        if (algorithm_map[alg_id] == 0)
+        if (algorithm_map.count(alg_id) == 0)
         {
             MapAlgorithmObject(alg_id);
         }
@@ -77,6 +68,10 @@ void State::Init()
 
 State::~State()
 {
+    for (std::map<int, Algorithm*>::iterator it = algorithm_map.begin(); it != algorithm_map.end(); ++it)
+    {
+        delete it->second;
+    }
 }
 
 void State::MapAlgorithmObject(int alg_id)
@@ -95,8 +90,13 @@ void State::MapAlgorithmObject(int alg_id)
 
 int State::Next()
 {
+    if ((params->GetTimeBudget() > 0) && (elapsed_before + timer::stop(start_time) > params->GetTimeBudget()))
+    {
+        StopEarly(STOP_TIME_BUDGET);
+    }
     if (current_iter++ == total_iter_num - 1)
     {
+        FlushErrors();
         return false;
     }
     // figure out current alg
@@ -108,7 +108,7 @@ int State::Next()
     }
  
     // check if update support this iteration
-    if ((params->GetSupport()->GetTriggers().size() > 0) && (params->GetSupport()->GetTriggers()[support_triggers_index] == current_iter))
+    if ((support_triggers_index < params->GetSupport()->GetTriggers().size()) && (params->GetSupport()->GetTriggers()[support_triggers_index] == current_iter))
     {
         update_support = true;
         support_triggers_index++;
@@ -121,7 +121,7 @@ int State::Next()
     // calculate if during the iteration should do averaging.
     averaging = ( current_iter >= (total_iter_num - params->GetAvgIterations()) );
 
-    if (current_iter == params->GetTwin())
+    if (current_iter == twin_iter)
     {
         apply_twin = true;
     }
@@ -138,10 +138,90 @@ Algorithm * State::GetCurrentAlg()
     return current_alg;
 }
 
-void State::RecordError(d_type error)
+void State::RecordError(af::array error)
+{
+    // in mixed precision the error is accumulated in double, and stored in the type of the buffer
+    error_buffer(buffered_errors) = error.as(error_buffer.type());
+    buffered_errors++;
+    // the convergence is checked at the error batch boundaries, so the errors flushed for a checkpoint do not change
+    // the iteration at which the reconstruction stops
+    if ((errors.size() + buffered_errors) % error_batch == 0)
+    {
+        FlushErrors();
+        CheckConvergence();
+    }
+}
+
+void State::FlushErrors()
 {
-    errors.push_back(error);
-    printf("iter, error %i %fl\n", current_iter, error);
+    if (buffered_errors == 0)
+    {
+        return;
+    }
+    std::vector<d_type> batch(buffered_errors);
+    error_buffer(seq(0, buffered_errors-1)).host(&batch[0]);
+    buffered_errors = 0;
+    if (progress != NULL)
+    {
+        progress->Push(errors.size(), batch);
+    }
+    errors.insert(errors.end(), batch.begin(), batch.end());
+}
+
+void State::CheckConvergence()
+{
+    int last = errors.size() - 1;
+    if (params->GetDivergenceFactor() > 0)
+    {
+        // the minimal error is taken over the errors before the last one
+        for (int i = std::max(last - error_batch, 0); i < last; i++)
+        {
+            if (!has_min_error || (errors[i] < min_error))
+            {
+                min_error = errors[i];
+                has_min_error = true;
+            }
+        }
+        if (std::isnan(errors[last]) || (has_min_error && (errors[last] > params->GetDivergenceFactor() * min_error)))
+        {
+            StopEarly(STOP_DIVERGED);
+            return;
+        }
+    }
+    int window = params->GetConvergenceWindow();
+    if ((window > 0) && (last >= window))
+    {
+        d_type previous = errors[last - window];
+        if (std::fabs(previous - errors[last]) <= params->GetConvergenceThreshold() * previous)
+        {
+            StopEarly(STOP_CONVERGED);
+        }
+    }
+}
+
+void State::StopEarly(int reason)
+{
+    // the iterations are not stopped twice, or after the last iteration
+    if ((stop_reason != STOP_NONE) || (current_iter >= total_iter_num - 1))
+    {
+        return;
+    }
+    stop_reason = reason;
+    if (reason == STOP_DIVERGED)
+    {
+        total_iter_num = current_iter + 1;
+    }
+    else
+    {
+        total_iter_num = std::min(total_iter_num, current_iter + 1 + params->GetAvgIterations());
+        alg_switch_index = params->GetAlgSwitches().size() - 1;
+        current_alg = algorithm_map[params->GetAlgSwitches()[alg_switch_index].algorithm_id];
+        if (twin_iter > current_iter)
+        {
+            twin_iter = current_iter + 1;
+        }
+    }
+    printf("iterations stopped at iteration %i, reason %i\n", current_iter, reason);
 }
 
 int State::GetCurrentIteration()
@@ -171,7 +251,54 @@ bool State::IsAveragingIteration()
 
 std::vector<d_type>  State::GetErrors()
 {
+    FlushErrors();
     return errors;
 }
 
+int State::GetStopReason()
+{
+    return stop_reason;
+}
+
+void State::SaveCheckpoint(const char * filename)
+{
+    // the errors are copied from device first, so the saved errors end at the current iteration
+    FlushErrors();
+    int counters[] = {current_iter, total_iter_num, alg_switch_index, support_triggers_index, twin_iter, stop_reason, has_min_error};
+    d_type values[] = {min_error, (d_type)(elapsed_before + timer::stop(start_time))};
+    saveArray("state_counters", af::array(7, counters), filename, true);
+    saveArray("state_values", af::array(2, values), filename, true);
+    if (errors.size() > 0)
+    {
+        saveArray("errors", af::array(errors.size(), &errors[0]), filename, true);
+    }
+}
+
+void State::LoadCheckpoint(const char * filename)
+{
+    int counters[7];
+    d_type values[2];
+    readArray(filename, "state_counters").host(counters);
+    readArray(filename, "state_values").host(values);
+    current_iter = counters[0];
+    total_iter_num = counters[1];
+    alg_switch_index = counters[2];
+    support_triggers_index = counters[3];
+    twin_iter = counters[4];
+    stop_reason = counters[5];
+    has_min_error = (counters[6] != 0);
+    current_alg = algorithm_map[params->GetAlgSwitches()[alg_switch_index].algorithm_id];
+    min_error = values[0];
+    elapsed_before = values[1];
+    start_time = timer::start();
+
+    errors.clear();
+    if (readArrayCheck(filename, "errors") >= 0)
+    {
+        af::array saved_errors = readArray(filename, "errors");
+        errors.resize(saved_errors.elements());
+        saved_errors.host(&errors[0]);
+    }
+}
+
 
@@ -12,7 +12,7 @@
 #include "util.hpp"
 
 
-Support::Support(const dim4 data_dim, std::vector<int> support_area, float th, bool threshold_adjust, int sgma, std::vector<int> support_triggers, int alg)
+Support::Support(const dim4 data_dim, std::vector<int> support_area, float th, bool threshold_adjust, int sgma, std::vector<int> support_triggers, int alg, bool double_convolution)
 {
     threshold = th;
     threshold_adjust = threshold_adjust;
@@ -21,6 +21,7 @@ Support::Support(const dim4 data_dim, std::vector<int> support_area, float th, b
     algorithm = alg;
     af::array ones = constant(1, Utils::Int2Dim4(support_area), u32);
     support_array = Utils::PadAround(ones, data_dim, 0);
+    UpdateBounds();
     
     printf("support sum %i\n", sum<int>(support_array));
 
@@ -36,18 +37,24 @@ Support::Support(const dim4 data_dim, std::vector<int> support_area, float th, b
         } 
         printf("calculated sigma %f\n", sigmas[0]);
         //distribution = Utils::ReverseGaussDistribution(data_dim, sigmas, alpha);
-        distribution = Utils::GaussDistribution(data_dim, sigmas, alpha);
+        // the distribution multiplies the spectrum of the image; it is kept in unshifted order, and only the half
+        // calculated by R2C FFT in the first dimension
+        distribution = Utils::ifftshift(Utils::GaussDistribution(data_dim, sigmas, alpha))(seq(0, data_dim[0]/2), span, span, span).copy();
+        if (double_convolution)
+        {
+            distribution = distribution.as(f64);
+        }
+        delete [] sigmas;
     }
 }
 
 void Support::Update(const af::array ds_image_abs)
 {
-    printf("updating support\n");
     af::array convag = GaussConvFft(ds_image_abs);
-    d_type max_convag = af::max<d_type>(convag);
+    double max_convag = af::max<double>(convag);
     convag = convag/max_convag;
-    printf("convag sum max %f \n", sum<d_type>(convag));
     support_array = (convag >= threshold);
+    UpdateBounds();
     
 // if the support is too small, adjust threshold
 //    if (threshold_adjust)
@@ -63,7 +70,6 @@ void Support::Update(const af::array ds_image_abs)
 //            printf("in while loop support sum %f\n", sum<d_type>(support_array));
 //        }
 //    }
-    printf("support sum %f\n", sum<d_type>(support_array));
 }
 
 std::vector<int> Support::GetTriggers()
@@ -90,10 +96,9 @@ af::array Support::GetSupportArray(bool twin)
 {
     if (twin)
     {
+        // the quarter of the first two dimensions is selected by a JIT expression, so no mask array is created
         dim4 dims = support_array.dims();
-        af::array temp = constant(0, dims, u32);
-        temp( af::seq(0, dims[0]/2-1), af::seq(0, dims[1]/2-1), span, span) = 1;
-        return support_array * temp;
+        return support_array * (range(dims, 0) < dims[0]/2) * (range(dims, 1) < dims[1]/2);
     }
     else
     {
@@ -103,18 +108,20 @@ af::array Support::GetSupportArray(bool twin)
 
 af::array Support::GaussConvFft(af::array ds_image_abs)
 {
-    d_type image_sum = sum<d_type>(ds_image_abs);
-    af::array shifted = Utils::ifftshift(ds_image_abs);
-    af::array rs_amplitudes = Utils::fft(shifted);
-    af::array rs_amplitudes_cent = Utils::ifftshift(rs_amplitudes);
-    
-    af::array amp_dist = rs_amplitudes_cent * distribution;
-    shifted = Utils::ifftshift(amp_dist);
-    af::array convag_compl = Utils::ifft(shifted);
-    af::array convag = (Utils::ifftshift(convag_compl));
-    convag = real(convag);
-    convag(convag < 0) = 0;
-    d_type correction = image_sum/sum<d_type>(convag);
+    // with double distribution the convolution is calculated in double precision, and the result is compared with
+    // the threshold without converting back
+    ds_image_abs = ds_image_abs.as(distribution.type());
+    double image_sum = sum<double>(ds_image_abs);
+    // the image is real, so R2C FFT calculates only half of the spectrum in the first dimension, and the inverse C2R
+    // FFT returns real array; the distribution is precomputed in unshifted order, which is equivalent to shifting
+    // the image and the spectrum for even dimensions
+    dim4 dims = ds_image_abs.dims();
+    af::array spectrum = fftR2C<nD>(ds_image_abs);
+    spectrum *= distribution;
+    af::array convag = fftC2R<nD>(spectrum, dims[0] % 2 == 1);
+    convag = max(convag, 0.0);
+    // the scale of the inverse transform does not matter, as the result is normalized to the image sum
+    double correction = image_sum/sum<double>(convag);
     convag *= correction;
     return convag;
 }
@@ -136,4 +143,70 @@ af::array Support::GaussConvFft(af::array ds_image_abs)
 //    return convag;
 //}
 
+void Support::SetSupportArray(af::array support)
+{
+    support_array = support;
+    UpdateBounds();
+}
+
+void Support::UpdateBounds()
+{
+    // the support is projected on each axis, and only the projections are copied to host
+    dim4 dims = support_array.dims();
+    bounds.clear();
+    for (int i = 0; i < nD; i++)
+    {
+        af::array projection = support_array != 0;
+        for (int j = 0; j < nD; j++)
+        {
+            if (j != i)
+            {
+                projection = anyTrue(projection, j);
+            }
+        }
+        std::vector<unsigned char> in_support(dims[i]);
+        projection.as(u8).host(&in_support[0]);
+        int beginning = 0;
+        while ((beginning < dims[i]) && (in_support[beginning] == 0))
+        {
+            beginning++;
+        }
+        int end = dims[i];
+        while ((end > beginning) && (in_support[end - 1] == 0))
+        {
+            end--;
+        }
+        bounds.push_back(beginning);
+        bounds.push_back(end);
+    }
+    // an empty support has empty box, the whole array is used then
+    if (bounds[0] == bounds[1])
+    {
+        for (int i = 0; i < nD; i++)
+        {
+            bounds[2*i] = 0;
+            bounds[2*i + 1] = dims[i];
+        }
+    }
+}
+
+std::vector<int> Support::GetBounds()
+{
+    return bounds;
+}
 
+d_type Support::GetFillFraction()
+{
+    return sum<d_type>(support_array) / support_array.elements();
+}
+
+void Support::SaveCheckpoint(const char * filename)
+{
+    saveArray("support", support_array, filename, true);
+}
+
+void Support::LoadCheckpoint(const char * filename)
+{
+    support_array = readArray(filename, "support");
+    UpdateBounds();
+}
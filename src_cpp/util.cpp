@@ -6,18 +6,74 @@
 
 using namespace af;
 
-int Utils::GetDimension(int dim)
+// the largest dimension in the precomputed tables of supported dimensions
+static const int SMOOTH_LIMIT = 1 << 16;
+
+const std::vector<int> & Utils::GetSmoothNumbers()
+{
+    // the tables are calculated once, the cpu FFT library supports also factor of 7
+    static const std::vector<int> numbers235 = CalcSmoothNumbers(false);
+    static const std::vector<int> numbers2357 = CalcSmoothNumbers(true);
+    if (af::getActiveBackend() == AF_BACKEND_CPU)
+    {
+        return numbers2357;
+    }
+    return numbers235;
+}
+
+std::vector<int> Utils::CalcSmoothNumbers(bool with_seven)
+{
+    std::vector<int> primes;
+    primes.push_back(2);
+    primes.push_back(3);
+    primes.push_back(5);
+    if (with_seven)
+    {
+        primes.push_back(7);
+    }
+    std::vector<int> numbers(1, 1);
+    for (unsigned int i = 0; i < primes.size(); i++)
+    {
+        std::vector<int> multiplied;
+        for (unsigned int j = 0; j < numbers.size(); j++)
+        {
+            for (long number = numbers[j]; number <= SMOOTH_LIMIT; number *= primes[i])
+            {
+                multiplied.push_back(number);
+            }
+        }
+        numbers.swap(multiplied);
+    }
+    std::sort(numbers.begin(), numbers.end());
+    return numbers;
+}
+
+int Utils::GetDimension(int dim, int step)
 {
+    const std::vector<int> & numbers = GetSmoothNumbers();
+    for (std::vector<int>::const_iterator it = std::lower_bound(numbers.begin(), numbers.end(), dim); it != numbers.end(); ++it)
+    {
+        if ((*it - dim) % step == 0)
+        {
+            return *it;
+        }
+    }
+    // the dimension is beyond the table
     int new_dim = dim;
     while (! IsDimCorrect(new_dim))
     {
-        new_dim++;
+        new_dim += step;
     }
     return new_dim;
 }
 
 bool Utils::IsDimCorrect(int dim)
 {
+    if (dim <= SMOOTH_LIMIT)
+    {
+        const std::vector<int> & numbers = GetSmoothNumbers();
+        return std::binary_search(numbers.begin(), numbers.end(), dim);
+    }
     int sub = dim;
     while (sub % 2 == 0)
     {
@@ -31,6 +87,13 @@ bool Utils::IsDimCorrect(int dim)
     {
         sub = sub/5;
     }
+    if (af::getActiveBackend() == AF_BACKEND_CPU)
+    {
+        while (sub % 7 == 0)
+        {
+            sub = sub/7;
+        }
+    }
     if (sub == 1)
         return true;
     else
@@ -47,6 +110,11 @@ af::dim4 Utils::Int2Dim4(std::vector<int> dim)
 }
 
 
+af::seq Utils::BoxSeq(std::vector<int> bounds, int dim)
+{
+    return seq(bounds[2*dim], bounds[2*dim + 1] - 1);
+}
+
 af::array Utils::CropCenter(af::array arr, af::dim4 roi)
 {
     dim4 dims = arr.dims(); 
@@ -100,6 +168,30 @@ af::array Utils::ifft(af::array arr)
     }
 }
 
+af::array Utils::ifft(af::array arr, double norm_factor)
+{
+    if (nD == 3)
+    {
+        return ifft3Norm(arr, norm_factor);
+    }
+    else if (nD == 2)
+    {
+        return ifft2Norm(arr, norm_factor);
+    }
+}
+
+void Utils::FftInPlace(af::array & arr, double norm_factor)
+{
+    if (nD == 3)
+    {
+        fft3InPlace(arr, norm_factor);
+    }
+    else if (nD == 2)
+    {
+        fft2InPlace(arr, norm_factor);
+    }
+}
+
 //af::array Utils::CropCenterZeroPad(af::array arr, int * roi)
 //{
 //    dim4 dims = arr.dims();
@@ -338,7 +430,5 @@ af::array Utils::PadAround(af::array arr, af::dim4 new_dims, int pad)
 
 af::array Utils::GetRatio(af::array divident, af::array divisor)
 {
-    af::array divisor_copy = divisor.copy();
-    divisor_copy(divisor == 0) = 1;
-    return divident/divisor_copy;
+    return select(divisor == 0, divident, divident/divisor);
 }
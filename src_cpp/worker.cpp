@@ -13,6 +13,8 @@
 #include "math.h"
 #include "vector"
 #include "map"
+#include <algorithm>
+#include <stdexcept>
 #include "parameters.hpp"
 #include "support.hpp"
 #include "pcdi.hpp"
@@ -20,24 +22,29 @@
 #include "common.h"
 #include "algorithm.hpp"
 #include "util.hpp"
+#include "diagnostics.hpp"
 
-af::array data;   // this is abs
-int num_points;
-d_type norm_data;
-int current_iteration;
-af::array ds_image;
-int aver_iter;
-std::vector<d_type> aver_v;
-std::vector<float> support_vector;
-std::vector<d_type> coherence_vector;
 
-
-Reconstruction::Reconstruction(af::array image_data, af::array guess, const char* config_file)
+Reconstruction::Reconstruction(af::array image_data, af::array guess, const char* config_file, Progress *progress_queue)
 {
+    progress = progress_queue;
     data = image_data;
     ds_image = guess;
+    num_points = 0;
+    norm_data = 0;
+    current_iteration = 0;
+    aver_count = 0;
+    checkpoints = true;
     params = new Params(config_file, data.dims());
-    state = new State(params);
+    state = new State(params, progress);
+    diagnostics = new Diagnostics(params->GetDiagnosticsLevel(), params->GetDiagnosticsCapacity());
+}
+
+Reconstruction::~Reconstruction()
+{
+    delete state;
+    delete params;
+    delete diagnostics;
 }
 
 void Reconstruction::Init()
@@ -46,7 +53,6 @@ void Reconstruction::Init()
     state->Init();
     support = params->GetSupport();
     partialCoherence = params->GetPartialCoherence();
-    aver_iter = params->GetAvgIterations();
     if (partialCoherence != NULL)
     {
         partialCoherence->Init(data);
@@ -56,177 +62,325 @@ void Reconstruction::Init()
     // multiply the rs_amplitudes by max element of data array and the norm
     d_type max_data = af::max<d_type>(data);
     ds_image *= max_data * GetNorm(ds_image);
+    if (! initial_support.isempty())
+    {
+        support->SetSupportArray(initial_support);
+    }
 
 // the next two lines are for testing it sets initial guess to initial support    
 //    af::array temp = support->GetSupportArray();
 //    ds_image  = complex(temp.as((af_dtype) dtype_traits<d_type>::ctype), 0.0).as(c64);
     
     ds_image *= support->GetSupportArray();
-    printf("initial image norm %f\n", GetNorm(ds_image));
+    RecordNorm(DIAGNOSTICS_BASIC, "initial_image_norm", ds_image);
 
 }
 
+void Reconstruction::SetInitialSupport(af::array support)
+{
+    initial_support = support;
+}
+
+void Reconstruction::Reset(af::array guess)
+{
+    // the configuration is already parsed, only the mutable state is restarted
+    ds_image = guess;
+    aver_count = 0;
+    aver_amplitudes = af::array();
+    aver_sq_amplitudes = af::array();
+    aver_phase_factors = af::array();
+    delete state;
+    state = new State(params, progress);
+    state->Init();
+    if (partialCoherence != NULL)
+    {
+        partialCoherence->Init(data);
+    }
+    // the support is determined from the new image
+    support->Update(abs(ds_image).copy());
+    ds_image *= support->GetSupportArray();
+}
+
 
 void Reconstruction::Iterate()
 {
     while (state->Next())
     {
+        current_iteration = state->GetCurrentIteration();
         if (state->IsUpdateSupport())
         {
             support->Update(abs(ds_image).copy());
+            if (diagnostics->IsEnabled(DIAGNOSTICS_BASIC))
+            {
+                diagnostics->Record(current_iteration, "support_sum", sum<d_type>(support->GetSupportArray()));
+                diagnostics->Record(current_iteration, "support_fill_fraction", support->GetFillFraction());
+                std::vector<int> bounds = support->GetBounds();
+                double box_points = 1;
+                for (int i = 0; i < nD; i++)
+                {
+                    box_points *= bounds[2*i + 1] - bounds[2*i];
+                }
+                diagnostics->Record(current_iteration, "support_box_fraction", box_points / ds_image.elements());
+            }
         }
 
-        current_iteration = state->GetCurrentIteration();
         if (params->GetGC() && (current_iteration+1) % params->GetGC() == 0)
             af::deviceGC();
         Algorithm * alg  = state->GetCurrentAlg();
         alg->RunAlgorithm(this);
 
         Average();
+        RecordNorm(DIAGNOSTICS_BASIC, "image_norm", ds_image);
+        Checkpoint();
     }
-    printf("final image\n");
 
-    if (aver_v.size() > 0)
+    if (aver_count > 0)
     {
-        printf("final averaging\n");
-        af::array aver_a(ds_image.dims(), &aver_v[0]);
-        af::array ratio = Utils::GetRatio(aver_a, abs(ds_image));
-        ds_image *= ratio/aver_iter;                    
+        // the image outside of the box is not averaged; it is zeroed by the support, as the box covers the support of
+        // all averaging iterations
+        seq s0 = Utils::BoxSeq(aver_bounds, 0);
+        seq s1 = Utils::BoxSeq(aver_bounds, 1);
+        seq s2 = Utils::BoxSeq(aver_bounds, 2);
+        af::array image_box = ds_image(s0, s1, s2);
+        af::array ratio = Utils::GetRatio(aver_amplitudes, abs(image_box)) / aver_count;
+        ds_image(s0, s1, s2) = image_box * ratio.as(abs(image_box).type());
     }
     ds_image *= support->GetSupportArray();
-    VectorizeSupport(); 
-    if (partialCoherence != NULL)
-    {
-        VectorizeCoherence();
-    }
 }
 
 af::array Reconstruction::ModulusProjection()
 {
-    printf("------------------current iteration %i -----------------\n", current_iteration);
-    af::array rs_amplitudes;
-    dim4 dims = data.dims();
-    rs_amplitudes = Utils::ifft(ds_image)*num_points;
+    // the inverse FFT is not normalized, which replaces multiplying the result by num_points
+    af::array rs_amplitudes = Utils::ifft(ds_image, 1.0);
+    af::array abs_amplitudes = abs(rs_amplitudes);
 
-    
-    printf("data norm, ampl norm before ratio %fl %fl\n", GetNorm(data), GetNorm(rs_amplitudes));
-    state->RecordError( GetNorm(abs(rs_amplitudes)(rs_amplitudes > 0)-data(rs_amplitudes > 0))/norm_data );
+    RecordNorm(DIAGNOSTICS_DETAILED, "amplitudes_norm", rs_amplitudes);
+    // the error is calculated on the device, and copied to host with errors of other iterations
+    state->RecordError( sum(Accumulated(flat(pow(select(abs_amplitudes > 0, abs_amplitudes - data, 0.0), 2))))/norm_data );
     
     if ((partialCoherence == NULL) || (partialCoherence->GetTriggers().size() == 0))
     {
-        printf("applying ratio\n");
         //rs_amplitudes = data * exp(af::complex(0, af::arg(rs_amplitudes)));
-        af::array ratio = Utils::GetRatio(data, abs(rs_amplitudes));        
-        rs_amplitudes *= ratio;
+        rs_amplitudes *= Utils::GetRatio(data, abs_amplitudes);
     }  
     else
     {
         if (current_iteration >= partialCoherence->GetTriggers()[0])
         {
-            printf("coherence using lucy\n");            
-            af::array abs_amplitudes = abs(rs_amplitudes).copy();
             af::array converged = partialCoherence->ApplyPartialCoherence(abs_amplitudes, current_iteration);
-            af::array ratio = Utils::GetRatio(data, abs(converged));
-            printf("ratio norm %f\n", GetNorm(ratio));
-
-            rs_amplitudes *= ratio;            
+            RecordNorm(DIAGNOSTICS_DETAILED, "coherence_norm", partialCoherence->GetKernelArray());
+            RecordNorm(DIAGNOSTICS_DETAILED, "converged_norm", converged);
+            rs_amplitudes *= Utils::GetRatio(data, abs(converged));
         }
         else
         {
-            printf("applying ratio\n");
             //rs_amplitudes = data * exp(af::complex(0, af::arg(rs_amplitudes)));
-            af::array ratio = Utils::GetRatio(data, abs(rs_amplitudes));
-            rs_amplitudes *= ratio;
+            rs_amplitudes *= Utils::GetRatio(data, abs_amplitudes);
         }
-        printf("setting previous\n");
         partialCoherence->SetPrevious(abs(rs_amplitudes));
     }
-    printf("ampl norm after ratio %fl\n", GetNorm(rs_amplitudes));
+    RecordNorm(DIAGNOSTICS_DETAILED, "amplitudes_norm_after_ratio", rs_amplitudes);
     
     if (params->GetGC() && current_iteration % params->GetGC() == 0)
         af::deviceGC();
     
-    return Utils::fft(rs_amplitudes)/num_points;
+    // the forward FFT is calculated in place, and normalized by num_points
+    Utils::FftInPlace(rs_amplitudes, 1.0/num_points);
+    return rs_amplitudes;
 
 }
 
 void Reconstruction::ModulusConstrainEr(af::array ds_image_raw)
 {
-    printf("er\n");
-    printf("image norm before support %fl\n", GetNorm(ds_image_raw));  
-    //ds_image = ds_image_raw * support->GetSupportArray(state->IsApplyTwin());
-    af::array support_array = support->GetSupportArray(state->IsApplyTwin());
-    ds_image = ds_image_raw * support_array;
-
-    printf("image norm after support %fl\n", GetNorm(ds_image));
+    RecordNorm(DIAGNOSTICS_DETAILED, "raw_image_norm", ds_image_raw);
+    // the support array is a JIT expression, so the new image is calculated in one kernel
+    ds_image = ds_image_raw * support->GetSupportArray(state->IsApplyTwin());
 }
 
 void Reconstruction::ModulusConstrainHio(af::array ds_image_raw)
 {
-    
-    printf("hio\n");
-    printf("image norm before support %fl\n",GetNorm(ds_image_raw));
+    RecordNorm(DIAGNOSTICS_DETAILED, "raw_image_norm", ds_image_raw);
     //ds_image(support->GetSupportArray(state->IsApplyTwin()) == 0) = (ds_image - ds_image_raw * params->GetBeta())(support->GetSupportArray(state->IsApplyTwin()) == 0);
-    af::array support_array = support->GetSupportArray(state->IsApplyTwin());
-    af::array adjusted_calc_image = ds_image_raw * params->GetBeta();
-    af::array combined_image = ds_image - adjusted_calc_image;
-    ds_image = ds_image_raw;
-    ds_image(support_array == 0) = combined_image(support_array == 0);
-    printf("image norm after support %fl\n",GetNorm(ds_image));
+    // the new image is the raw image within support, and the current image decreased by the raw image times beta
+    // outside; select evaluates the whole expression in one kernel, without intermediate arrays
+    ds_image = select(support->GetSupportArray(state->IsApplyTwin()) != 0, ds_image_raw, ds_image - ds_image_raw * params->GetBeta());
 }
 
 void Reconstruction::Average()
 {
     if (state->IsAveragingIteration())
     {
-        printf("average\n");
-    //    int aver_num = params->GetAvgIterations();
-        af::array abs_image = abs(ds_image).copy();
-        d_type *image_v = abs_image.host<d_type>();
-        std::vector<d_type> v(image_v, image_v + ds_image.elements());
-        if (aver_v.size() == 0)
+        // the sums stay on the device; each is evaluated, so the JIT expression does not grow with iterations
+        if (aver_count == 0)
         {
-            printf("creating aver vector\n");
-            for (int i = 0; i < v.size(); i++)
-            {
-                aver_v.push_back(v[i]);
-            }            
+            aver_bounds = support->GetBounds();
         }
         else
         {
-            printf("adding aver vector\n");
-            for (int i = 0; i < v.size(); i++)
+            GrowAverageBox(support->GetBounds());
+        }
+        af::array image_box = Accumulated(ds_image(Utils::BoxSeq(aver_bounds, 0), Utils::BoxSeq(aver_bounds, 1), Utils::BoxSeq(aver_bounds, 2)));
+        af::array abs_image = abs(image_box);
+        if (aver_count == 0)
+        {
+            aver_amplitudes = constant(0, image_box.dims(), abs_image.type());
+            if (params->IsAvgStatistics())
             {
-                aver_v[i] += v[i];
-            }            
+                aver_sq_amplitudes = constant(0, image_box.dims(), abs_image.type());
+                aver_phase_factors = constant(0, image_box.dims(), image_box.type());
+            }
+        }
+        aver_amplitudes += abs_image;
+        aver_amplitudes.eval();
+        if (params->IsAvgStatistics())
+        {
+            aver_sq_amplitudes += abs_image * abs_image;
+            aver_sq_amplitudes.eval();
+            // the phases are averaged as unit phase factors, so the wrapping at pi does not bias the average
+            aver_phase_factors += image_box / select(abs_image > 0, abs_image, 1.0);
+            aver_phase_factors.eval();
         }
+        aver_count++;
+    }
+}
 
-        delete [] image_v;
+void Reconstruction::GrowAverageBox(std::vector<int> bounds)
+{
+    std::vector<int> box = aver_bounds;
+    for (int i = 0; i < box.size(); i += 2)
+    {
+        box[i] = std::min(box[i], bounds[i]);
+        box[i + 1] = std::max(box[i + 1], bounds[i + 1]);
+    }
+    if (box == aver_bounds)
+    {
+        return;
+    }
+    // the sums are padded with zeros, as the image outside of the previous box was not in support
+    dim4 dims(1, 1, 1, 1);
+    std::vector<int> inner(box.size());
+    for (int i = 0; i < box.size(); i += 2)
+    {
+        dims[i / 2] = box[i + 1] - box[i];
+        inner[i] = aver_bounds[i] - box[i];
+        inner[i + 1] = aver_bounds[i + 1] - box[i];
+    }
+    af::array * sums[] = {&aver_amplitudes, &aver_sq_amplitudes, &aver_phase_factors};
+    for (int i = 0; i < 3; i++)
+    {
+        if (! sums[i]->isempty())
+        {
+            af::array padded = constant(0, dims, sums[i]->type());
+            padded(Utils::BoxSeq(inner, 0), Utils::BoxSeq(inner, 1), Utils::BoxSeq(inner, 2)) = *sums[i];
+            *sums[i] = padded;
+        }
     }
+    aver_bounds = box;
 }
 
-double Reconstruction::GetNorm(af::array arr)
+void Reconstruction::Checkpoint()
+{
+    int interval = params->GetCheckpointInterval();
+    if (checkpoints && (interval > 0) && ((current_iteration + 1) % interval == 0))
+    {
+        SaveCheckpoint(params->GetCheckpointFile());
+    }
+}
+
+void Reconstruction::SetCheckpoints(bool enabled)
 {
-    return sum<d_type>(pow(abs(arr), 2));
+    checkpoints = enabled;
 }
 
-void Reconstruction::VectorizeSupport()
+void Reconstruction::SaveCheckpoint(std::string filename)
 {
-    af::array a = support->GetSupportArray().as(f32);
-    float *support_v = a.host<float>();
-    std::vector<float> v(support_v, support_v + a.elements());
-    support_vector = v;
-    delete [] support_v;
- }
-
-void Reconstruction::VectorizeCoherence()
+    std::string temp_filename = filename + ".tmp";
+    const char * temp = temp_filename.c_str();
+    // the first array creates the file, the others are appended
+    saveArray("image", ds_image, temp, false);
+    int count[] = {aver_count};
+    saveArray("aver_count", af::array(1, count), temp, true);
+    if (aver_count > 0)
+    {
+        saveArray("aver_bounds", af::array(aver_bounds.size(), &aver_bounds[0]), temp, true);
+        saveArray("aver_amplitudes", aver_amplitudes, temp, true);
+        if (! aver_sq_amplitudes.isempty())
+        {
+            saveArray("aver_sq_amplitudes", aver_sq_amplitudes, temp, true);
+            saveArray("aver_phase_factors", aver_phase_factors, temp, true);
+        }
+    }
+    state->SaveCheckpoint(temp);
+    support->SaveCheckpoint(temp);
+    if (partialCoherence != NULL)
+    {
+        partialCoherence->SaveCheckpoint(temp);
+    }
+    if (std::rename(temp, filename.c_str()) != 0)
+    {
+        printf("could not write checkpoint file %s\n", filename.c_str());
+    }
+}
+
+void Reconstruction::LoadCheckpoint(std::string filename)
 {
-    // get the partial coherence as double, so it will work for float and double data types
-    af::array a = partialCoherence->GetKernelArray();
-    d_type *coherence_v = a.host<d_type>();
-    std::vector<d_type> v(coherence_v, coherence_v + a.elements());
-    coherence_vector = v;
-    delete [] coherence_v;
+    const char * file = filename.c_str();
+    af::array saved_image = readArray(file, "image");
+    // a checkpoint of other data or precision would be continued with arrays of wrong size or type
+    if ((saved_image.dims() != ds_image.dims()) || (saved_image.type() != ds_image.type()))
+    {
+        throw std::invalid_argument("the checkpoint " + filename + " does not match the data dimensions or precision");
+    }
+    ds_image = saved_image;
+    readArray(file, "aver_count").host(&aver_count);
+    if (aver_count > 0)
+    {
+        af::array saved_bounds = readArray(file, "aver_bounds");
+        aver_bounds.resize(saved_bounds.elements());
+        saved_bounds.host(&aver_bounds[0]);
+        aver_amplitudes = readArray(file, "aver_amplitudes");
+        if (readArrayCheck(file, "aver_sq_amplitudes") >= 0)
+        {
+            aver_sq_amplitudes = readArray(file, "aver_sq_amplitudes");
+            aver_phase_factors = readArray(file, "aver_phase_factors");
+        }
+    }
+    state->LoadCheckpoint(file);
+    current_iteration = state->GetCurrentIteration();
+    support->LoadCheckpoint(file);
+    if (partialCoherence != NULL)
+    {
+        partialCoherence->LoadCheckpoint(file);
+    }
+}
+
+void Reconstruction::RecordNorm(int level, const char * name, af::array arr)
+{
+    // the norm is a reduction that synchronizes with the device, so it is calculated only if the level is enabled
+    if (diagnostics->IsEnabled(level))
+    {
+        diagnostics->Record(current_iteration, name, GetNorm(arr));
+    }
+}
+
+Diagnostics * Reconstruction::GetDiagnostics()
+{
+    return diagnostics;
+}
+
+double Reconstruction::GetNorm(af::array arr)
+{
+    return sum<double>(Accumulated(pow(abs(arr), 2)));
+}
+
+af::array Reconstruction::Accumulated(af::array arr)
+{
+    if (! params->IsMixedPrecision())
+    {
+        return arr;
+    }
+    // the conversion is part of the JIT expression, so the array is read from memory in single precision
+    return arr.as(arr.iscomplex() ? c64 : f64);
 }
 
 int Reconstruction::GetCurrentIteration()
@@ -244,23 +398,46 @@ std::vector<d_type> Reconstruction::GetErrors()
     return state->GetErrors();
 }
 
-std::vector<float> Reconstruction::GetSupportVector()
+af::array Reconstruction::GetSupportArray()
+{
+    return support->GetSupportArray();
+}
+
+af::array Reconstruction::GetCoherenceArray()
 {
-    return support_vector;
+    if (partialCoherence == NULL)
+    {
+        return af::array();
+    }
+    return partialCoherence->GetKernelArray();
 }
 
-std::vector<d_type> Reconstruction::GetCoherenceVector()
+af::array Reconstruction::GetAmplitudeVariance()
 {
-    return coherence_vector;
+    if (aver_sq_amplitudes.isempty())
+    {
+        return af::array();
+    }
+    af::array mean = aver_amplitudes / aver_count;
+    af::array variance = constant(0, ds_image.dims(), (af_dtype) dtype_traits<d_type>::af_type);
+    af::array box_variance = max(aver_sq_amplitudes / aver_count - mean * mean, 0.0);
+    variance(Utils::BoxSeq(aver_bounds, 0), Utils::BoxSeq(aver_bounds, 1), Utils::BoxSeq(aver_bounds, 2)) = box_variance.as(variance.type());
+    return variance;
 }
 
-std::vector<d_type> Reconstruction::GetCoherenceVectorR()
+af::array Reconstruction::GetAveragePhase()
 {
-    return coherence_vector;
+    if (aver_phase_factors.isempty())
+    {
+        return af::array();
+    }
+    af::array phase = constant(0, ds_image.dims(), (af_dtype) dtype_traits<d_type>::af_type);
+    phase(Utils::BoxSeq(aver_bounds, 0), Utils::BoxSeq(aver_bounds, 1), Utils::BoxSeq(aver_bounds, 2)) = arg(aver_phase_factors).as(phase.type());
+    return phase;
 }
 
-std::vector<d_type> Reconstruction::GetCoherenceVectorI()
+std::vector<int> Reconstruction::GetSupportBounds()
 {
-    return coherence_vector;
+    return support->GetBounds();
 }
 
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright (c) 2016, UChicago Argonne, LLC. All rights reserved.         #
+#                                                                         #
+# Copyright 2016. UChicago Argonne, LLC. This software was produced       #
+# under U.S. Government contract DE-AC02-06CH11357 for Argonne National   #
+# Laboratory (ANL), which is operated by UChicago Argonne, LLC for the    #
+# U.S. Department of Energy. The U.S. Government has rights to use,       #
+# reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR    #
+# UChicago Argonne, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR        #
+# ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is     #
+# modified to produce derivative works, such modified software should     #
+# be clearly marked, so as not to confuse it with the version available   #
+# from ANL.                                                               #
+#                                                                         #
+# Additionally, redistribution and use in source and binary forms, with   #
+# or without modification, are permitted provided that the following      #
+# conditions are met:                                                     #
+#                                                                         #
+#     * Redistributions of source code must retain the above copyright    #
+#       notice, this list of conditions and the following disclaimer.     #
+#                                                                         #
+#     * Redistributions in binary form must reproduce the above copyright #
+#       notice, this list of conditions and the following disclaimer in   #
+#       the documentation and/or other materials provided with the        #
+#       distribution.                                                     #
+#                                                                         #
+#     * Neither the name of UChicago Argonne, LLC, Argonne National       #
+#       Laboratory, ANL, the U.S. Government, nor the names of its        #
+#       contributors may be used to endorse or promote products derived   #
+#       from this software without specific prior written permission.     #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY UChicago Argonne, LLC AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS       #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL UChicago     #
+# Argonne, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,        #
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,    #
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;        #
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER        #
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT      #
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN       #
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE         #
+# POSSIBILITY OF SUCH DAMAGE.                                             #
+# #########################################################################
+"""
+Please make sure the installation :ref:`pre-requisite-reference-label` are met.
+This module reconstructs many scans in one run. The scans and their configuration files are listed in a manifest,
+and are reconstructed by a pool of worker processes that live for the whole batch, so the bridge module is imported
+and the device is initialized once in each process. Each worker reads and prepares the data of its next scan while
+the current scan is reconstructed, as the reconstruction runs outside of the Python interpreter, and writes the
+results of the scan in background while the next scan is reconstructed. The results of each scan are written to its
+own directory in the configured results directory, named after the data file, so the scans that share a
+configuration do not overwrite each other's results. The reconstructions from multiple random guesses run one after
+another in the worker process, which initialized the device already.
+When the batch is completed a report of the times, the writing time hidden by the background writers, and the
+throughput in scans per hour is printed.
+"""
+
+import os
+import time
+import threading
+import multiprocessing as mp
+import src_py.controller.reconstruction as rec
+import src_py.controller.result_writer as rw
+import src_py.utilities.cpu_resources as cpu
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+__author__ = "Barbara Frosik"
+__copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['read_manifest',
+           'get_scan_names',
+           'get_scan_dir',
+           'batch_reconstruction']
+
+# time in seconds between checks whether the workers are alive while waiting for results
+RESULT_POLL_INTERVAL = 10.0
+# number of results of each worker waiting to be written
+WRITER_CAPACITY = 2
+
+
+def read_manifest(manifest):
+    """
+    This function reads the manifest file. Each line of the file contains a data file name and a configuration file
+    name separated by white space; empty lines and lines starting with # are skipped.
+
+    Parameters
+    ----------
+    manifest : str
+        manifest file name
+
+    Returns
+    -------
+    jobs : list
+        list of (data file name, configuration file name) tuples
+    """
+    jobs = []
+    with open(manifest, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            scan, conf = line.split()
+            jobs.append((scan, conf))
+    return jobs
+
+
+def get_scan_names(jobs):
+    """
+    This function returns names of the results directories of the jobs. The name is the data file name without
+    extension; if more jobs have the same name, the job number is appended to it.
+
+    Parameters
+    ----------
+    jobs : list
+        list of (data file name, configuration file name) tuples
+
+    Returns
+    -------
+    names : list
+        list of directory names, one for each job
+    """
+    names = [os.path.splitext(os.path.basename(scan))[0] for scan, conf in jobs]
+    return [name if names.count(name) == 1 else name + '_' + str(i) for i, name in enumerate(names)]
+
+
+def get_scan_dir(config_map, name):
+    """
+    This function returns the directory the results of the scan are written to, the scan directory in the configured
+    results directory, or in the current directory if not configured.
+    """
+    try:
+        res_dir = config_map.res_dir
+    except AttributeError:
+        res_dir = ''
+    return os.path.join(res_dir, name)
+
+
+def _prepare_job(proc, job):
+    """
+    This function reads the configuration and prepares the data of the job. The failure is returned in the result,
+    so it does not stop the worker.
+    """
+    if job is None:
+        return None
+    scan, conf, name = job
+    result = {'scan': scan, 'conf': conf, 'res_dir': None, 'prepare_time': 0, 'reconstruct_time': 0, 'error': None,
+              'failure': None}
+    start = time.time()
+    try:
+        config_map = rec.read_config(conf)
+        if config_map is None:
+            raise ValueError("can't read configuration file " + conf)
+        result['res_dir'] = get_scan_dir(config_map, name)
+        data = rec.get_prepared_data(config_map, scan, proc)
+        if data is None:
+            raise ValueError('the data in ' + scan + ' is not valid')
+    except Exception as e:
+        result['failure'] = str(e)
+        return result, None, None
+    result['prepare_time'] = time.time() - start
+    return result, config_map, data
+
+
+def _run_job(proc, cores, prepared, writer):
+    """
+    This function reconstructs the prepared data on the cores of the worker, and queues the results to the writer.
+    """
+    result, config_map, data = prepared
+    if result['failure'] is not None:
+        return result
+    start = time.time()
+    try:
+        # the worker process initialized the device, so it does not start a pool of processes for multiple starts; the
+        # workers may reconstruct with the same configuration, so they do not write the configured checkpoints
+        image, support, coherence, errors = rec.run_reconstruction(proc, data, result['conf'], config_map,
+                                                                   processes=0, cores=cores, checkpoints=False)
+        result['error'] = float(errors[-1])
+        writer.put(rec.save_results, result['conf'], config_map, image, support, coherence, result['res_dir'])
+    except Exception as e:
+        result['failure'] = str(e)
+    result['reconstruct_time'] = time.time() - start
+    return result
+
+
+def _batch_worker(proc, cores, jobs, results):
+    """
+    This function is run by each worker process. It takes jobs from the jobs queue until it gets None, and puts the
+    result of each job to the results queue. The next job is taken and prepared by a thread while the current job is
+    reconstructed. When all results are written, the statistics of the writer are put to the results queue.
+    """
+    if cores:
+        cpu.set_cpu_resources(cores=cores)
+    writer = rw.ResultWriter(WRITER_CAPACITY)
+    prepared = _prepare_job(proc, jobs.get())
+    while prepared is not None:
+        next_prepared = []
+        prefetch = threading.Thread(target=lambda: next_prepared.append(_prepare_job(proc, jobs.get())))
+        prefetch.start()
+        results.put(_run_job(proc, cores, prepared, writer))
+        prefetch.join()
+        prepared = next_prepared[0]
+    results.put(writer.close())
+
+
+def batch_reconstruction(proc, jobs, processes=1, cores=None):
+    """
+    This function reconstructs all scans of the batch on a pool of worker processes. The cores are partitioned
+    between the processes, so the concurrent reconstructions do not share cores.
+
+    Parameters
+    ----------
+    proc : str
+        a string indicating the processor type
+
+    jobs : list or str
+        list of (data file name, configuration file name) tuples, or the manifest file name
+
+    processes : int
+        number of worker processes
+
+    cores : list
+        numbers of cores partitioned between the worker processes, if None all cores the process runs on
+
+    Returns
+    -------
+    results : list
+        list of dictionaries with the scan, configuration, results directory, preparation and reconstruction times,
+        final error, and failure message or None, in the order of completion
+    """
+    if not isinstance(jobs, list):
+        jobs = read_manifest(jobs)
+    processes = max(min(processes, len(jobs)), 1)
+
+    job_queue = mp.Queue()
+    result_queue = mp.Queue()
+    for job, name in zip(jobs, get_scan_names(jobs)):
+        job_queue.put((job[0], job[1], name))
+    # each worker stops at its own None
+    for i in range(processes):
+        job_queue.put(None)
+
+    start = time.time()
+    workers = [mp.Process(target=_batch_worker, args=(proc, part, job_queue, result_queue))
+               for part in cpu.partition_cores(processes, cores)]
+    for worker in workers:
+        worker.start()
+    results = []
+    writer_stats = []
+    try:
+        while len(results) < len(jobs) or len(writer_stats) < len(workers):
+            try:
+                result = result_queue.get(timeout=RESULT_POLL_INTERVAL)
+            except queue.Empty:
+                # a worker that crashed does not report its jobs, so the batch ends when no worker is left
+                if not any(worker.is_alive() for worker in workers):
+                    print ('the workers exited before completing the batch')
+                    break
+                continue
+            if 'scan' not in result:
+                writer_stats.append(result)
+                continue
+            results.append(result)
+            if result['failure'] is None:
+                print ('reconstructed ' + result['scan'] + ' error ' + str(result['error']))
+            else:
+                print ('failed ' + result['scan'] + ': ' + result['failure'])
+    finally:
+        for worker in workers:
+            worker.join()
+    _report(results, writer_stats, time.time() - start)
+    return results
+
+
+def _report(results, writer_stats, elapsed):
+    """
+    This function prints times of the jobs, the writing time, and the throughput of the batch.
+    """
+    print ('%10s %10s %10s  %s' % ('prepare', 'reconst', 'error', 'scan'))
+    for result in results:
+        error = 'failed' if result['failure'] is not None else '%10.5f' % result['error']
+        print ('%10.2f %10.2f %10s  %s' % (result['prepare_time'], result['reconstruct_time'], error, result['scan']))
+    for stats in writer_stats:
+        for failure in stats['failures']:
+            print ('failed writing results: ' + failure)
+    write_time = sum(stats['write_time'] for stats in writer_stats)
+    hidden_time = sum(stats['hidden_time'] for stats in writer_stats)
+    print ('writing results took ' + str(write_time) + ' seconds, ' + str(hidden_time) +
+           ' seconds of it were hidden by reconstructions')
+    completed = len([result for result in results if result['failure'] is None])
+    print ('completed ' + str(completed) + ' of ' + str(len(results)) + ' scans in ' + str(elapsed) + ' seconds, ' +
+           str(completed * 3600.0 / elapsed) + ' scans per hour')
@@ -0,0 +1,1084 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright (c) 2016, UChicago Argonne, LLC. All rights reserved.         #
+#                                                                         #
+# Copyright 2016. UChicago Argonne, LLC. This software was produced       #
+# under U.S. Government contract DE-AC02-06CH11357 for Argonne National   #
+# Laboratory (ANL), which is operated by UChicago Argonne, LLC for the    #
+# U.S. Department of Energy. The U.S. Government has rights to use,       #
+# reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR    #
+# UChicago Argonne, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR        #
+# ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is     #
+# modified to produce derivative works, such modified software should     #
+# be clearly marked, so as not to confuse it with the version available   #
+# from ANL.                                                               #
+#                                                                         #
+# Additionally, redistribution and use in source and binary forms, with   #
+# or without modification, are permitted provided that the following      #
+# conditions are met:                                                     #
+#                                                                         #
+#     * Redistributions of source code must retain the above copyright    #
+#       notice, this list of conditions and the following disclaimer.     #
+#                                                                         #
+#     * Redistributions in binary form must reproduce the above copyright #
+#       notice, this list of conditions and the following disclaimer in   #
+#       the documentation and/or other materials provided with the        #
+#       distribution.                                                     #
+#                                                                         #
+#     * Neither the name of UChicago Argonne, LLC, Argonne National       #
+#       Laboratory, ANL, the U.S. Government, nor the names of its        #
+#       contributors may be used to endorse or promote products derived   #
+#       from this software without specific prior written permission.     #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY UChicago Argonne, LLC AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS       #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL UChicago     #
+# Argonne, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,        #
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,    #
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;        #
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER        #
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT      #
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN       #
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE         #
+# POSSIBILITY OF SUCH DAMAGE.                                             #
+# #########################################################################
+"""
+Please make sure the installation :ref:`pre-requisite-reference-label` are met.
+This module is a pure NumPy implementation of the CFM (Calc Fast Module). It runs the same ER/HIO iterations with support
+and partial coherence updates as the C++ module, and does not need to be compiled. It is used on machines where the
+ArrayFire library is not available, and as a performance baseline for the other processor types.
+The module has the same interface as the bridge modules: the data is passed as flat array in column-major order
+with the dimensions, and the results are returned in the same order.
+The FFTs are calculated by scipy.fft with multiple workers if available, otherwise by numpy.fft.
+"""
+
+import os
+import time
+import collections
+import numpy as np
+import pylibconfig2 as cfg
+import src_py.utilities.utils as ut
+import src_py.utilities.cpu_resources as cpu
+
+try:
+    import scipy.fft as sfft
+except ImportError:
+    sfft = None
+
+
+__author__ = "Barbara Frosik"
+__copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['d_type',
+           'D_TYPES',
+           'PyBridge']
+
+# default numpy type of the data, the image is of matching complex type
+d_type = np.float32
+# numpy type of the data of each precision; the precision is chosen for each PyBridge instance, the mixed precision
+# runs in float and accumulates in double precision
+D_TYPES = {'float': np.float32, 'double': np.float64, 'mixed': np.float32}
+
+# diagnostics levels, the same as in the C++ module
+DIAGNOSTICS_NONE = 0
+DIAGNOSTICS_BASIC = 1
+DIAGNOSTICS_DETAILED = 2
+
+# reasons the iterations were stopped before the configured number of iterations, as in common.h
+STOP_NONE = 0
+STOP_CONVERGED = 1
+STOP_DIVERGED = 2
+STOP_TIME_BUDGET = 3
+
+
+def as_buffer(arr, dtype=d_type):
+    """
+    Returns the array as a contiguous flat array of the given type. No copy is made if the array already meets these
+    requirements.
+    """
+    return np.ascontiguousarray(arr, dtype=dtype).ravel()
+
+
+def _fftn(arr, workers, overwrite=False):
+    """
+    Returns forward FFT of the array. If overwrite is True, the array may be used as work space.
+    """
+    if sfft is None:
+        return np.fft.fftn(arr).astype(arr.dtype, copy=False)
+    return sfft.fftn(arr, overwrite_x=overwrite, workers=workers)
+
+
+def _ifftn(arr, workers, overwrite=False):
+    """
+    Returns inverse FFT of the array, normalized by number of elements. If overwrite is True, the array may be used as
+    work space.
+    """
+    if sfft is None:
+        return np.fft.ifftn(arr).astype(arr.dtype, copy=False)
+    return sfft.ifftn(arr, overwrite_x=overwrite, workers=workers)
+
+
+def _rfftn(arr, shape, workers):
+    """
+    Returns forward FFT of the real array zero padded to shape.
+    """
+    if sfft is None:
+        return np.fft.rfftn(arr, shape)
+    return sfft.rfftn(arr, shape, workers=workers)
+
+
+def _irfftn(arr, shape, workers):
+    """
+    Returns real inverse FFT of the array of the given shape.
+    """
+    if sfft is None:
+        return np.fft.irfftn(arr, shape)
+    return sfft.irfftn(arr, shape, overwrite_x=True, workers=workers)
+
+
+def fft_convolve(arr, kernel, workers=-1):
+    """
+    This function convolves the real array with the real kernel using real FFT. The result has the dimensions of the
+    array and is aligned in the same way as af::fftConvolve result.
+
+    Parameters
+    ----------
+    arr : array
+        real array
+
+    kernel : array
+        real kernel
+
+    workers : int
+        number of FFT workers, negative values count from number of cpus
+
+    Returns
+    -------
+    convolved : array
+        convolved array
+    """
+    fft_shape = get_convolution_shape(arr.shape, kernel.shape)
+    return convolve_spectrum(arr, _rfftn(kernel, fft_shape, workers), fft_shape, kernel.shape, workers)
+
+
+def get_convolution_shape(shape, kernel_shape):
+    """
+    Returns the FFT shape used to convolve array of the given shape with kernel of the kernel shape.
+    """
+    return [ut.get_fft_dim(shape[i] + kernel_shape[i] - 1, 1, 'numpy') for i in range(len(shape))]
+
+
+def convolve_spectrum(arr, spectrum, fft_shape, kernel_shape, workers=-1):
+    """
+    This function convolves the real array with the kernel given by its real FFT spectrum of the fft_shape, so the
+    spectrum of a kernel that does not change is calculated once.
+    """
+    spectrum = spectrum * _rfftn(arr, fft_shape, workers)
+    convolved = _irfftn(spectrum, fft_shape, workers)
+    start = [dim // 2 for dim in kernel_shape]
+    return convolved[tuple(slice(start[i], start[i] + arr.shape[i]) for i in range(arr.ndim))].astype(arr.dtype)
+
+
+def get_ratio(divident, divisor):
+    """
+    Returns the divident divided by divisor, where the elements of divisor equal to zero are replaced by one.
+    """
+    return np.divide(divident, divisor, out=np.array(divident, dtype=divisor.dtype), where=(divisor != 0))
+
+
+def crop_center(arr, roi):
+    """
+    Returns the centered sub-array of the roi dimensions.
+    """
+    return arr[tuple(slice((arr.shape[i] - roi[i]) // 2, (arr.shape[i] - roi[i]) // 2 + roi[i])
+                     for i in range(arr.ndim))]
+
+
+def get_norm(arr):
+    """
+    Returns sum of squared absolute values of the array.
+    """
+    return np.vdot(arr, arr).real
+
+
+def _get(config_map, name, default):
+    """
+    Returns the configuration parameter, or default if the parameter is not defined.
+    """
+    try:
+        return getattr(config_map, name)
+    except AttributeError:
+        return default
+
+
+class Params:
+    """
+    This class holds the reconstruction parameters parsed from the configuration, the same way as the C++ Params.
+    """
+
+    def __init__(self, config_map, dims, dtype=d_type):
+        """
+        The constructor parses the configuration map.
+
+        Parameters
+        ----------
+        config_map : dict
+            configuration map
+
+        dims : tuple
+            dimensions of the data
+
+        dtype : type
+            numpy type of the data
+
+        Returns
+        -------
+        none
+        """
+        # list of (algorithm, iteration at which the algorithm is switched) pairs
+        self.alg_switches = []
+        switch_iter = 0
+        for sequence in _get(config_map, 'algorithm_sequence', ()):
+            for k in range(sequence[0]):
+                for alg in sequence[1:]:
+                    switch_iter += alg[1]
+                    self.alg_switches.append((alg[0], switch_iter))
+        self.number_iterations = switch_iter
+        self.beta = _get(config_map, 'beta', .9)
+        self.avg_iterations = _get(config_map, 'avg_iterations', 0)
+        self.avg_statistics = _get(config_map, 'avg_statistics', False)
+        self.twin = _get(config_map, 'twin', -1)
+        self.diagnostics_level = _get(config_map, 'diagnostics_level', DIAGNOSTICS_NONE)
+        self.diagnostics_capacity = _get(config_map, 'diagnostics_capacity', 10000)
+        self.error_batch = max(_get(config_map, 'error_batch', 50), 1)
+        self.convergence_window = _get(config_map, 'convergence_window', 0)
+        self.convergence_threshold = _get(config_map, 'convergence_threshold', 0)
+        self.divergence_factor = _get(config_map, 'divergence_factor', 0)
+        self.time_budget = _get(config_map, 'time_budget', 0)
+        self.checkpoint_file = _get(config_map, 'checkpoint_file', None)
+        self.checkpoint_interval = _get(config_map, 'checkpoint_interval', 0) if self.checkpoint_file else 0
+        self.dtype = dtype
+        # the module runs in the type of the data; in mixed precision the errors, averages and support convolution are
+        # accumulated in double precision
+        self.mixed_precision = _get(config_map, 'precision', 'float') == 'mixed'
+
+        support_area = []
+        for i, area in enumerate(_get(config_map, 'support_area', ())):
+            if isinstance(area, float):
+                area = int(area * dims[i])
+            support_area.append(area)
+        self.support = Support(dims, support_area, _get(config_map, 'support_threshold', 0),
+                               _get(config_map, 'support_sigma', 0), self.parse_triggers(config_map, 'support'),
+                               _get(config_map, 'support_type', None), self.mixed_precision, dtype)
+
+        self.partial_coherence = None
+        pcdi_alg = _get(config_map, 'partial_coherence_type', None)
+        triggers = self.parse_triggers(config_map, 'partial_coherence')
+        if pcdi_alg is not None and len(triggers) > 0:
+            roi = []
+            for i, area in enumerate(_get(config_map, 'partial_coherence_roi', ())):
+                if isinstance(area, float):
+                    area = int(area * dims[i])
+                roi.append(ut.get_fft_dim(area, 1, 'numpy'))
+            self.partial_coherence = PartialCoherence(roi, triggers, pcdi_alg,
+                                                      _get(config_map, 'partial_coherence_normalize', False),
+                                                      _get(config_map, 'partial_coherence_iteration_num', 1),
+                                                      _get(config_map, 'partial_coherence_clip', False))
+
+    def parse_triggers(self, config_map, trigger_name):
+        """
+        Returns sorted list of iterations defined by the trigger settings. Each setting contains starting iteration,
+        step, and optional ending iteration.
+        """
+        iterations = set()
+        for setting in _get(config_map, trigger_name + '_triggers', ()):
+            end = self.number_iterations
+            if len(setting) > 2:
+                end = min(setting[2], end)
+            iterations.update(range(setting[0], end + 1, setting[1]))
+        return sorted(iterations)
+
+
+class Support:
+    """
+    This class maintains the support array, and updates it by thresholding the image convolved with gaussian.
+    """
+
+    def __init__(self, dims, support_area, threshold, sigma, triggers, algorithm, double_convolution=False,
+                 dtype=d_type):
+        self.threshold = threshold
+        self.triggers = triggers
+        self.support_array = np.zeros(dims, dtype=bool, order='F')
+        self.support_array[tuple(slice(dims[i] // 2 - support_area[i] // 2,
+                                       dims[i] // 2 - support_area[i] // 2 + support_area[i])
+                                 for i in range(len(dims)))] = True
+        self.distribution = None
+        if algorithm == 'GAUSS':
+            # the gaussian in frequency domain is calculated once in unshifted order, so it multiplies the spectrum
+            # directly, and only the half used by real FFT is kept
+            distribution = np.ones(dims, dtype=dtype, order='F')
+            for i in range(len(dims)):
+                sigma_i = dims[i] / (2.0 * np.pi * sigma)
+                grid = np.arange(dims[i]) - (dims[i] - 1) / 2.0
+                shape = [1] * len(dims)
+                shape[i] = dims[i]
+                distribution *= np.exp(-0.5 * grid ** 2 / sigma_i ** 2).reshape(shape).astype(dtype)
+            distribution /= distribution.sum()
+            self.distribution = np.fft.ifftshift(distribution)[..., :dims[-1] // 2 + 1]
+            if double_convolution:
+                self.distribution = self.distribution.astype(np.float64)
+
+    def update(self, ds_image_abs, workers):
+        """
+        Updates the support array from the absolute values of the image.
+        """
+        convag = self.gauss_conv_fft(ds_image_abs, workers)
+        convag /= convag.max()
+        self.support_array = convag >= self.threshold
+
+    def get_support_array(self, twin=False):
+        """
+        Returns the support array; if twin is True, all but the first quarter in the first two dimensions is zeroed.
+        """
+        if twin:
+            dims = self.support_array.shape
+            support = np.zeros_like(self.support_array)
+            support[:dims[0] // 2, :dims[1] // 2] = self.support_array[:dims[0] // 2, :dims[1] // 2]
+            return support
+        return self.support_array
+
+    def get_bounds(self):
+        """
+        Returns list of the beginning and end (exclusive) of the support bounding box in each dimension. If the support
+        is empty, the box is the whole array.
+        """
+        bounds = []
+        for axis in range(self.support_array.ndim):
+            other = tuple(ax for ax in range(self.support_array.ndim) if ax != axis)
+            in_support = np.flatnonzero(self.support_array.any(axis=other))
+            if len(in_support) == 0:
+                return [bound for dim in self.support_array.shape for bound in (0, dim)]
+            bounds.extend([int(in_support[0]), int(in_support[-1]) + 1])
+        return bounds
+
+    def get_fill_fraction(self):
+        """
+        Returns the fraction of the array points that are in support.
+        """
+        return float(self.support_array.sum()) / self.support_array.size
+
+    def gauss_conv_fft(self, ds_image_abs, workers):
+        """
+        Returns the absolute image convolved with the gaussian, scaled to the sum of the image. The convolution is
+        calculated in the type of the distribution.
+        """
+        ds_image_abs = ds_image_abs.astype(self.distribution.dtype, copy=False)
+        image_sum = ds_image_abs.sum()
+        spectrum = _rfftn(ds_image_abs, ds_image_abs.shape, workers)
+        spectrum *= self.distribution
+        convag = _irfftn(spectrum, ds_image_abs.shape, workers)
+        convag[convag < 0] = 0
+        convag *= image_sum / convag.sum()
+        return convag
+
+
+class PartialCoherence:
+    """
+    This class maintains the coherence kernel, and applies it to the amplitudes.
+    """
+
+    def __init__(self, roi, triggers, algorithm, normalize, iteration_num, clip):
+        self.roi = roi
+        self.triggers = triggers
+        self.algorithm = algorithm
+        self.normalize = normalize
+        self.iteration_num = iteration_num
+        self.clip = clip
+        self.trigger_index = 0
+        self.roi_data_abs = None
+        self.roi_amplitudes_prev = None
+        self.sum_roi_data = 0
+        self.kernel_array = None
+        self.conv_shape = None
+        self.kernel_spectrum = None
+
+    def init(self, data, workers=-1):
+        """
+        Initializes the kernel and the data in the region of interest.
+        """
+        self.trigger_index = 0
+        self.roi_data_abs = crop_center(np.fft.fftshift(data), self.roi).copy(order='F')
+        if self.normalize:
+            self.sum_roi_data = get_norm(self.roi_data_abs)
+        self.kernel_array = np.full(self.roi, 0.5, dtype=data.dtype, order='F')
+        self.conv_shape = get_convolution_shape(data.shape, self.roi)
+        self.kernel_spectrum = _rfftn(self.kernel_array, self.conv_shape, workers)
+
+    def set_previous(self, abs_amplitudes):
+        """
+        Keeps the amplitudes in the region of interest, they are used when the kernel is updated.
+        """
+        self.roi_amplitudes_prev = crop_center(np.fft.fftshift(abs_amplitudes), self.roi).copy(order='F')
+
+    def apply_partial_coherence(self, abs_amplitudes, current_iteration, workers):
+        """
+        Updates the kernel if the current iteration is a trigger, and returns the amplitudes convolved with the kernel.
+        """
+        if self.trigger_index < len(self.triggers) and current_iteration == self.triggers[self.trigger_index]:
+            roi_abs_amplitudes = crop_center(np.fft.fftshift(abs_amplitudes), self.roi)
+            if self.roi_amplitudes_prev is None:
+                self.roi_amplitudes_prev = roi_abs_amplitudes
+            self.trigger_index += 1
+            self.on_trigger(2 * roi_abs_amplitudes - self.roi_amplitudes_prev, workers)
+
+        # the kernel spectrum is calculated only when the kernel changes
+        converged = convolve_spectrum(abs_amplitudes ** 2, self.kernel_spectrum, self.conv_shape, self.roi, workers)
+        converged[converged < 0] = 0
+        return np.sqrt(converged, out=converged)
+
+    def on_trigger(self, amplitudes, workers):
+        """
+        Calculates new kernel from the amplitudes and the data in the region of interest.
+        """
+        if self.normalize:
+            amplitudes_2 = amplitudes ** 2
+            amplitudes = np.sqrt(amplitudes_2 * (self.sum_roi_data / amplitudes_2.sum()))
+        if self.algorithm == 'LUCY':
+            self.deconv_lucy(amplitudes ** 2, self.roi_data_abs ** 2, self.iteration_num, workers)
+
+    def deconv_lucy(self, amplitudes, data, iterations, workers):
+        """
+        Calculates the kernel by Richardson-Lucy deconvolution of the amplitudes by the data.
+        """
+        coherence = self.kernel_array.copy(order='F')
+        # the data does not change during deconvolution, so its spectra are calculated once
+        lucy_shape = get_convolution_shape(coherence.shape, data.shape)
+        data_spectrum = _rfftn(data, lucy_shape, workers)
+        data_mirror_spectrum = _rfftn(data[::-1, ::-1, ::-1], lucy_shape, workers)
+        for i in range(iterations):
+            convolve = convolve_spectrum(coherence, data_spectrum, lucy_shape, data.shape, workers)
+            convolve[convolve == 0] = 1.0
+            coherence *= convolve_spectrum(amplitudes / convolve, data_mirror_spectrum, lucy_shape, data.shape, workers)
+        if self.clip:
+            np.clip(coherence, -1, 1, out=coherence)
+        coherence = np.abs(coherence)
+        self.kernel_array = coherence / coherence.sum()
+        self.kernel_spectrum = _rfftn(self.kernel_array, self.conv_shape, workers)
+
+
+class Diagnostics:
+    """
+    This class collects diagnostic metrics enabled by the diagnostics level in a ring buffer.
+    """
+
+    def __init__(self, level, capacity):
+        self.level = level
+        self.metrics = collections.deque(maxlen=max(capacity, 1))
+
+    def is_enabled(self, metric_level):
+        return self.level >= metric_level
+
+    def record(self, iteration, name, value):
+        self.metrics.append((iteration, name, value))
+
+
+class State:
+    """
+    This class tracks the iterations, and determines which algorithm and which updates are run in current iteration.
+    """
+
+    def __init__(self, params, progress=None):
+        self.params = params
+        self.progress = progress
+        self.current_iter = -1
+        self.alg_switch_index = 0
+        self.errors = []
+        self.total_iter_num = params.number_iterations
+        self.twin_iter = params.twin
+        self.stop_reason = STOP_NONE
+        self.start_time = time.time()
+        # time in seconds the iterations ran before they were resumed from a checkpoint
+        self.elapsed_before = 0
+
+    def next(self):
+        """
+        Advances to the next iteration. Returns False if all iterations are completed.
+        """
+        if self.params.time_budget > 0 and self.elapsed_before + time.time() - self.start_time > self.params.time_budget:
+            self.stop_early(STOP_TIME_BUDGET)
+        self.current_iter += 1
+        if self.current_iter >= self.total_iter_num:
+            return False
+        if self.params.alg_switches[self.alg_switch_index][1] == self.current_iter:
+            self.alg_switch_index += 1
+        return True
+
+    def check_convergence(self):
+        """
+        Checks the errors against the convergence and divergence criteria. The errors are checked in batches, at the
+        same iterations as in the compiled module.
+        """
+        last = len(self.errors) - 1
+        if self.params.divergence_factor > 0 and last > 0:
+            min_error = min(self.errors[:last])
+            if np.isnan(self.errors[last]) or self.errors[last] > self.params.divergence_factor * min_error:
+                self.stop_early(STOP_DIVERGED)
+                return
+        window = self.params.convergence_window
+        if window > 0 and last >= window:
+            previous = self.errors[last - window]
+            if abs(previous - self.errors[last]) <= self.params.convergence_threshold * previous:
+                self.stop_early(STOP_CONVERGED)
+
+    def stop_early(self, reason):
+        """
+        Ends the iterations early. A diverged reconstruction ends after the current iteration. Otherwise the
+        iterations continue with the last algorithm for the averaging iterations, and the twin is applied in the first
+        of them if it was not applied yet.
+        """
+        if self.stop_reason != STOP_NONE or self.current_iter >= self.total_iter_num - 1:
+            return
+        self.stop_reason = reason
+        if reason == STOP_DIVERGED:
+            self.total_iter_num = self.current_iter + 1
+        else:
+            self.total_iter_num = min(self.total_iter_num, self.current_iter + 1 + self.params.avg_iterations)
+            self.alg_switch_index = len(self.params.alg_switches) - 1
+            if self.twin_iter > self.current_iter:
+                self.twin_iter = self.current_iter + 1
+        print ('iterations stopped at iteration ' + str(self.current_iter) + ', reason ' + str(reason))
+
+    def get_checkpoint(self):
+        """
+        Returns dictionary of arrays with the iteration counters and errors.
+        """
+        return {'state_counters': np.array([self.current_iter, self.total_iter_num, self.alg_switch_index,
+                                            self.twin_iter, self.stop_reason]),
+                'state_values': np.array([self.elapsed_before + time.time() - self.start_time]),
+                'errors': np.array(self.errors, dtype=self.params.dtype)}
+
+    def load_checkpoint(self, saved):
+        """
+        Restores the iteration counters and errors from the dictionary returned by get_checkpoint.
+        """
+        self.current_iter, self.total_iter_num, self.alg_switch_index, self.twin_iter, self.stop_reason = \
+            [int(counter) for counter in saved['state_counters']]
+        self.elapsed_before = float(saved['state_values'][0])
+        self.start_time = time.time()
+        self.errors = list(saved['errors'])
+
+    def get_current_alg(self):
+        return self.params.alg_switches[self.alg_switch_index][0]
+
+    def is_update_support(self):
+        return self.current_iter in self.params.support.triggers
+
+    def is_averaging_iteration(self):
+        return self.current_iter >= self.total_iter_num - self.params.avg_iterations
+
+    def is_apply_twin(self):
+        return self.current_iter == self.twin_iter
+
+    def record_error(self, error):
+        self.errors.append(error)
+        if self.progress is not None:
+            self.progress.append((self.current_iter, error))
+        if len(self.errors) % self.params.error_batch == 0:
+            self.check_convergence()
+
+
+class Reconstruction:
+    """
+    This class runs the reconstruction iterations on the data, starting from the guess.
+    """
+
+    def __init__(self, data, guess, params, workers=-1, progress=None):
+        """
+        The constructor keeps the data and the guess.
+
+        Parameters
+        ----------
+        data : array
+            data array in column-major order
+
+        guess : array
+            complex guess array of the data dimensions
+
+        params : Params
+            reconstruction parameters
+
+        workers : int
+            number of FFT workers, negative values count from number of cpus
+
+        progress : deque
+            a queue the (iteration, error) tuples are appended to, may be None
+
+        Returns
+        -------
+        none
+        """
+        self.data = np.abs(data)
+        self.progress = progress
+        self.ds_image = guess
+        self.params = params
+        self.workers = workers
+        self.support = params.support
+        self.partial_coherence = params.partial_coherence
+        self.state = State(params, progress)
+        self.num_points = data.size
+        self.norm_data = get_norm(self.accumulated(self.data))
+        self.current_iteration = 0
+        self.aver_count = 0
+        self.aver_box = None
+        self.aver = None
+        self.aver_sq = None
+        self.aver_phase_factors = None
+        self.checkpoints = True
+        self.diagnostics = Diagnostics(params.diagnostics_level, params.diagnostics_capacity)
+        self.constrains = {'ER': self.modulus_constrain_er, 'HIO': self.modulus_constrain_hio}
+
+    def init(self, support=None):
+        """
+        Initializes the components, and scales the guess and applies support to it. If support is given, it replaces
+        the configured initial support.
+        """
+        if self.partial_coherence is not None:
+            self.partial_coherence.init(self.data, self.workers)
+        self.ds_image *= self.data.max() * get_norm(self.ds_image)
+        if support is not None:
+            self.support.support_array = support != 0
+        self.ds_image *= self.support.get_support_array()
+        self.record_norm(DIAGNOSTICS_BASIC, 'initial_image_norm', self.ds_image)
+
+    def reset(self, guess):
+        """
+        Restarts the iterations from the guess, the support is determined from the guess.
+        """
+        self.ds_image = guess
+        self.aver_count = 0
+        self.aver_box = None
+        self.aver = None
+        self.aver_sq = None
+        self.aver_phase_factors = None
+        self.state = State(self.params, self.progress)
+        if self.partial_coherence is not None:
+            self.partial_coherence.init(self.data, self.workers)
+        self.support.update(np.abs(self.ds_image), self.workers)
+        self.ds_image *= self.support.get_support_array()
+
+    def iterate(self):
+        """
+        Runs the iterations, and averages the amplitudes of the last iterations.
+        """
+        while self.state.next():
+            self.current_iteration = self.state.current_iter
+            if self.state.is_update_support():
+                self.support.update(np.abs(self.ds_image), self.workers)
+                if self.diagnostics.is_enabled(DIAGNOSTICS_BASIC):
+                    self.diagnostics.record(self.current_iteration, 'support_sum', float(self.support.support_array.sum()))
+                    self.diagnostics.record(self.current_iteration, 'support_fill_fraction',
+                                            self.support.get_fill_fraction())
+                    bounds = self.support.get_bounds()
+                    box_points = np.prod([end - beginning for beginning, end in zip(bounds[::2], bounds[1::2])])
+                    self.diagnostics.record(self.current_iteration, 'support_box_fraction',
+                                            float(box_points) / self.ds_image.size)
+            self.constrains[self.state.get_current_alg()](self.modulus_projection())
+            self.average()
+            self.record_norm(DIAGNOSTICS_BASIC, 'image_norm', self.ds_image)
+            interval = self.params.checkpoint_interval
+            if self.checkpoints and interval > 0 and (self.current_iteration + 1) % interval == 0:
+                self.save_checkpoint(self.params.checkpoint_file)
+
+        if self.aver_count > 0:
+            # the image outside of the box is not averaged; it is zeroed by the support, as the box covers the support of
+            # all averaging iterations
+            image_box = self.ds_image[self.aver_box]
+            abs_box = np.abs(image_box)
+            image_box *= (get_ratio(self.aver, abs_box) / self.aver_count).astype(abs_box.dtype, copy=False)
+        self.ds_image *= self.support.get_support_array()
+
+    def modulus_projection(self):
+        """
+        Replaces the amplitudes of the image in reciprocal space by the data, and returns the image in direct space.
+        """
+        rs_amplitudes = _ifftn(self.ds_image, self.workers)
+        rs_amplitudes *= self.num_points
+        abs_amplitudes = np.abs(rs_amplitudes)
+        self.record_norm(DIAGNOSTICS_DETAILED, 'amplitudes_norm', rs_amplitudes)
+
+        diff = abs_amplitudes - self.data
+        diff[abs_amplitudes == 0] = 0
+        self.state.record_error(get_norm(self.accumulated(diff)) / self.norm_data)
+
+        pc = self.partial_coherence
+        if pc is not None and self.current_iteration >= pc.triggers[0]:
+            converged = pc.apply_partial_coherence(abs_amplitudes, self.current_iteration, self.workers)
+            self.record_norm(DIAGNOSTICS_DETAILED, 'coherence_norm', pc.kernel_array)
+            self.record_norm(DIAGNOSTICS_DETAILED, 'converged_norm', converged)
+            rs_amplitudes *= get_ratio(self.data, converged)
+        else:
+            rs_amplitudes *= get_ratio(self.data, abs_amplitudes)
+        if pc is not None:
+            pc.set_previous(np.abs(rs_amplitudes))
+        self.record_norm(DIAGNOSTICS_DETAILED, 'amplitudes_norm_after_ratio', rs_amplitudes)
+
+        ds_image_raw = _fftn(rs_amplitudes, self.workers, overwrite=True)
+        ds_image_raw /= self.num_points
+        return ds_image_raw
+
+    def modulus_constrain_er(self, ds_image_raw):
+        self.record_norm(DIAGNOSTICS_DETAILED, 'raw_image_norm', ds_image_raw)
+        ds_image_raw *= self.support.get_support_array(self.state.is_apply_twin())
+        self.ds_image = ds_image_raw
+
+    def modulus_constrain_hio(self, ds_image_raw):
+        self.record_norm(DIAGNOSTICS_DETAILED, 'raw_image_norm', ds_image_raw)
+        support = self.support.get_support_array(self.state.is_apply_twin())
+        # the image within support is replaced by the new image, outside it is decreased by the new image times beta
+        self.ds_image -= self.params.beta * ds_image_raw
+        np.copyto(self.ds_image, ds_image_raw, where=support)
+
+    def average(self):
+        """
+        Adds the amplitudes of the image to the running sums if this is an averaging iteration.
+        """
+        if self.state.is_averaging_iteration():
+            bounds = self.support.get_bounds()
+            if self.aver_count == 0:
+                # the sums cover only the bounding box of the support
+                self.aver_box = tuple(slice(beginning, end) for beginning, end in zip(bounds[::2], bounds[1::2]))
+            else:
+                self.grow_average_box(bounds)
+            image_box = self.accumulated(self.ds_image[self.aver_box])
+            abs_image = np.abs(image_box)
+            if self.aver_count == 0:
+                self.aver = np.zeros_like(abs_image)
+                if self.params.avg_statistics:
+                    self.aver_sq = np.zeros_like(abs_image)
+                    self.aver_phase_factors = np.zeros_like(image_box)
+            self.aver += abs_image
+            if self.params.avg_statistics:
+                self.aver_sq += abs_image * abs_image
+                # the phases are averaged as unit phase factors, so the wrapping at pi does not bias the average
+                self.aver_phase_factors += image_box / np.where(abs_image > 0, abs_image, 1)
+            self.aver_count += 1
+
+    def grow_average_box(self, bounds):
+        """
+        Grows the box of the running sums to the union with the given support bounds. The sums are padded with zeros,
+        as the image outside of the previous box was not in support.
+        """
+        box = tuple(slice(min(box.start, beginning), max(box.stop, end))
+                    for box, beginning, end in zip(self.aver_box, bounds[::2], bounds[1::2]))
+        if box == self.aver_box:
+            return
+        # position of the previous box within the new box
+        inner = tuple(slice(old.start - new.start, old.stop - new.start) for old, new in zip(self.aver_box, box))
+        shape = tuple(new.stop - new.start for new in box)
+        for name in ('aver', 'aver_sq', 'aver_phase_factors'):
+            sums = getattr(self, name)
+            if sums is not None:
+                padded = np.zeros(shape, dtype=sums.dtype, order='F')
+                padded[inner] = sums
+                setattr(self, name, padded)
+        self.aver_box = box
+
+    def get_statistics(self):
+        """
+        Returns the variance of amplitudes and average phase over the averaging iterations, or (None, None) if not
+        collected.
+        """
+        if self.aver_sq is None:
+            return None, None
+        mean = self.aver / self.aver_count
+        variance = np.zeros(self.ds_image.shape, dtype=mean.dtype, order='F')
+        phase = np.zeros(self.ds_image.shape, dtype=mean.dtype, order='F')
+        variance[self.aver_box] = np.maximum(self.aver_sq / self.aver_count - mean * mean, 0)
+        phase[self.aver_box] = np.angle(self.aver_phase_factors)
+        return variance, phase
+
+    def save_checkpoint(self, filename):
+        """
+        Saves the image, support, coherence, averaged amplitudes and iteration state to the file. The file is written
+        under a temporary name and renamed, so an interrupted write does not destroy the previous checkpoint.
+        """
+        saved = self.state.get_checkpoint()
+        saved['image'] = self.ds_image
+        saved['support'] = self.support.support_array
+        saved['aver_count'] = np.array(self.aver_count)
+        if self.aver_box is not None:
+            saved['aver_bounds'] = np.array([bound for box in self.aver_box for bound in (box.start, box.stop)])
+        for name in ('aver', 'aver_sq', 'aver_phase_factors'):
+            if getattr(self, name) is not None:
+                saved[name] = getattr(self, name)
+        pc = self.partial_coherence
+        if pc is not None:
+            saved['coherence_trigger_index'] = np.array(pc.trigger_index)
+            saved['coherence'] = pc.kernel_array
+            if pc.roi_amplitudes_prev is not None:
+                saved['coherence_previous'] = pc.roi_amplitudes_prev
+        temp = filename + '.tmp'
+        with open(temp, 'wb') as f:
+            np.savez(f, **saved)
+        os.rename(temp, filename)
+
+    def load_checkpoint(self, filename):
+        """
+        Restores the state saved by save_checkpoint. It must be called after init; the iterations then continue after
+        the saved iteration. Raises ValueError if the saved image does not have the shape and type of the image.
+        """
+        with np.load(filename) as f:
+            saved = dict(f)
+        # a checkpoint of other data or precision would be continued with arrays of wrong shape or type
+        if saved['image'].shape != self.ds_image.shape or saved['image'].dtype != self.ds_image.dtype:
+            raise ValueError('the checkpoint ' + filename + ' does not match the data dimensions or precision')
+        self.state.load_checkpoint(saved)
+        self.current_iteration = self.state.current_iter
+        self.ds_image = np.asfortranarray(saved['image'])
+        self.support.support_array = np.asfortranarray(saved['support'])
+        self.aver_count = int(saved['aver_count'])
+        self.aver_box = None
+        if 'aver_bounds' in saved:
+            bounds = [int(bound) for bound in saved['aver_bounds']]
+            self.aver_box = tuple(slice(beginning, end) for beginning, end in zip(bounds[::2], bounds[1::2]))
+        for name in ('aver', 'aver_sq', 'aver_phase_factors'):
+            setattr(self, name, np.asfortranarray(saved[name]) if name in saved else None)
+        pc = self.partial_coherence
+        if pc is not None:
+            pc.trigger_index = int(saved['coherence_trigger_index'])
+            pc.kernel_array = np.asfortranarray(saved['coherence'])
+            pc.kernel_spectrum = _rfftn(pc.kernel_array, pc.conv_shape, self.workers)
+            if 'coherence_previous' in saved:
+                pc.roi_amplitudes_prev = np.asfortranarray(saved['coherence_previous'])
+
+    def accumulated(self, arr):
+        """
+        Returns the array converted to double precision if the accumulations run in mixed precision, otherwise the
+        array itself.
+        """
+        if not self.params.mixed_precision:
+            return arr
+        return arr.astype(np.complex128 if np.iscomplexobj(arr) else np.float64)
+
+    def record_norm(self, level, name, arr):
+        """
+        Records norm of the array as a metric, if the level is enabled. Otherwise the norm is not calculated.
+        """
+        if self.diagnostics.is_enabled(level):
+            self.diagnostics.record(self.current_iteration, name, float(get_norm(arr)))
+
+    def get_errors(self):
+        return self.state.errors
+
+
+class PyBridge:
+    """
+    This class has the interface of the bridge to the C++ module, and runs the reconstruction with NumPy.
+    """
+
+    def __init__(self, workers=-1, cores=None, precision='float'):
+        """
+        The constructor sets number of FFT workers and the precision, and binds the process to the cores if given.
+
+        Parameters
+        ----------
+        workers : int
+            number of FFT workers, negative values count from number of cores the process runs on
+
+        cores : list
+            numbers of cores the process is bound to, if None the binding is not changed
+
+        precision : str
+            float, double, or mixed; the data and image are of d_type of the precision, which is the type of the
+            buffers passed to and returned by the methods
+
+        Returns
+        -------
+        none
+        """
+        if precision not in D_TYPES:
+            raise ValueError('unknown precision ' + str(precision))
+        self.d_type = D_TYPES[precision]
+        if cores is not None:
+            cpu.set_cpu_resources(workers, cores)
+        if workers < 0:
+            # the workers count from the cores the process is bound to, not from all cpus of the node
+            workers = max(len(cpu.get_cores()) + 1 + workers, 1)
+        self.workers = workers
+        self.rec = None
+        self.checkpoints = True
+        self.generation_times = []
+        self.generation_errors = []
+        self.progress = collections.deque()
+
+    def _get_params(self, dims, config):
+        with open(config, 'r') as f:
+            config_map = cfg.Config(f.read())
+        return Params(config_map, dims, self.d_type)
+
+    def _get_data(self, data_r, dims):
+        return as_buffer(data_r, self.d_type).reshape(dims, order='F')
+
+    def _random_guess(self, dims, seed):
+        random = np.random.RandomState(seed)
+        guess = np.empty(dims, dtype=np.result_type(self.d_type, np.complex64), order='F')
+        guess.real = random.random_sample(dims)
+        guess.imag = random.random_sample(dims)
+        return guess
+
+    def _run(self, data, guess, dims, config, checkpoints=True, checkpoint=None, support=None):
+        self.progress.clear()
+        self.rec = Reconstruction(data, guess, self._get_params(dims, config), self.workers, self.progress)
+        self.rec.checkpoints = checkpoints and self.checkpoints
+        self.rec.init(support)
+        if checkpoint is not None:
+            self.rec.load_checkpoint(checkpoint)
+        start = time.time()
+        self.rec.iterate()
+        print ('iterate function took ' + str(time.time() - start) + ' seconds')
+
+    def _final_error(self, rec):
+        errors = rec.get_errors()
+        if len(errors) == 0:
+            return np.finfo(self.d_type).max
+        return errors[-1]
+
+    def start_calc_with_guess(self, data_r, guess_r, guess_i, dims, config, support=None):
+        guess = self._get_data(guess_r, dims) + 1j * self._get_data(guess_i, dims)
+        if support is not None:
+            support = self._get_data(support, dims)
+        self._run(self._get_data(data_r, dims), guess.astype(np.result_type(self.d_type, np.complex64)), dims, config,
+                  support=support)
+
+    def start_calc(self, data_r, dims, config):
+        self.start_calc_with_seed(data_r, dims, config, int(time.time()))
+
+    def start_calc_multiple(self, data_r, dims, config, no_threads):
+        # the reconstructions run one after another, the FFTs use multiple workers
+        data = self._get_data(data_r, dims)
+        seed = int(time.time())
+        best = None
+        for i in range(no_threads):
+            self._run(data, self._random_guess(dims, seed + i), dims, config, checkpoints=False)
+            if best is None or self._final_error(self.rec) < self._final_error(best):
+                best = self.rec
+        self.rec = best
+
+    def start_calc_with_seed(self, data_r, dims, config, seed):
+        self._run(self._get_data(data_r, dims), self._random_guess(dims, seed), dims, config)
+
+    def resume(self, data_r, dims, config, checkpoint):
+        """
+        Resumes a reconstruction from the checkpoint file written by an interrupted single reconstruction of the same
+        data and configuration.
+        """
+        self._run(self._get_data(data_r, dims), self._random_guess(dims, 0), dims, config, checkpoint=checkpoint)
+
+    def set_checkpoints(self, enabled):
+        """
+        Enables or disables writing the configured checkpoints by the following single reconstructions. They are
+        disabled when other processes run reconstructions with the same configuration, as they would write to the
+        same file.
+        """
+        self.checkpoints = enabled
+
+    def start_calc_generations(self, data_r, dims, config, generations, population):
+        if population < 1:
+            raise ValueError('population must be at least 1')
+        data = self._get_data(data_r, dims)
+        seed = int(time.time())
+        self.generation_times = []
+        self.generation_errors = []
+        self.progress.clear()
+        recs = [Reconstruction(data, self._random_guess(dims, seed + i), self._get_params(dims, config),
+                               self.workers, self.progress) for i in range(population)]
+        for rec in recs:
+            rec.checkpoints = False
+        for g in range(generations):
+            start = time.time()
+            if g == 0:
+                for rec in recs:
+                    rec.init()
+            else:
+                # breed the population with the best image of previous generation
+                best = recs[0].ds_image
+                for rec in recs[1:]:
+                    # the phase difference is taken from the product with the conjugate, so the average does not
+                    # break where the phases wrap at pi
+                    bred = np.sqrt(np.abs(best) * np.abs(rec.ds_image)) * \
+                        np.exp(1j * (np.angle(best) + 0.5 * np.angle(rec.ds_image * np.conj(best))))
+                    rec.reset(bred.astype(best.dtype))
+                recs[0].reset(best)
+            for rec in recs:
+                rec.iterate()
+            recs.sort(key=self._final_error)
+            self.generation_times.append(time.time() - start)
+            self.generation_errors.append(self._final_error(recs[0]))
+        self.rec = recs[0]
+
+    def get_image_r(self):
+        return np.ascontiguousarray(self.rec.ds_image.real.ravel(order='F'), dtype=self.d_type)
+
+    def get_image_i(self):
+        return np.ascontiguousarray(self.rec.ds_image.imag.ravel(order='F'), dtype=self.d_type)
+
+    def get_support_bounds(self):
+        """
+        Returns list of the beginning and end (exclusive) of the support bounding box in each dimension.
+        """
+        return self.rec.support.get_bounds()
+
+    def get_image_box(self):
+        """
+        Returns the real and imaginary part of the image within the support bounding box. The image is zero outside
+        of the box.
+        """
+        bounds = self.rec.support.get_bounds()
+        image_box = self.rec.ds_image[tuple(slice(beginning, end) for beginning, end in zip(bounds[::2], bounds[1::2]))]
+        return (np.ascontiguousarray(image_box.real.ravel(order='F'), dtype=self.d_type),
+                np.ascontiguousarray(image_box.imag.ravel(order='F'), dtype=self.d_type))
+
+    def get_errors(self):
+        return self.rec.get_errors()
+
+    def get_generation_metrics(self):
+        return self.generation_times, self.generation_errors
+
+    def get_progress(self):
+        """
+        Returns list of (iteration, error) reported by the running reconstruction since the last call. It may be
+        called from another thread while the reconstruction runs.
+        """
+        reported = []
+        while True:
+            try:
+                reported.append(self.progress.popleft())
+            except IndexError:
+                return reported
+
+    def get_metrics(self):
+        """
+        Returns list of (iteration, name, value) diagnostic metrics, from the oldest.
+        """
+        return list(self.rec.diagnostics.metrics)
+
+    def get_statistics(self):
+        """
+        Returns the variance of amplitudes and average phase over the averaging iterations, or (None, None) if the
+        statistics were not collected.
+        """
+        variance, phase = self.rec.get_statistics()
+        if variance is None:
+            return None, None
+        return variance.ravel(order='F').astype(self.d_type), phase.ravel(order='F').astype(self.d_type)
+
+    def get_support(self):
+        return self.rec.support.get_support_array().ravel(order='F').astype(np.float32)
+
+    def get_coherence(self):
+        if self.rec.partial_coherence is None:
+            return np.empty(0, dtype=self.d_type)
+        return self.rec.partial_coherence.kernel_array.ravel(order='F').astype(self.d_type)
@@ -50,21 +50,27 @@
 Please make sure the installation :ref:`pre-requisite-reference-label` are met.
 This module controls the reconstruction process. The user has to provide parameters such as type of processor, data, and configuration.
 The processor specifies which library will be used by CFM (Calc Fast Module) that performs the processor intensive calculations. The module
-can be run on cpu, or gpu. Depending on the gpu hardware and library, one can use opencl or cuda library.
+can be run on cpu, or gpu. Depending on the gpu hardware and library, one can use opencl or cuda library. The processor type
+numpy runs the reconstruction in python with NumPy, and does not need the compiled CFM.
 The module starts the data preparation routines, calls for reconstruction using the CFM, and prepares the reconstructed data for
 visualization.
 """
 
 import numpy as np
 import src_py.utilities.utils as ut
+import src_py.utilities.data_cache as dc
+import src_py.utilities.cpu_resources as cpu
 import src_py.utilities.CXDVizNX as cx
 import pylibconfig2 as cfg
 import os
-import scipy.fftpack as sf
 import scipy.io as sio
-import src_py.cyth.bridge_cpu as bridge_cpu
-import src_py.cyth.bridge_opencl as bridge_opencl
-#import src_py.cyth.bridge_cuda as bridge_cuda
+import multiprocessing as mp
+import time
+import threading
+import re
+import tempfile
+import importlib
+import src_py.controller.fast_module_numpy as bridge_numpy
 #import tifffile as tf
 
 
@@ -73,9 +79,20 @@ __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
 __all__ = ['read_config',
            'prepare_data',
+           'read_binned_data',
+           'prepare_binned_data',
+           'get_prepared_data',
+           'get_bridge',
            'do_reconstruction',
+           'multi_start_reconstruction',
+           'pyramid_reconstruction',
+           'run_reconstruction',
+           'save_results',
            'reconstruction']
 
+# seconds between polls of the errors reported by running reconstruction
+PROGRESS_POLL_INTERVAL = 1.0
+
 def read_config(config):
     """
     This function gets configuration file. It checks if the file exists and parses it into a map.
@@ -98,7 +115,7 @@ def read_config(config):
     else:
         return None
 
-def prepare_data(config_map, data):
+def prepare_data(config_map, data, proc='opencl'):
     """
     This function prepares raw data for reconstruction. It uses configured parameters. The preparation consists of the following steps:
     1. clearing the noise - the values below an amplitude threshold are set to zero
@@ -110,6 +127,9 @@ def prepare_data(config_map, data):
     are added. These are filled with zeros. When changing the dimension the code finds the smallest possible dimension that is 
     supported by opencl library (multiplier of 2, 3, and 5).
     6. shift in place - shift the zero-frequency component to the center of the spectrum
+    The steps are done in place where possible, and the centering, padding and shift are done in a single pass, so the
+    peak memory is close to the size of the input and the size of the result. If the data is a writable array of
+    floating type, it is modified in place.
     
     Parameters
     ----------
@@ -117,7 +137,10 @@ def prepare_data(config_map, data):
         configuration map
         
     data : array
-        a 3D np array containing experiment data
+        a 3D np array containing experiment data, may be memory mapped array or TifStack
+
+    proc : str
+        a string indicating the processor type, the padded dimensions are supported by its FFT library
         
     Returns
     -------
@@ -125,8 +148,19 @@ def prepare_data(config_map, data):
         a 3D np array containing data after the preprocessing
     """
     
+    try:
+        binsizes = config_map.binning
+    except AttributeError:
+        binsizes = []
+
+    # the data may be memory mapped or read from file when indexed, so only the part used after binning is read
+    data = data[ut.get_binned_roi(data.shape, binsizes)]
+    # the following steps are done in place, so the data must be of floating type and writable
+    if not np.issubdtype(data.dtype, np.floating) or not isinstance(data, np.ndarray) or not data.flags.writeable:
+        data = np.array(data, dtype=np.result_type(data.dtype, np.float32))
+
     # zero out the noise
-    data = np.where(data < config_map.amp_threshold, 0, data)
+    data[data < config_map.amp_threshold] = 0
     print (data.shape)
 
     # zero out the aliens
@@ -138,14 +172,64 @@ def prepare_data(config_map, data):
         pass
 
     # do binning
+    data = ut.binning(data, binsizes)
+
+    return prepare_binned_data(config_map, data, proc)
+
+
+def read_binned_data(config_map, filename):
+    """
+    This function reads the raw data from tif file page by page, and does the first three steps of the preparation
+    (see prepare_data) while reading. Only a single page and the binned data are held in memory, so the raw data can be
+    larger than memory.
+
+    Parameters
+    ----------
+    config_map : dict
+        configuration map
+
+    filename : str
+        name of a tif file containing experiment data
+
+    Returns
+    -------
+    data : array
+        a 3D np array containing thresholded, binned data with aliens removed
+    """
+    try:
+        aliens = config_map.aliens
+    except AttributeError:
+        aliens = None
     try:
         binsizes = config_map.binning
-        data = ut.binning(data, binsizes)
     except AttributeError:
-        pass
+        binsizes = [1, 1, 1]
+    return ut.get_binned_array_from_tif(filename, binsizes, config_map.amp_threshold, aliens)
+
+
+def prepare_binned_data(config_map, data, proc='opencl'):
+    """
+    This function does the last three steps of the data preparation (see prepare_data) on the data that was already
+    thresholded, binned, and has the aliens removed. The data must be of floating type, and is modified in place.
+
+    Parameters
+    ----------
+    config_map : dict
+        configuration map
 
+    data : array
+        a 3D np array containing binned experiment data
+
+    proc : str
+        a string indicating the processor type, the padded dimensions are supported by its FFT library
+
+    Returns
+    -------
+    data : array
+        a 3D np array containing data after the preprocessing
+    """
     # square root data
-    data = np.sqrt(data)
+    np.sqrt(data, out=data)
 
     # get centered array
     try:
@@ -153,20 +237,110 @@ def prepare_data(config_map, data):
     except AttributeError:
         center_shift = (0,0,0)
 
-    data = ut.get_centered(data, center_shift)
-
     # zero pad array
     try:
         pad = tuple(config_map.zero_pad)
     except AttributeError:
-        center_shift = (0,0,0)
-    data = ut.zero_pad(data, pad)
+        pad = (0,0,0)
 
-    # shift data
-    data=sf.fftshift(data)
-    return data
+    # center, pad and shift data
+    return ut.center_pad_shift(data, center_shift, pad, proc)
     
-def fast_module_reconstruction(proc, data, conf):
+def get_prepared_data(config_map, filename, proc='opencl'):
+    """
+    This function reads the data file and prepares the data for reconstruction. If data cache is configured, the
+    prepared data is looked up in the cache first, and the data is prepared only if not found. The newly prepared data
+    is stored in the cache.
+
+    Parameters
+    ----------
+    config_map : dict
+        configuration map
+
+    filename : str
+        name of a file containing experiment data
+
+    proc : str
+        a string indicating the processor type
+
+    Returns
+    -------
+    data : array
+        a 3D np array containing prepared data, or None if the data is not valid
+    """
+    try:
+        cache_size = config_map.data_cache_size
+    except AttributeError:
+        cache_size = 10
+    try:
+        cache = dc.PreparedDataCache(config_map.data_cache_dir, int(cache_size * 1e9))
+        key = cache.get_key(filename, config_map, ut.FFT_PRIMES.get(proc))
+        data = cache.get(key)
+        if data is not None:
+            return data
+    except AttributeError:
+        cache = None
+
+    # read the data page by page, binning while reading if configured, otherwise read whole data
+    try:
+        stream_data = config_map.stream_data
+    except AttributeError:
+        stream_data = False
+    if stream_data:
+        data = read_binned_data(config_map, filename)
+        data = prepare_binned_data(config_map, data, proc)
+    else:
+        data = ut.get_array_from_tif(filename, mmap=True)
+        if len(data.shape) > 3:
+            print ("this program supports 3d images only")
+            return None
+        data = prepare_data(config_map, data, proc)
+
+    if cache is not None:
+        cache.put(key, data)
+    return data
+
+
+def get_bridge(proc, precision='float'):
+    """
+    This function returns the bridge module of the processor type and precision. The compiled bridges are optional, the
+    numpy module runs without them. The CFM is built for float and double data type; the mixed precision runs the float
+    module, which accumulates errors, averages and support convolution in double precision. The numpy module runs in
+    any precision, which is chosen when its PyBridge is created.
+
+    Parameters
+    ----------
+    proc : str
+        a string indicating the processor type, cpu, opencl, cuda, or numpy
+
+    precision : str
+        float, double, or mixed
+
+    Returns
+    -------
+    bridge : module
+        the bridge module, None if the module is not built; an error loading a built module is raised
+    """
+    if precision not in ('float', 'double', 'mixed'):
+        raise ValueError('unknown precision ' + str(precision))
+    if proc == 'numpy':
+        return bridge_numpy
+    if precision == 'mixed':
+        precision = 'float'
+    name = 'bridge_' + proc + '_' + precision
+    try:
+        return importlib.import_module('src_py.cyth.' + name)
+    except ImportError as e:
+        # only the missing module means the bridge is not built; other errors, i.e. a library that is not found, are
+        # not hidden
+        if 'No module named' in str(e) and name in str(e):
+            return None
+        raise
+
+
+def fast_module_reconstruction(proc, data, conf, seed=None, generations=1, population=1, metrics=None,
+                               progress=None, statistics=None,
+                               resume=None, guess=None, guess_support=None, cores=None, checkpoints=True):
     """
     This function calls a bridge method corresponding to the requested processor type. The bridge method is an access to the CFM
     (Calc Fast Module). When reconstruction is completed the function retrieves results from the CFM.
@@ -174,7 +348,7 @@ def fast_module_reconstruction(proc, data, conf):
     Parameters
     ----------
     proc : str
-        a string indicating the processor type
+        a string indicating the processor type, cpu, opencl, or numpy
         
     data : array
         a 3D np array containing pre-processed experiment data
@@ -182,6 +356,51 @@ def fast_module_reconstruction(proc, data, conf):
     conf : dict
         configuration map
         
+    seed : int
+        a seed used to generate random guess, if None the guess is seeded with current time; not used when running
+        generations
+
+    generations : int
+        number of generations, if greater than one the reconstruction runs in generations, where each generation
+        starts from images bred with the best image of previous generation
+
+    population : int
+        number of reconstructions in each generation
+
+    metrics : list
+        if given, the diagnostic metrics collected by the CFM are appended to the list as (iteration, name, value)
+        tuples; the metrics are collected if enabled by diagnostics_level configuration parameter
+
+    progress : callable
+        if given, it is called with (iteration, error) arguments while the reconstruction runs; the errors are
+        reported in batches of error_batch iterations
+
+    statistics : dict
+        if given, and the avg_statistics configuration parameter is set, the variance of amplitudes and average phase
+        over the averaging iterations are added to the dictionary as 'amplitude_variance' and 'phase' arrays of
+        the image shape
+
+    resume : str
+        a checkpoint file written by interrupted reconstruction of the same data and configuration; if given and the
+        file exists, the reconstruction continues from the checkpoint. The checkpoints are written when
+        checkpoint_file and checkpoint_interval configuration parameters are set.
+
+    guess : array
+        a 3D complex np array of the data shape and layout, if given the reconstruction starts from this image instead
+        of a random guess
+
+    guess_support : array
+        a 3D np array of the data shape and layout, if given with guess it replaces the configured initial support
+
+    cores : list
+        numbers of cores the reconstruction runs on, if None the cores are given by cpu_cores configuration
+        parameter, or are not bound if not configured; the number of threads is given by cpu_threads configuration
+        parameter, and defaults to the number of cores
+
+    checkpoints : bool
+        if False, the configured checkpoints are not written; they are disabled when other processes run
+        reconstructions with the same configuration, so they do not write to the same checkpoint file
+        
     Returns
     -------
     image_r : array
@@ -193,50 +412,363 @@ def fast_module_reconstruction(proc, data, conf):
     er : array
         a vector containing mean error for each iteration
     """
-    if proc == 'cpu':
-        bridge = bridge_cpu
-    elif proc == 'opencl': 
-        bridge = bridge_opencl
-    # elif proc == 'cuda':
-    #     bridge = bridge_cuda
-
-    data = np.swapaxes(data,1,2)
-
-    dims = data.shape
-    dims1 = (dims[2], dims[1], dims[0])
-    print 'data norm in reconstruction',  sum(sum(sum(abs(data)**2)))
-    fast_module = bridge.PyBridge()
-
-    data_l = data.flatten().tolist()
-    fast_module.start_calc(data_l, dims1, conf)
-    er = fast_module.get_errors()
-    image_r = np.asarray(fast_module.get_image_r())
-    image_i = np.asarray(fast_module.get_image_i())
-    image = image_r + 1j*image_i
-    # normalize image
-    mx = max(np.absolute(image).ravel().tolist())
-    image = image/mx
-    support = np.asarray(fast_module.get_support())
-    coherence = np.asarray(fast_module.get_coherence())
-
-    image = np.reshape(image, dims)
-    support = np.reshape(support, dims)
-
-    image = np.swapaxes(image, 2,0)
-    support = np.swapaxes(support, 2,0)
-    image = np.swapaxes(image, 1, 0)
-    support = np.swapaxes(support, 1, 0)
-
-    if coherence.shape[0] > 1:
-        coh_size = int(round(coherence.shape[0] ** (1. / 3.)))
-        coh_dims = (coh_size, coh_size, coh_size,)
-        coherence = np.reshape(coherence, coh_dims)
-        coherence = np.swapaxes(coherence, 2, 0)
-        coherence = np.swapaxes(coherence, 1, 0)
-    else:
-        coherence = None
+    # the precision is configured for each run, so the bridge module is selected after reading the configuration
+    config_map = read_config(conf)
+    try:
+        precision = config_map.precision
+    except AttributeError:
+        precision = 'float'
+    # the cpu resources are set before the bridge module is loaded, so the libraries start their threads on the cores
+    threads, cores = _cpu_config(config_map, cores)
+    # the previous binding and thread variables of the process are restored when the reconstruction ends
+    with cpu.cpu_resources(threads, cores) as threads:
+        bridge = get_bridge(proc, precision)
+        if bridge is None:
+            raise ValueError('the bridge for processor type ' + proc + ' and precision ' + precision + ' is not built')
+
+        # the numpy module runs in the configured precision, the compiled bridge module was built for it
+        if proc == 'numpy' and threads > 0:
+            fast_module = bridge.PyBridge(threads, precision=precision)
+        elif proc == 'numpy':
+            fast_module = bridge.PyBridge(precision=precision)
+        else:
+            fast_module = bridge.PyBridge()
+        fast_module.set_checkpoints(checkpoints)
+        d_type = fast_module.d_type
+
+        # the bridge reads the contiguous buffer directly, so the swap and type conversion is the only copy made
+        data = np.ascontiguousarray(np.swapaxes(data,1,2), dtype=d_type)
+
+        dims = data.shape
+        dims1 = (dims[2], dims[1], dims[0])
+        print 'data norm in reconstruction',  np.sum(np.abs(data)**2)
+
+        def start():
+            if resume is not None and os.path.isfile(resume):
+                fast_module.resume(data, dims1, conf, resume)
+            elif guess is not None:
+                guess_ = np.swapaxes(guess, 1, 2)
+                support_ = None if guess_support is None else np.swapaxes(guess_support, 1, 2)
+                fast_module.start_calc_with_guess(data, np.ascontiguousarray(guess_.real, dtype=d_type),
+                                                  np.ascontiguousarray(guess_.imag, dtype=d_type), dims1, conf,
+                                                  support_)
+            elif generations > 1:
+                fast_module.start_calc_generations(data, dims1, conf, generations, population)
+            elif seed is None:
+                fast_module.start_calc(data, dims1, conf)
+            else:
+                fast_module.start_calc_with_seed(data, dims1, conf, seed)
+
+        if progress is None:
+            start()
+        else:
+            # the calculation releases the interpreter, so the reported errors are polled while it runs
+            failures = []
+
+            def run():
+                # the exception of the calculation is raised in this thread, not lost in the calculation thread
+                try:
+                    start()
+                except Exception as e:
+                    failures.append(e)
+
+            calc = threading.Thread(target=run)
+            calc.start()
+            while calc.is_alive():
+                calc.join(PROGRESS_POLL_INTERVAL)
+                for iteration, error in fast_module.get_progress():
+                    progress(iteration, error)
+            # the last errors may be reported after the poll that preceded the end of the calculation
+            for iteration, error in fast_module.get_progress():
+                progress(iteration, error)
+            if failures:
+                raise failures[0]
+
+        if generations > 1:
+            times, gen_errors = fast_module.get_generation_metrics()
+            for gen in range(len(times)):
+                print ('generation ' + str(gen) + ' time ' + str(times[gen]) + ' best error ' + str(gen_errors[gen]))
+        er = fast_module.get_errors()
+        if metrics is not None:
+            metrics.extend(fast_module.get_metrics())
+        # the image is zero outside of the support bounding box, so only the box is copied from the module; the bounds
+        # are in the module dimensions order, reversed to the data dimensions
+        bounds = fast_module.get_support_bounds()
+        box = tuple(slice(bounds[2 * ax], bounds[2 * ax + 1]) for ax in reversed(range(len(dims))))
+        box_shape = tuple(ax_box.stop - ax_box.start for ax_box in box)
+        image_r, image_i = fast_module.get_image_box()
+        image = np.zeros(dims, dtype=np.result_type(d_type, np.complex64))
+        image.real[box] = image_r.reshape(box_shape)
+        image.imag[box] = image_i.reshape(box_shape)
+        # normalize image
+        mx = np.absolute(image).max()
+        image /= mx
+        support = fast_module.get_support()
+        coherence = fast_module.get_coherence()
+
+        image = np.reshape(image, dims)
+        support = np.reshape(support, dims)
+
+        image = np.swapaxes(image, 2,0)
+        support = np.swapaxes(support, 2,0)
+        image = np.swapaxes(image, 1, 0)
+        support = np.swapaxes(support, 1, 0)
+
+        if statistics is not None:
+            variance, phase = fast_module.get_statistics()
+            if variance is not None:
+                statistics['amplitude_variance'] = np.swapaxes(np.swapaxes(np.reshape(variance, dims), 2, 0), 1, 0)
+                statistics['phase'] = np.swapaxes(np.swapaxes(np.reshape(phase, dims), 2, 0), 1, 0)
+
+        if coherence.shape[0] > 1:
+            coh_size = int(round(coherence.shape[0] ** (1. / 3.)))
+            coh_dims = (coh_size, coh_size, coh_size,)
+            coherence = np.reshape(coherence, coh_dims)
+            coherence = np.swapaxes(coherence, 2, 0)
+            coherence = np.swapaxes(coherence, 1, 0)
+        else:
+            coherence = None
+
+        return image, support, coherence, er
+
+
+def _cpu_config(config_map, cores=None):
+    """
+    This function returns number of threads and list of cores configured by cpu_threads and cpu_cores configuration
+    parameters. The number of threads is 0 and the cores are None if not configured. If cores are given, they replace
+    the configured cores, and the number of threads is limited to them.
+    """
+    try:
+        threads = config_map.cpu_threads
+    except AttributeError:
+        threads = 0
+    if cores is not None:
+        return min(threads, len(cores)), cores
+    try:
+        cores = list(config_map.cpu_cores)
+    except AttributeError:
+        cores = None
+    return threads, cores
+
+
+def _init_multi_start_worker(proc, data, conf, partitions):
+    """
+    This function is run by each process in the multi-start pool. It keeps the reconstruction arguments in the worker
+    process, so the data is not pickled for each start. Each process takes its own part of the cores from the
+    partitions queue, and sets the cpu resources before the bridge module is imported in the process.
+    """
+    global _multi_start_args
+    cores = partitions.get()
+    cpu.set_cpu_resources(*_cpu_config(read_config(conf), cores))
+    _multi_start_args = (proc, data, conf, partitions, cores)
+
+
+def _run_multi_start(seed):
+    """
+    This function runs one reconstruction of the multi-start in the worker process. The process runs only one start,
+    so the part of the cores is returned to the partitions queue for the process that replaces it.
+    """
+    proc, data, conf, partitions, cores = _multi_start_args
+    try:
+        # the starts share the configuration, so they would write to the same checkpoint file
+        return fast_module_reconstruction(proc, data, conf, seed, cores=cores, checkpoints=False)
+    finally:
+        partitions.put(cores)
+
+
+def multi_start_reconstruction(proc, data, conf, starts, processes=None, keep=None, seed=None, cores=None):
+    """
+    This function runs a number of independent reconstructions on the same data, each starting from a different random
+    guess. The reconstructions are run concurrently on a pool of worker processes. To run the reconstructions as threads
+    of a single process use the start_calc_multiple bridge method.
+    The results are ranked by the final error, the best reconstruction first.
+
+    Parameters
+    ----------
+    proc : str
+        a string indicating the processor type
+
+    data : array
+        a 3D np array containing pre-processed experiment data
 
-    return image, support, coherence, er
+    conf : str
+        configuration file name
+
+    starts : int
+        number of reconstructions to run
+
+    processes : int
+        number of worker processes, defaults to number of cpus; if 0, the reconstructions run one after another in the
+        calling process, i.e. in a worker process that initialized the device already
+
+    keep : int
+        number of best results to return, if None all results are returned
+
+    seed : int
+        a seed of the first reconstruction, the following reconstructions use consecutive seeds; if None the seed is
+        taken from current time
+
+    cores : list
+        numbers of cores partitioned between the worker processes, so each process runs on its own cores; if None the
+        cores are given by cpu_cores configuration parameter, or are all cores the process runs on; if processes is 0,
+        each reconstruction runs on all the cores, as in fast_module_reconstruction
+
+    Returns
+    -------
+    results : list
+        a list of (image, support, coherence, errors) tuples, ordered by final error
+    """
+    if seed is None:
+        seed = int(time.time())
+    if keep is None:
+        keep = starts
+    results = []
+    if processes == 0:
+        for start_seed in range(seed, seed + starts):
+            _keep_best(results, fast_module_reconstruction(proc, data, conf, start_seed, cores=cores, checkpoints=False),
+                       keep)
+        return results
+
+    if cores is None:
+        cores = _cpu_config(read_config(conf))[1] or cpu.get_cores()
+    if processes is None:
+        processes = min(starts, len(cores))
+
+    partitions = mp.Queue()
+    for part in cpu.partition_cores(processes, cores):
+        partitions.put(part)
+    # each start runs in a new process, so no state of the CFM is carried over from the previous start
+    pool = mp.Pool(processes, _init_multi_start_worker, (proc, data, conf, partitions), maxtasksperchild=1)
+    try:
+        for result in pool.imap_unordered(_run_multi_start, range(seed, seed + starts)):
+            _keep_best(results, result, keep)
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
+
+
+def _keep_best(results, result, keep):
+    """
+    This function adds the result to the results ordered by final error, and keeps only the best results, so the
+    memory does not grow with number of starts.
+    """
+    results.append(result)
+    results.sort(key=lambda res: res[3][-1])
+    del results[keep:]
+
+
+def _config_value(value):
+    """
+    This function formats the value parsed from configuration file back to the configuration syntax.
+    """
+    if isinstance(value, (list, tuple)):
+        return '(' + ', '.join(_config_value(item) for item in value) + ')'
+    if isinstance(value, str):
+        return '"' + value + '"'
+    return str(value)
+
+
+def _write_level_config(conf, algorithm_sequence):
+    """
+    This function writes a copy of the configuration file with the algorithm_sequence replaced by the given sequence,
+    and returns name of the written file. The caller removes the file.
+    """
+    with open(conf, 'r') as f:
+        text = f.read()
+    setting = re.search(r'^[ \t]*algorithm_sequence\s*=', text, re.M)
+    if setting is not None:
+        # the sequence ends where its parentheses are balanced, it may span several lines
+        end = setting.end()
+        depth = 0
+        while end < len(text):
+            if text[end] == '(':
+                depth += 1
+            elif text[end] == ')':
+                depth -= 1
+                if depth == 0:
+                    end += 1
+                    break
+            end += 1
+        if text[end:end + 1] == ';':
+            end += 1
+        text = text[:setting.start()] + text[end:]
+    text += '\nalgorithm_sequence = ' + _config_value(algorithm_sequence) + ';\n'
+    level_conf = tempfile.NamedTemporaryFile(mode='w', suffix='.conf', delete=False)
+    level_conf.write(text)
+    level_conf.close()
+    return level_conf.name
+
+
+def pyramid_reconstruction(proc, data, conf, config_map, cores=None, checkpoints=True):
+    """
+    This function reconstructs the image from coarse to fine resolution. Each level of the pyramid reconstructs the data
+    cropped in reciprocal space to a fraction of its dimensions, which is the data of lower resolution. The image and
+    support of the level, interpolated to the dimensions of the next level, are the guess and initial support of the
+    next level. The last level reconstructs the full data with the configured algorithm_sequence.
+    The levels are configured by pyramid_levels list of fractions, and optionally by pyramid_algorithm_sequences list
+    of algorithm sequences of the levels; if not configured, the levels run the configured algorithm_sequence.
+
+    Parameters
+    ----------
+    proc : str
+        a string indicating the processor type
+
+    data : array
+        a 3D np array containing pre-processed experiment data
+
+    conf : str
+        configuration file name
+
+    config_map : dict
+        configuration map
+
+    cores : list
+        numbers of cores the levels run on, as in fast_module_reconstruction
+
+    checkpoints : bool
+        if False, the configured checkpoints are not written by the last level; the lower levels do not write them, as
+        they reconstruct data of other dimensions
+
+    Returns
+    -------
+    image, support, coherence, errors : tuple
+        results of the last level, as returned by fast_module_reconstruction
+    """
+    levels = config_map.pyramid_levels
+    try:
+        sequences = config_map.pyramid_algorithm_sequences
+    except AttributeError:
+        sequences = [config_map.algorithm_sequence] * len(levels)
+
+    guess = None
+    guess_support = None
+    for fraction, sequence in zip(levels, sequences):
+        # the dimensions are even, so the crop keeps the zero frequency in the center
+        shape = tuple(min(ut.get_fft_dim(int(dim * fraction), 2, proc), dim) for dim in data.shape)
+        if guess is not None:
+            guess = ut.upsample_image(guess, shape)
+            guess_support = ut.upsample_support(guess_support, shape)
+        level_conf = _write_level_config(conf, sequence)
+        try:
+            start = time.time()
+            image, support, coherence, errors = fast_module_reconstruction(proc, ut.crop_reciprocal(data, shape),
+                                                                           level_conf, guess=guess,
+                                                                           guess_support=guess_support, cores=cores,
+                                                                           checkpoints=False)
+            print ('level ' + str(shape) + ' time ' + str(time.time() - start) + ' error ' + str(errors[-1]))
+        finally:
+            os.remove(level_conf)
+        # the results are transposed relatively to the data
+        guess = image.T
+        guess_support = support.T
+
+    if guess is not None:
+        guess = ut.upsample_image(guess, data.shape)
+        guess_support = ut.upsample_support(guess_support, data.shape)
+    return fast_module_reconstruction(proc, data, conf, guess=guess, guess_support=guess_support, cores=cores,
+                                      checkpoints=checkpoints)
 
 
 def write_simple(arr, filename):
@@ -247,7 +779,133 @@ def write_simple(arr, filename):
     id.dimensions=arr.shape
     write_data(id, filename)
 
-def reconstruction(proc, filename, conf):
+def run_reconstruction(proc, data, conf, config_map, processes=None, cores=None, checkpoints=True):
+    """
+    This function runs reconstruction of the prepared data in the configured mode: in generations, from multiple
+    random guesses, from coarse to fine resolution, or a single reconstruction.
+
+    Parameters
+    ----------
+    proc : str
+        a string indicating the processor type
+
+    data : array
+        a 3D np array containing pre-processed experiment data
+
+    conf : str
+        configuration file name
+
+    config_map : dict
+        configuration map
+
+    processes : int
+        number of worker processes of the reconstructions from multiple random guesses, defaults to number of cpus;
+        if 0, they run one after another in this process
+
+    cores : list
+        numbers of cores the reconstruction runs on, as in fast_module_reconstruction; the reconstructions from multiple
+        random guesses partition them between the worker processes
+
+    checkpoints : bool
+        if False, the configured checkpoints are not written, i.e. when other processes reconstruct with the same
+        configuration; the reconstructions from multiple random guesses and in generations never write them
+
+    Returns
+    -------
+    image, support, coherence, errors : tuple
+        results of the reconstruction, as returned by fast_module_reconstruction
+    """
+    # run multiple reconstructions from different random guesses if configured, and use the best one
+    try:
+        starts = config_map.reconstructions
+    except AttributeError:
+        starts = 1
+    try:
+        generations = config_map.generations
+    except AttributeError:
+        generations = 1
+    try:
+        pyramid = len(config_map.pyramid_levels) > 0
+    except AttributeError:
+        pyramid = False
+    if generations > 1:
+        image, support, coherence, errors = fast_module_reconstruction(proc, data, conf, generations=generations,
+                                                                       population=starts, cores=cores)
+    elif starts > 1:
+        results = multi_start_reconstruction(proc, data, conf, starts, processes, keep=1, cores=cores)
+        image, support, coherence, errors = results[0]
+    elif pyramid:
+        image, support, coherence, errors = pyramid_reconstruction(proc, data, conf, config_map, cores, checkpoints)
+    else:
+        image, support, coherence, errors = fast_module_reconstruction(proc, data, conf, cores=cores,
+                                                                       checkpoints=checkpoints)
+    return image, support, coherence, errors
+
+
+def save_results(conf, config_map, image, support, coherence, res_dir=None):
+    """
+    This function saves the reconstructed image, support and coherence in the results directory, and in .mat files if
+    configured.
+
+    Parameters
+    ----------
+    conf : str
+        configuration file name
+
+    config_map : dict
+        configuration map
+
+    image : array
+        a 3D np array containing reconstructed image
+
+    support : array
+        a 3D np array containing support
+
+    coherence : array
+        a 3D np array containing coherence, or None
+
+    res_dir : str
+        directory all results are written to, if None the configured res_dir, or the current directory if not
+        configured
+
+    Returns
+    -------
+    none
+    """
+    if res_dir is None:
+        try:
+            res_dir = config_map.res_dir
+        except AttributeError:
+            res_dir = ''
+    if len(res_dir) > 0:
+        if not res_dir.endswith('/'):
+            res_dir = res_dir + '/'
+        if not os.path.exists(res_dir):
+            os.makedirs(res_dir)
+
+    # save image and support in .mat files if configured
+    try:
+        save_data = config_map.save_data
+        if save_data:
+            image_dict = {}
+            support_dict = {}
+            image_dict['image'] = image
+            sio.savemat(res_dir + 'image.mat', image_dict)
+            support_dict['support'] = support
+            sio.savemat(res_dir + 'support.mat', support_dict)
+    except AttributeError:
+        pass
+
+    write_simple(image, res_dir + "simple_amp_ph.vtk")
+    write_simple(support, res_dir + "simple_support.vtk")
+
+    cx.save_CX(conf, image, support, res_dir + 'cx')
+
+    if coherence is not None:
+        write_simple(coherence, res_dir + "simple_coh.vtk")
+
+
+def reconstruction(proc, filename, conf, writer=None):
     """
     This function is called by the user. It checks whether the data is valid and configuration file exists.
     It calls function to pre-process the data, and then to run reconstruction.
@@ -263,6 +921,10 @@ def reconstruction(proc, filename, conf):
         
     conf : str
         configuration file name
+
+    writer : ResultWriter
+        if given, the results are written in background by the writer, so the caller can start the next
+        reconstruction while they are written; otherwise the results are written before the function returns
         
     Returns
     -------
@@ -273,17 +935,14 @@ def reconstruction(proc, filename, conf):
         a vector containing mean error for each iteration
     """
 
-    data = ut.get_array_from_tif(filename)
-    if len(data.shape) > 3:
-        print ("this program supports 3d images only")
-        return
-
     config_map = read_config(conf)
     if config_map is None:
         print ("can't read configuration file")
         return None, None
 
-    data = prepare_data(config_map, data)
+    data = get_prepared_data(config_map, filename, proc)
+    if data is None:
+        return
     # save prepared data in .mat file if configured
     try:
         save_data = config_map.save_data
@@ -294,37 +953,11 @@ def reconstruction(proc, filename, conf):
     except AttributeError:
         pass
 
-    image, support, coherence, errors = fast_module_reconstruction(proc, data, conf)
-
-    # save image and support in .mat files if configured
-    try:
-        save_results = config_map.save_data
-        if save_results:
-            image_dict = {}
-            support_dict = {}
-            image_dict['image'] = image
-            sio.savemat('image.mat', image_dict)
-            support_dict['support'] = support
-            sio.savemat('support.mat', support_dict)
-    except AttributeError:
-        pass
-
-
-    try:
-        res_dir = config_map.res_dir
-        if not res_dir.endswith('/'):
-            res_dir = res_dir + '/'
-        if not os.path.exists(res_dir):
-            os.makedirs(res_dir)
-    except AttributeError:
-        res_dir = ''
-    write_simple(image, res_dir + "simple_amp_ph.vtk")
-    write_simple(support, res_dir + "simple_support.vtk")
-
-    cx.save_CX(conf, image, support, res_dir + 'cx')
-
-    if coherence is not None:
-        write_simple(coherence, res_dir + "simple_coh.vtk")
+    image, support, coherence, errors = run_reconstruction(proc, data, conf, config_map)
+    if writer is None:
+        save_results(conf, config_map, image, support, coherence)
+    else:
+        writer.put(save_results, conf, config_map, image, support, coherence)
 
     # plot error
 
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright (c) 2016, UChicago Argonne, LLC. All rights reserved.         #
+#                                                                         #
+# Copyright 2016. UChicago Argonne, LLC. This software was produced       #
+# under U.S. Government contract DE-AC02-06CH11357 for Argonne National   #
+# Laboratory (ANL), which is operated by UChicago Argonne, LLC for the    #
+# U.S. Department of Energy. The U.S. Government has rights to use,       #
+# reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR    #
+# UChicago Argonne, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR        #
+# ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is     #
+# modified to produce derivative works, such modified software should     #
+# be clearly marked, so as not to confuse it with the version available   #
+# from ANL.                                                               #
+#                                                                         #
+# Additionally, redistribution and use in source and binary forms, with   #
+# or without modification, are permitted provided that the following      #
+# conditions are met:                                                     #
+#                                                                         #
+#     * Redistributions of source code must retain the above copyright    #
+#       notice, this list of conditions and the following disclaimer.     #
+#                                                                         #
+#     * Redistributions in binary form must reproduce the above copyright #
+#       notice, this list of conditions and the following disclaimer in   #
+#       the documentation and/or other materials provided with the        #
+#       distribution.                                                     #
+#                                                                         #
+#     * Neither the name of UChicago Argonne, LLC, Argonne National       #
+#       Laboratory, ANL, the U.S. Government, nor the names of its        #
+#       contributors may be used to endorse or promote products derived   #
+#       from this software without specific prior written permission.     #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY UChicago Argonne, LLC AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS       #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL UChicago     #
+# Argonne, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,        #
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,    #
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;        #
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER        #
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT      #
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN       #
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE         #
+# POSSIBILITY OF SUCH DAMAGE.                                             #
+# #########################################################################
+"""
+Please make sure the installation :ref:`pre-requisite-reference-label` are met.
+This module writes reconstruction results in background, so the controller can start the next reconstruction while
+the results of the previous one are written. The writes are queued to a thread; the queue is bounded, so the results
+waiting to be written do not fill the memory when the writing is slower than the reconstructions.
+"""
+
+import time
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+__author__ = "Barbara Frosik"
+__copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['ResultWriter']
+
+
+class ResultWriter:
+    """
+    This class runs queued write functions in a background thread, and measures how much of the writing time was
+    hidden by running it concurrently with the controller.
+    """
+
+    def __init__(self, capacity=2):
+        """
+        The constructor starts the writing thread.
+
+        Parameters
+        ----------
+        capacity : int
+            maximum number of writes waiting in the queue; queuing another write waits until one is taken
+
+        Returns
+        -------
+        none
+        """
+        self.writes = queue.Queue(capacity)
+        # total time of the writes, and time the controller waited for the writer
+        self.write_time = 0.0
+        self.wait_time = 0.0
+        self.failures = []
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            write = self.writes.get()
+            if write is None:
+                return
+            function, args = write
+            start = time.time()
+            try:
+                function(*args)
+            except Exception as e:
+                # the failure is reported when the writer is closed, the following writes continue
+                self.failures.append(str(e))
+            self.write_time += time.time() - start
+
+    def put(self, function, *args):
+        """
+        Queues the function to be called with the arguments in the writing thread. The arrays in arguments must not
+        be modified after they are queued.
+        """
+        start = time.time()
+        self.writes.put((function, args))
+        self.wait_time += time.time() - start
+
+    def close(self):
+        """
+        Waits until all queued writes are completed, and stops the writing thread.
+
+        Returns
+        -------
+        stats : dict
+            'write_time' total time of the writes, 'hidden_time' the part of it the controller did not wait for,
+            and 'failures' list of messages of the failed writes
+        """
+        start = time.time()
+        self.writes.put(None)
+        self.thread.join()
+        self.wait_time += time.time() - start
+        return {'write_time': self.write_time,
+                'hidden_time': max(self.write_time - self.wait_time, 0.0),
+                'failures': self.failures}
@@ -1,45 +1,198 @@
 # distutils: language = c++
+# distutils: define_macros = DATA_TYPE=def_type
 # distutils: include_dirs = ['include', 'AF_DIR/include', 'LC_DIR/lib',]
-# distutils: sources = ['src_cpp/algorithm.cpp', 'src_cpp/bridge.cpp', 'src_cpp/manager.cpp', 'src_cpp/parameters.cpp', 'src_cpp/pcdi.cpp', 'src_cpp/state.cpp', 'src_cpp/support.cpp', 'src_cpp/util.cpp', 'src_cpp/worker.cpp']
+# distutils: sources = ['src_cpp/algorithm.cpp', 'src_cpp/bridge.cpp', 'src_cpp/diagnostics.cpp', 'src_cpp/manager.cpp', 'src_cpp/parameters.cpp', 'src_cpp/pcdi.cpp', 'src_cpp/progress.cpp', 'src_cpp/state.cpp', 'src_cpp/support.cpp', 'src_cpp/util.cpp', 'src_cpp/worker.cpp']
 # distutils: libraries = ['afcuda',  'config++',]
 # distutils: library_dirs = ['AF_DIR/lib', 'LC_DIR/lib/.libs', ]
 
 from libcpp.vector cimport vector
 from libcpp.string cimport string
+import numpy as np
 
-cdef extern from "../include/bridge.hpp":
+
+cdef extern from "../include/bridge.hpp" nogil:
     cdef cppclass Bridge:
         Bridge() except +
-        void StartCalcWithGuess(vector[float], vector[float], vector[float], vector[int], string)
-        void StartCalc(vector[float], vector[int], string)
-        void StartCalcMultiple(vector[float], vector[int], string, int)
-        vector[def_type] GetImageR()
-        vector[def_type] GetImageI()
+        void StartCalcWithGuess(def_type *, def_type *, def_type *, vector[int], string)
+        void StartCalcWithGuessSupport(def_type *, def_type *, def_type *, float *, vector[int], string)
+        void StartCalc(def_type *, vector[int], string)
+        void StartCalcMultiple(def_type *, vector[int], string, int)
+        void StartCalcWithSeed(def_type *, vector[int], string, unsigned int)
+        void StartCalcGenerations(def_type *, vector[int], string, int, int) except +
+        void Resume(def_type *, vector[int], string, string) except +
+        void SetCheckpoints(bint)
+        void GetImageR(def_type *)
+        void GetImageI(def_type *)
+        vector[int] GetSupportBounds()
+        void GetImageBox(def_type *, def_type *)
         vector[def_type] GetErrors()
-        vector[float] GetSupportV()
-        vector[def_type] GetCoherenceV()
+        vector[def_type] GetGenerationErrors()
+        vector[double] GetGenerationTimes()
+        vector[int] GetMetricIterations()
+        vector[string] GetMetricNames()
+        vector[double] GetMetricValues()
+        void GetProgress(vector[int]&, vector[def_type]&)
+        bint HasStatistics()
+        void GetAmplitudeVariance(def_type *)
+        void GetAveragePhase(def_type *)
+        void GetSupport(float *)
+        int GetCoherenceSize()
+        void GetCoherence(def_type *)
+
+
+# numpy type matching the def_type the module was built with
+d_type = np.float32 if sizeof(def_type) == 4 else np.float64
+
+
+def as_buffer(arr):
+    """
+    Returns the array as a contiguous flat array of d_type. No copy is made if the array already meets these
+    requirements.
+    """
+    return np.ascontiguousarray(arr, dtype=d_type).ravel()
 
 
 cdef class PyBridge:
     cdef Bridge *thisptr
+    cdef int num_points
     def __cinit__(self):
         self.thisptr = new Bridge()
+        self.num_points = 0
+    property d_type:
+        # numpy type of the data and image buffers, as in the numpy module
+        def __get__(self):
+            return d_type
     def __dealloc__(self):
         del self.thisptr
-    def start_calc_with_guess(self, data_r, guess_r, guess_i, dims, config):
-        self.thisptr.StartCalcWithGuess(data_r, guess_r, guess_i, dims, config.encode())
+    def start_calc_with_guess(self, data_r, guess_r, guess_i, dims, config, support=None):
+        cdef def_type[::1] data_v = as_buffer(data_r)
+        cdef def_type[::1] guess_r_v = as_buffer(guess_r)
+        cdef def_type[::1] guess_i_v = as_buffer(guess_i)
+        cdef float[::1] support_v
+        self.num_points = data_v.shape[0]
+        cdef vector[int] dims_v = dims
+        cdef string config_s = config.encode()
+        # the calculations do not access python objects, so other python threads may run concurrently
+        if support is None:
+            with nogil:
+                self.thisptr.StartCalcWithGuess(&data_v[0], &guess_r_v[0], &guess_i_v[0], dims_v, config_s)
+        else:
+            # the support replaces the configured initial support
+            support_v = np.ascontiguousarray(support, dtype=np.float32).ravel()
+            with nogil:
+                self.thisptr.StartCalcWithGuessSupport(&data_v[0], &guess_r_v[0], &guess_i_v[0], &support_v[0],
+                                                       dims_v, config_s)
     def start_calc(self, data_r, dims, config):
-        self.thisptr.StartCalc(data_r, dims, config.encode())
+        cdef def_type[::1] data_v = as_buffer(data_r)
+        self.num_points = data_v.shape[0]
+        cdef vector[int] dims_v = dims
+        cdef string config_s = config.encode()
+        with nogil:
+            self.thisptr.StartCalc(&data_v[0], dims_v, config_s)
     def start_calc_multiple(self, data_r, dims, config, no_threads):
-        self.thisptr.StartCalcMultiple(data_r, dims, config, no_threads)
+        cdef def_type[::1] data_v = as_buffer(data_r)
+        self.num_points = data_v.shape[0]
+        cdef vector[int] dims_v = dims
+        cdef string config_s = config.encode()
+        cdef int threads = no_threads
+        with nogil:
+            self.thisptr.StartCalcMultiple(&data_v[0], dims_v, config_s, threads)
+    def start_calc_with_seed(self, data_r, dims, config, seed):
+        cdef def_type[::1] data_v = as_buffer(data_r)
+        self.num_points = data_v.shape[0]
+        cdef vector[int] dims_v = dims
+        cdef string config_s = config.encode()
+        cdef unsigned int seed_v = seed
+        with nogil:
+            self.thisptr.StartCalcWithSeed(&data_v[0], dims_v, config_s, seed_v)
+    def start_calc_generations(self, data_r, dims, config, generations, population):
+        cdef def_type[::1] data_v = as_buffer(data_r)
+        self.num_points = data_v.shape[0]
+        cdef vector[int] dims_v = dims
+        cdef string config_s = config.encode()
+        cdef int generations_v = generations
+        cdef int population_v = population
+        with nogil:
+            self.thisptr.StartCalcGenerations(&data_v[0], dims_v, config_s, generations_v, population_v)
+    def resume(self, data_r, dims, config, checkpoint):
+        cdef def_type[::1] data_v = as_buffer(data_r)
+        self.num_points = data_v.shape[0]
+        cdef vector[int] dims_v = dims
+        cdef string config_s = config.encode()
+        cdef string checkpoint_s = checkpoint.encode()
+        with nogil:
+            self.thisptr.Resume(&data_v[0], dims_v, config_s, checkpoint_s)
+    def set_checkpoints(self, enabled):
+        self.thisptr.SetCheckpoints(enabled)
     def get_image_r(self):
-        return self.thisptr.GetImageR()
+        image_r = np.empty(self.num_points, dtype=d_type)
+        cdef def_type[::1] image_v = image_r
+        self.thisptr.GetImageR(&image_v[0])
+        return image_r
     def get_image_i(self):
-        return self.thisptr.GetImageI()
+        image_i = np.empty(self.num_points, dtype=d_type)
+        cdef def_type[::1] image_v = image_i
+        self.thisptr.GetImageI(&image_v[0])
+        return image_i
+    def get_support_bounds(self):
+        """
+        Returns list of the beginning and end (exclusive) of the support bounding box in each dimension.
+        """
+        return self.thisptr.GetSupportBounds()
+    def get_image_box(self):
+        """
+        Returns the real and imaginary part of the image within the support bounding box. The image is zero outside
+        of the box, so only the box is copied.
+        """
+        bounds = self.thisptr.GetSupportBounds()
+        box_points = (bounds[1] - bounds[0]) * (bounds[3] - bounds[2]) * (bounds[5] - bounds[4])
+        image_r = np.empty(box_points, dtype=d_type)
+        image_i = np.empty(box_points, dtype=d_type)
+        cdef def_type[::1] image_r_v = image_r
+        cdef def_type[::1] image_i_v = image_i
+        self.thisptr.GetImageBox(&image_r_v[0], &image_i_v[0])
+        return image_r, image_i
     def get_errors(self):
         return self.thisptr.GetErrors()
+    def get_generation_metrics(self):
+        return self.thisptr.GetGenerationTimes(), self.thisptr.GetGenerationErrors()
+    def get_metrics(self):
+        """
+        Returns list of (iteration, name, value) diagnostic metrics, from the oldest.
+        """
+        names = [name.decode() for name in self.thisptr.GetMetricNames()]
+        return list(zip(self.thisptr.GetMetricIterations(), names, self.thisptr.GetMetricValues()))
+    def get_progress(self):
+        """
+        Returns list of (iteration, error) reported by the running reconstruction since the last call. It may be
+        called from another thread while the reconstruction runs.
+        """
+        cdef vector[int] iterations
+        cdef vector[def_type] errors
+        self.thisptr.GetProgress(iterations, errors)
+        return list(zip(iterations, errors))
+    def get_statistics(self):
+        """
+        Returns the variance of amplitudes and average phase over the averaging iterations, or (None, None) if the
+        statistics were not collected.
+        """
+        if not self.thisptr.HasStatistics():
+            return None, None
+        variance = np.empty(self.num_points, dtype=d_type)
+        phase = np.empty(self.num_points, dtype=d_type)
+        cdef def_type[::1] variance_v = variance
+        cdef def_type[::1] phase_v = phase
+        self.thisptr.GetAmplitudeVariance(&variance_v[0])
+        self.thisptr.GetAveragePhase(&phase_v[0])
+        return variance, phase
     def get_support(self):
-        return self.thisptr.GetSupportV()
+        support = np.empty(self.num_points, dtype=np.float32)
+        cdef float[::1] support_v = support
+        self.thisptr.GetSupport(&support_v[0])
+        return support
     def get_coherence(self):
-        return self.thisptr.GetCoherenceV()
-
+        coherence = np.empty(self.thisptr.GetCoherenceSize(), dtype=d_type)
+        cdef def_type[::1] coherence_v = coherence
+        if coherence.shape[0] > 0:
+            self.thisptr.GetCoherence(&coherence_v[0])
+        return coherence
@@ -145,17 +145,8 @@ class CXDViz(tr.HasTraits):
 
     def update_coords(self):
         dims = list(self.arr[self.cropobj].shape)
-
-        r = np.mgrid[(dims[0] - 1) * self.dx:-self.dx:-self.dx, \
-            0:dims[1] * self.dy:self.dy, 0:dims[2] * self.dz:self.dz]
-
-        r.shape = 3, dims[0] * dims[1] * dims[2]
-        r = r.transpose()
-
-        print r.shape
-        print self.T.shape
-
-        self.coords = np.dot(r, self.T)
+        # the coordinates are cached, so the image and support of the same shape share them
+        self.coords = ut.get_grid_coords(dims, (self.dx, self.dy, self.dz), self.T)
 
     def set_array(self, array, logentry=None):
         self.arr = array
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright (c) 2016, UChicago Argonne, LLC. All rights reserved.         #
+#                                                                         #
+# Copyright 2016. UChicago Argonne, LLC. This software was produced       #
+# under U.S. Government contract DE-AC02-06CH11357 for Argonne National   #
+# Laboratory (ANL), which is operated by UChicago Argonne, LLC for the    #
+# U.S. Department of Energy. The U.S. Government has rights to use,       #
+# reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR    #
+# UChicago Argonne, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR        #
+# ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is     #
+# modified to produce derivative works, such modified software should     #
+# be clearly marked, so as not to confuse it with the version available   #
+# from ANL.                                                               #
+#                                                                         #
+# Additionally, redistribution and use in source and binary forms, with   #
+# or without modification, are permitted provided that the following      #
+# conditions are met:                                                     #
+#                                                                         #
+#     * Redistributions of source code must retain the above copyright    #
+#       notice, this list of conditions and the following disclaimer.     #
+#                                                                         #
+#     * Redistributions in binary form must reproduce the above copyright #
+#       notice, this list of conditions and the following disclaimer in   #
+#       the documentation and/or other materials provided with the        #
+#       distribution.                                                     #
+#                                                                         #
+#     * Neither the name of UChicago Argonne, LLC, Argonne National       #
+#       Laboratory, ANL, the U.S. Government, nor the names of its        #
+#       contributors may be used to endorse or promote products derived   #
+#       from this software without specific prior written permission.     #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY UChicago Argonne, LLC AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS       #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL UChicago     #
+# Argonne, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,        #
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,    #
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;        #
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER        #
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT      #
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN       #
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE         #
+# POSSIBILITY OF SUCH DAMAGE.                                             #
+# #########################################################################
+"""
+Please make sure the installation :ref:`pre-requisite-reference-label` are met.
+This module controls the cpu resources used by reconstructions. The libraries calculating on cpu read the number of
+threads from environment variables when they are loaded, so the resources are set in the initializer of a worker
+process, before the bridge module is imported in it. The process is bound to the given cores, and the threads started
+later inherit the binding. The binding uses os.sched_setaffinity, or psutil if it is not available, i.e. on Python 2.
+The memory is placed on the NUMA node of the core that first writes it, so the buffers of a bound reconstruction stay
+local to its cores.
+The module also partitions the cores of a node between reconstructions running concurrently, so they do not
+oversubscribe the cores.
+"""
+
+import os
+import multiprocessing as mp
+import contextlib
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+__author__ = "Barbara Frosik"
+__copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['get_cores',
+           'set_cpu_resources',
+           'cpu_resources',
+           'partition_cores']
+
+# environment variables setting number of threads of OpenMP, MKL, and OpenBLAS thread pools
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+
+def _get_affinity():
+    """
+    Returns the cores the process is bound to, or None if the binding cannot be read on this platform.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    if psutil is not None:
+        return sorted(psutil.Process().cpu_affinity())
+    return None
+
+
+def _set_affinity(cores):
+    """
+    Binds the process to the cores. Raises OSError if the binding is not supported on this platform, so a requested
+    binding is not silently ignored.
+    """
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    elif psutil is not None:
+        psutil.Process().cpu_affinity(list(cores))
+    else:
+        raise OSError('binding to cores requires os.sched_setaffinity or the psutil package')
+
+
+def get_cores():
+    """
+    This function returns the cores the process may run on.
+
+    Returns
+    -------
+    cores : list
+        sorted list of core numbers
+    """
+    cores = _get_affinity()
+    if cores is None:
+        return list(range(mp.cpu_count()))
+    return cores
+
+
+def set_cpu_resources(threads=None, cores=None):
+    """
+    This function binds the process to the cores, and sets number of threads of the libraries. The settings are kept
+    for the rest of the process, so it is called in the initializer of a worker process, before the bridge module is
+    imported. To set the resources for a reconstruction run in the calling process use cpu_resources.
+
+    Parameters
+    ----------
+    threads : int
+        number of threads, if None or not positive the number of cores the process runs on
+
+    cores : list
+        numbers of cores the process is bound to, if None or empty the binding is not changed
+
+    Returns
+    -------
+    threads : int
+        number of threads set
+    """
+    if cores:
+        _set_affinity(cores)
+    if threads is None or threads <= 0:
+        threads = len(get_cores())
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+    return threads
+
+
+@contextlib.contextmanager
+def cpu_resources(threads=None, cores=None):
+    """
+    This function sets the cpu resources as set_cpu_resources for the duration of the with block, and restores the
+    previous binding and thread variables of the process at its end. If neither threads nor cores are given, the
+    resources are not changed.
+
+    Parameters
+    ----------
+    threads : int
+        number of threads, if None or not positive the number of cores the process runs on
+
+    cores : list
+        numbers of cores the process is bound to, if None or empty the binding is not changed
+
+    Returns
+    -------
+    threads : int
+        number of threads set, or 0 if the resources are not changed, the value of the with statement
+    """
+    if not cores and (threads is None or threads <= 0):
+        yield 0
+        return
+    affinity = _get_affinity() if cores else None
+    variables = dict((variable, os.environ.get(variable)) for variable in THREAD_VARIABLES)
+    try:
+        yield set_cpu_resources(threads, cores)
+    finally:
+        if affinity is not None:
+            _set_affinity(affinity)
+        for variable, value in variables.items():
+            if value is None:
+                os.environ.pop(variable, None)
+            else:
+                os.environ[variable] = value
+
+
+def partition_cores(parts, cores=None):
+    """
+    This function splits the cores into the given number of parts, each for one of concurrently running
+    reconstructions. The parts contain consecutive cores, which are usually on the same NUMA node, and differ in size
+    by one at most. If there are fewer cores than parts, each part has one core, and the cores are shared.
+
+    Parameters
+    ----------
+    parts : int
+        number of parts
+
+    cores : list
+        numbers of cores to partition, if None the cores the process runs on
+
+    Returns
+    -------
+    partitions : list
+        list of lists of core numbers
+    """
+    if cores is None:
+        cores = get_cores()
+    if parts > len(cores):
+        return [[cores[i % len(cores)]] for i in range(parts)]
+    bounds = [len(cores) * i // parts for i in range(parts + 1)]
+    return [list(cores[bounds[i]:bounds[i + 1]]) for i in range(parts)]
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright (c) 2016, UChicago Argonne, LLC. All rights reserved.         #
+#                                                                         #
+# Copyright 2016. UChicago Argonne, LLC. This software was produced       #
+# under U.S. Government contract DE-AC02-06CH11357 for Argonne National   #
+# Laboratory (ANL), which is operated by UChicago Argonne, LLC for the    #
+# U.S. Department of Energy. The U.S. Government has rights to use,       #
+# reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR    #
+# UChicago Argonne, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR        #
+# ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is     #
+# modified to produce derivative works, such modified software should     #
+# be clearly marked, so as not to confuse it with the version available   #
+# from ANL.                                                               #
+#                                                                         #
+# Additionally, redistribution and use in source and binary forms, with   #
+# or without modification, are permitted provided that the following      #
+# conditions are met:                                                     #
+#                                                                         #
+#     * Redistributions of source code must retain the above copyright    #
+#       notice, this list of conditions and the following disclaimer.     #
+#                                                                         #
+#     * Redistributions in binary form must reproduce the above copyright #
+#       notice, this list of conditions and the following disclaimer in   #
+#       the documentation and/or other materials provided with the        #
+#       distribution.                                                     #
+#                                                                         #
+#     * Neither the name of UChicago Argonne, LLC, Argonne National       #
+#       Laboratory, ANL, the U.S. Government, nor the names of its        #
+#       contributors may be used to endorse or promote products derived   #
+#       from this software without specific prior written permission.     #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY UChicago Argonne, LLC AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS       #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL UChicago     #
+# Argonne, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,        #
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,    #
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;        #
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER        #
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT      #
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN       #
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE         #
+# POSSIBILITY OF SUCH DAMAGE.                                             #
+# #########################################################################
+"""
+Please make sure the installation :ref:`pre-requisite-reference-label` are met.
+This module implements on disk cache of prepared data. The prepared data is stored in .npy files named by a hash of the
+raw data file content and the parameters used to prepare the data, so the preparation can be skipped when the data is
+reconstructed again with different reconstruction parameters.
+"""
+
+import os
+import errno
+import hashlib
+import numpy as np
+
+
+__author__ = "Barbara Frosik"
+__copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['PreparedDataCache']
+
+# configuration parameters that affect the prepared data
+PREPARATION_PARAMETERS = ('amp_threshold', 'aliens', 'binning', 'center_shift', 'zero_pad')
+# version of the preparation algorithm, part of the key; it is incremented when the prepared data changes for the
+# same parameters (i.e. the padded dimensions are chosen differently), so the files prepared before are not used
+PREPARATION_VERSION = 2
+
+
+def _plain(value):
+    """
+    Converts the configuration value to nested tuples of numbers and strings, so it has a stable representation.
+    """
+    if isinstance(value, (str, bytes)):
+        return value
+    try:
+        return tuple(_plain(v) for v in value)
+    except TypeError:
+        return value
+
+
+class PreparedDataCache:
+    """
+    This class maintains a directory of prepared data arrays. The total size of the cached files is limited. When the
+    limit is exceeded, the least recently used files are removed.
+    """
+
+    def __init__(self, cache_dir, max_size):
+        """
+        The constructor creates the cache directory if it does not exist.
+
+        Parameters
+        ----------
+        cache_dir : str
+            directory where the prepared arrays are stored
+
+        max_size : int
+            maximum size in bytes of all cached files
+
+        Returns
+        -------
+        none
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def get_key(self, filename, config_map, fft_primes=None):
+        """
+        This function calculates the key of prepared data. The key is a hash of the raw data file content, the
+        values of the preparation parameters, the dimensions supported by FFT library, and the version of the
+        preparation algorithm.
+
+        Parameters
+        ----------
+        filename : str
+            name of a file containing raw experiment data
+
+        config_map : dict
+            configuration map
+
+        fft_primes : tuple
+            prime factors of dimensions supported by FFT library, the padding depends on them
+
+        Returns
+        -------
+        key : str
+            the key of prepared data
+        """
+        hash = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            chunk = f.read(1 << 20)
+            while chunk:
+                hash.update(chunk)
+                chunk = f.read(1 << 20)
+        for param in PREPARATION_PARAMETERS:
+            try:
+                value = _plain(getattr(config_map, param))
+            except AttributeError:
+                value = None
+            hash.update(repr((param, value)).encode())
+        hash.update(repr(('fft_primes', fft_primes)).encode())
+        hash.update(repr(('version', PREPARATION_VERSION)).encode())
+        return hash.hexdigest()
+
+    def _get_filename(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def get(self, key):
+        """
+        This function returns the cached prepared data as read only memory mapped array, or None if the data with the
+        given key is not cached.
+
+        Parameters
+        ----------
+        key : str
+            the key of prepared data
+
+        Returns
+        -------
+        data : array
+            memory mapped prepared data or None
+        """
+        filename = self._get_filename(key)
+        try:
+            # mark the file as recently used
+            os.utime(filename, None)
+            return np.load(filename, mmap_mode='r')
+        except (IOError, OSError) as e:
+            # the file is not cached, or was evicted by another process
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+
+    def put(self, key, data):
+        """
+        This function stores the prepared data in cache, and removes the least recently used files if the size of
+        cache exceeds the limit.
+
+        Parameters
+        ----------
+        key : str
+            the key of prepared data
+
+        data : array
+            prepared data
+
+        Returns
+        -------
+        none
+        """
+        filename = self._get_filename(key)
+        # write to a temporary file first, so a concurrent reader never finds a partially written file
+        tmp_filename = filename + '.' + str(os.getpid()) + '.tmp'
+        try:
+            with open(tmp_filename, 'wb') as f:
+                np.save(f, data)
+            os.rename(tmp_filename, filename)
+        finally:
+            # the temporary file is left only if writing failed
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+        self.evict()
+
+    def evict(self):
+        """
+        This function removes the least recently used files until the cache size does not exceed the limit. The cache
+        directory may be shared by processes, so the files removed by another process are skipped.
+        """
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npy'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total_size = sum(f[1] for f in files)
+        for mtime, size, path in files:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+            total_size -= size
@@ -53,32 +53,251 @@ This module is a suite of utility mehods.
 
 import tifffile as tf
 import numpy as np
+import itertools
+import bisect
+import collections
+import threading
 
 
-def get_array_from_tif(filename):
+# prime factors of dimensions supported by FFT library of each processor type
+FFT_PRIMES = {'cpu': (2, 3, 5, 7), 'opencl': (2, 3, 5), 'cuda': (2, 3, 5), 'numpy': (2, 3, 5, 7, 11)}
+# the largest dimension in the precomputed tables of supported dimensions
+SMOOTH_LIMIT = 1 << 16
+_smooth_numbers = {}
+# total size in bytes of recently used grid coordinate arrays kept in cache; the results are written by a background
+# thread, so the cache is guarded by a lock
+GRID_COORDS_CACHE_BYTES = 1 << 30
+_grid_coords = collections.OrderedDict()
+_grid_coords_lock = threading.Lock()
+
+
+class TifStack:
+    """
+    This class gives access to the pages of a tif file that can't be memory mapped (i.e. compressed). The pages are
+    read and decoded only when indexed, so only the requested part of the data is held in memory.
+    The class supports indexing with a page number or slice in the first dimension, optionally followed by indexes of
+    the page dimensions.
+    """
+
+    def __init__(self, filename):
+        """
+        The constructor opens the file and reads the data shape and type.
+
+        Parameters
+        ----------
+        filename : str
+            a tif filename
+
+        Returns
+        -------
+        none
+        """
+        self.tif = tf.TiffFile(filename)
+        pages = self.tif.pages
+        self.shape = (len(pages),) + tuple(pages[0].shape)
+        self.dtype = pages[0].dtype
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            index = (index,)
+        page_nos = range(self.shape[0])[index[0]]
+        page_index = index[1:]
+        if isinstance(page_nos, int):
+            return self.tif.pages[page_nos].asarray()[page_index]
+
+        data = None
+        for i in range(len(page_nos)):
+            page = self.tif.pages[page_nos[i]].asarray()[page_index]
+            if data is None:
+                data = np.empty((len(page_nos),) + page.shape, dtype=page.dtype)
+            data[i] = page
+        return data
+
+    def close(self):
+        self.tif.close()
+
+
+def get_array_from_tif(filename, mmap=False):
     """
     This method reads tif type file containing experiment data and returns the data as array.
+    If mmap is True, the data is not read. If the file is uncompressed and the data is contiguous the file is memory
+    mapped, otherwise the pages are read and decoded when indexed. Indexing the returned array reads only the indexed
+    part of the data, and the pages are shared with the system page cache when the same file is read again.
 
     Parameters
     ----------
     filename : str
         a filename containing the experiment data
 
+    mmap : bool
+        if True, returns a read only memory mapped array or TifStack instead of reading the data
+
     Returns
     -------
     data : array
         an array containing the experiment data
     """
-    
+    if mmap:
+        try:
+            return tf.memmap(filename, mode='r')
+        except ValueError:
+            # the data is compressed or not contiguous
+            return TifStack(filename)
     return tf.imread(filename)
 
 
+def get_binned_roi(shape, binsizes):
+    """
+    This function returns index of the part of array that is used after binning. The elements at the end of each
+    dimension that do not fill a whole bucket are not included.
+
+    Parameters
+    ----------
+    shape : tuple
+        shape of the array
+
+    binsizes : list
+        a list defining binning buckets for corresponding dimensions
+
+    Returns
+    -------
+    roi : tuple
+        a tuple of slices
+    """
+    binsizes = list(binsizes) + [1] * (len(shape) - len(binsizes))
+    return tuple(slice(0, shape[ax] - shape[ax] % binsizes[ax]) for ax in range(len(shape)))
+
+
+def get_binned_array_from_tif(filename, binsizes, amp_threshold=None, aliens=None):
+    """
+    This method reads tif type file containing experiment data page by page, and returns the data binned.
+    Before binning, the values below amplitude threshold are set to zero, and the aliens are zeroed out. The pages are
+    binned as they are read and accumulated into a slab of the binned array, so only one page and the binned array
+    are held in memory. This allows to bin stacks that are larger than memory.
+
+    Parameters
+    ----------
+    filename : str
+        a filename containing the experiment data
+
+    binsizes : list
+        a list defining binning buckets for corresponding dimensions, the first dimension is along the pages
+
+    amp_threshold : float
+        the values below amplitude threshold are set to zero, if None, the values are not modified
+
+    aliens : list
+        a list of aliens, each alien is a tuple of the beginning and end of the alien area in three dimensions
+
+    Returns
+    -------
+    data : array
+        an array containing the binned experiment data
+    """
+    binsizes = list(binsizes) + [1] * (3 - len(binsizes))
+    if aliens is None:
+        aliens = []
+    stack = get_array_from_tif(filename, mmap=True)
+    shape = stack.shape
+    roi = get_binned_roi(shape[1:], binsizes[1:])
+    binned_shape = (shape[0] // binsizes[0], shape[1] // binsizes[1], shape[2] // binsizes[2])
+    binned = np.zeros(binned_shape, dtype=np.float32)
+    # the pages that do not fill the last bucket are not read
+    for page_no in range(binned_shape[0] * binsizes[0]):
+        page = np.array(stack[(page_no,) + roi], dtype=np.float32)
+        if amp_threshold is not None:
+            page[page < amp_threshold] = 0
+        for alien in aliens:
+            if alien[0] <= page_no < alien[3]:
+                page[alien[1]:alien[4], alien[2]:alien[5]] = 0
+        page = bin_axis(bin_axis(page, 0, binsizes[1]), 1, binsizes[2])
+        binned[page_no // binsizes[0]] += page
+    if isinstance(stack, TifStack):
+        stack.close()
+    return binned
+
+
+def get_smooth_numbers(primes):
+    """
+    This function returns sorted list of numbers up to SMOOTH_LIMIT that have no other prime factors than the given
+    primes. The list is calculated once for each primes tuple.
+
+    Parameters
+    ----------
+    primes : tuple
+        the prime factors
+
+    Returns
+    -------
+    numbers : list
+        sorted list of numbers
+    """
+    try:
+        return _smooth_numbers[primes]
+    except KeyError:
+        pass
+    numbers = [1]
+    for prime in primes:
+        multiplied = []
+        for number in numbers:
+            while number <= SMOOTH_LIMIT:
+                multiplied.append(number)
+                number *= prime
+        numbers = multiplied
+    numbers.sort()
+    _smooth_numbers[primes] = numbers
+    return numbers
+
+
+def get_fft_dim(dim, step=1, proc='opencl'):
+    """
+    This function finds the smallest dimension supported by the FFT library of the given processor type that is not
+    smaller than the given dimension, and is spaced from it by multiple of step. The dimension is looked up in a
+    precomputed table of supported dimensions.
+
+    Parameters
+    ----------
+    dim : int
+        a dimension that needs to be transformed to one that is supported by the FFT library
+
+    step : int
+        a delta to increase the dimension
+
+    proc : str
+        the processor type, the FFT library on cpu supports also factor of 7
+
+    Returns
+    -------
+    dim : int
+        the smallest supported dimension spaced from the given dimension by multiple of step
+    """
+    primes = FFT_PRIMES.get(proc, FFT_PRIMES['opencl'])
+    numbers = get_smooth_numbers(primes)
+    for i in range(bisect.bisect_left(numbers, dim), len(numbers)):
+        if (numbers[i] - dim) % step == 0:
+            return numbers[i]
+    # the dimension is beyond the table
+    new_dim = dim
+    while not is_dim_supported(new_dim, primes):
+        new_dim += step
+    return new_dim
+
+
+def is_dim_supported(dim, primes):
+    """
+    This function returns True if the dimension has no other prime factors than the given primes.
+    """
+    sub = dim
+    for prime in primes:
+        while sub % prime == 0:
+            sub //= prime
+    return sub == 1
+
+
 def get_opencl_dim(dim, step):
     """
     This function calculates the dimension supported by opencl library (i.e. is multiplier of 2,3, or 5) and is closest to the 
-    given starting dimension, and spaced by the given step.
-    If the dimension is not supported the function adds step value and verifies the new dimension. It iterates until it finds
-    supported value.
+    given starting dimension, and spaced by the given step (see get_fft_dim).
 
     Parameters
     ----------
@@ -93,21 +312,7 @@ def get_opencl_dim(dim, step):
     dim : int
         a dimension that is supported by the opencl library, and closest to the original dimension by n*step
     """
-
-    def is_correct(x):
-        sub = x
-        while sub%2 == 0:
-            sub = sub/2
-        while sub%3 == 0:
-            sub = sub/3
-        while sub%5 == 0:
-            sub = sub/5
-        return sub == 1
-
-    new_dim = dim
-    while not is_correct(new_dim):
-        new_dim += step
-    return new_dim
+    return get_fft_dim(dim, step, 'opencl')
     
 
 def binning(array, binsizes):
@@ -115,6 +320,7 @@ def binning(array, binsizes):
     This function does the binning of the array. The array is binned in each dimension by the corresponding binsizes elements.
     If binsizes list is shorter than the array dimensions, the remaining dimensions are not binned. The elements in
     a bucket are summed.
+    The buckets are accumulated from strided views of the array, so the only arrays allocated are of the binned size.
 
     Parameters
     ----------
@@ -130,22 +336,46 @@ def binning(array, binsizes):
         the binned array
     """
 
-    data_dims = array.shape
-    # trim array 
-    for ax in range(len(binsizes)):
-        cut_slices = range(data_dims[ax] - data_dims[ax] % binsizes[ax], data_dims[ax])
-        array = np.delete(array, cut_slices, ax)
-
+    # sum in the type np.sum would use, so the integer data does not overflow
+    sum_dtype = np.zeros(1, dtype=array.dtype).sum().dtype
     binned_array = array
-    new_shape = list(array.shape)
-
     for ax in range(len(binsizes)):
         if binsizes[ax] > 1:
-            new_shape[ax] = binsizes[ax]
-            new_shape.insert(ax, array.shape[ax] / binsizes[ax])
-            binned_array = np.reshape(binned_array, tuple(new_shape))
-            binned_array = np.sum(binned_array, axis=ax+1)
-            new_shape = list(binned_array.shape)
+            binned_array = bin_axis(binned_array, ax, binsizes[ax], sum_dtype)
+    return binned_array
+
+
+def bin_axis(array, ax, binsize, dtype=None):
+    """
+    This function bins the array along one axis. The elements that do not fill a whole bucket at the end of the axis
+    are dropped.
+
+    Parameters
+    ----------
+    array : array
+        the array to be binned
+
+    ax : int
+        the axis to bin along
+
+    binsize : int
+        number of elements in a bucket
+
+    dtype : dtype
+        type of the binned array, defaults to the type of the array
+
+    Returns
+    -------
+    array : array
+        the binned array
+    """
+    new_dim = array.shape[ax] // binsize
+    index = [slice(None)] * array.ndim
+    index[ax] = slice(0, new_dim * binsize, binsize)
+    binned_array = np.array(array[tuple(index)], dtype=dtype)
+    for i in range(1, binsize):
+        index[ax] = slice(i, new_dim * binsize, binsize)
+        binned_array += array[tuple(index)]
     return binned_array
    
 
@@ -187,11 +417,11 @@ def get_centered(array, center_shift):
 
     return centered    
 
-def zero_pad(array, pad):
+def zero_pad(array, pad, proc='opencl'):
     """
     This function adds to each dimension of the array elements defined by pad. The elements are added to the 
     beginning of array and end by the same number, so the original array is centered. The dimensions of the new array are
-    supported by the opencl library. 
+    supported by the FFT library of the given processor type. 
     
 
     Parameters
@@ -201,21 +431,203 @@ def zero_pad(array, pad):
 
     pad : list
         list of three pad values, for each dimension
+
+    proc : str
+        the processor type, defines dimensions supported by FFT library
         
     Returns
     -------
     array : array
         the padded array
     """
-    # calculate the opencl dimensions
+    # calculate the dimensions supported by FFT library
     dims = array.shape
-    x_dim = get_opencl_dim(dims[0] + 2*pad[0], 2)
-    x_pad = (x_dim - dims[0])/2
-    y_dim = get_opencl_dim(dims[1] + 2*pad[1], 2)
-    y_pad = (y_dim - dims[1])/2
-    z_dim = get_opencl_dim(dims[2] + 2*pad[2], 2)
-    z_pad = (z_dim - dims[2])/2
-    return np.lib.pad(array, ((x_pad, x_pad),(y_pad, y_pad), (z_pad, z_pad)), 'constant', constant_values=((0.0,0.0),(0.0,0.0),(0.0,0.0))).copy()
+    x_dim = get_fft_dim(dims[0] + 2*pad[0], 2, proc)
+    x_pad = (x_dim - dims[0])//2
+    y_dim = get_fft_dim(dims[1] + 2*pad[1], 2, proc)
+    y_pad = (y_dim - dims[1])//2
+    z_dim = get_fft_dim(dims[2] + 2*pad[2], 2, proc)
+    z_pad = (z_dim - dims[2])//2
+    return np.pad(array, ((x_pad, x_pad),(y_pad, y_pad), (z_pad, z_pad)), 'constant', constant_values=((0.0,0.0),(0.0,0.0),(0.0,0.0))).copy()
+
+def center_pad_shift(array, center_shift, pad, proc='opencl'):
+    """
+    This function does the centering, zero padding and fft shift of the array in a single pass. The result is the same
+    as of calling get_centered, zero_pad and scipy.fftpack.fftshift in sequence, but only the resulting array is
+    allocated. The array is copied directly into the shifted position of the result, wrapping around the edges.
+
+    Parameters
+    ----------
+    array : array
+        the original array
+
+    center_shift : list
+        a list defining shift of the center
+
+    pad : list
+        list of three pad values, for each dimension
+
+    proc : str
+        the processor type, defines dimensions supported by FFT library
+
+    Returns
+    -------
+    array : array
+        the centered, padded and shifted array
+    """
+    max_coordinates = np.add(np.unravel_index(np.argmax(array), array.shape), center_shift)
+    shape = array.shape
+    new_shape = []
+    offset = []
+    for ax in range(len(shape)):
+        # find the centered shape that can fit the array with max_coordinate in center
+        if max_coordinates[ax] <= int(shape[ax]/2):
+            centered_dim = 2*(shape[ax] - max_coordinates[ax])
+        else:
+            centered_dim = 2*max_coordinates[ax]
+        shift = int(centered_dim/2) - max_coordinates[ax]
+        # find the padded dimension supported by the FFT library
+        new_dim = get_fft_dim(centered_dim + 2*pad[ax], 2, proc)
+        new_shape.append(new_dim)
+        # fftshift moves the element at index i to (i + new_dim//2) % new_dim
+        offset.append((shift + (new_dim - centered_dim)//2 + new_dim//2) % new_dim)
+
+    shifted = np.zeros(tuple(new_shape), dtype=array.dtype)
+
+    # the array placed at the offset wraps around the end of each axis, so it is copied in up to two pieces per axis
+    pieces = []
+    for ax in range(len(shape)):
+        first = min(shape[ax], new_shape[ax] - offset[ax])
+        ax_pieces = [(slice(0, first), slice(offset[ax], offset[ax] + first))]
+        if first < shape[ax]:
+            ax_pieces.append((slice(first, shape[ax]), slice(0, shape[ax] - first)))
+        pieces.append(ax_pieces)
+    for piece in itertools.product(*pieces):
+        src = tuple(ax_piece[0] for ax_piece in piece)
+        dst = tuple(ax_piece[1] for ax_piece in piece)
+        shifted[dst] = array[src]
+
+    return shifted
+
+
+def crop_reciprocal(data, shape):
+    """
+    This function crops the data in reciprocal space to the given shape around the zero frequency. The data is in the
+    FFT order, i.e. the zero frequency is the first element, as prepared for reconstruction. The cropped data is of
+    lower resolution in direct space, and of the same field of view.
+
+    Parameters
+    ----------
+    data : array
+        the prepared data
+
+    shape : tuple
+        the cropped shape, not greater than shape of the data
+
+    Returns
+    -------
+    array : array
+        the cropped data in the FFT order
+    """
+    centered = np.fft.fftshift(data)
+    start = [dim // 2 - new_dim // 2 for dim, new_dim in zip(data.shape, shape)]
+    cropped = centered[tuple(slice(st, st + new_dim) for st, new_dim in zip(start, shape))]
+    return np.fft.ifftshift(cropped)
+
+
+def upsample_image(image, shape):
+    """
+    This function interpolates the image reconstructed from data cropped by crop_reciprocal to the given shape. The
+    spectrum of the image is zero padded to the shape, so the image is the reconstruction of the cropped data in
+    higher resolution.
+
+    Parameters
+    ----------
+    image : array
+        complex image
+
+    shape : tuple
+        the new shape, not smaller than shape of the image
+
+    Returns
+    -------
+    array : array
+        the interpolated image
+    """
+    spectrum = np.fft.fftshift(np.fft.ifftn(image)) * image.size
+    padded = np.zeros(shape, dtype=spectrum.dtype)
+    start = [new_dim // 2 - dim // 2 for dim, new_dim in zip(image.shape, shape)]
+    padded[tuple(slice(st, st + dim) for st, dim in zip(start, image.shape))] = spectrum
+    return np.fft.fftn(np.fft.ifftshift(padded)) / padded.size
+
+
+def upsample_support(support, shape):
+    """
+    This function resizes the support to the given shape, taking the nearest point of the support for each point of
+    the new array.
+
+    Parameters
+    ----------
+    support : array
+        the support array
+
+    shape : tuple
+        the new shape
+
+    Returns
+    -------
+    array : array
+        the resized support
+    """
+    indexes = [np.minimum((np.arange(new_dim) * dim + new_dim // 2) // new_dim, dim - 1)
+               for dim, new_dim in zip(support.shape, shape)]
+    return support[np.ix_(*indexes)]
+
+
+def get_grid_coords(dims, steps, geometry):
+    """
+    This function returns coordinates of the points of a structured grid transformed by the geometry matrix. The first
+    axis of the grid runs from (dims[0] - 1) * steps[0] down to 0, the other axes run from 0 up. The coordinates are
+    calculated by broadcasting the three axes, so no grid of the axes values is allocated, and are cached for the
+    recently used dimensions, steps and geometry, so the arrays of the same shape share them. The cache keeps at most
+    GRID_COORDS_CACHE_BYTES of coordinates.
+
+    Parameters
+    ----------
+    dims : tuple
+        grid dimensions
+
+    steps : tuple
+        grid steps in each dimension
+
+    geometry : array
+        3x3 matrix transforming the grid coordinates
+
+    Returns
+    -------
+    coords : array
+        array of shape (number of points, 3) with coordinates of the points in C order; it is shared and must not be
+        modified
+    """
+    geometry = np.asarray(geometry, dtype=float)
+    key = (tuple(dims), tuple(steps), geometry.tobytes())
+    with _grid_coords_lock:
+        coords = _grid_coords.pop(key, None)
+    if coords is None:
+        axes = [np.arange(dims[0] - 1, -1, -1) * steps[0], np.arange(dims[1]) * steps[1],
+                np.arange(dims[2]) * steps[2]]
+        coords = np.empty(tuple(dims) + (3,))
+        coords[...] = np.outer(axes[0], geometry[0])[:, None, None, :]
+        coords += np.outer(axes[1], geometry[1])[None, :, None, :]
+        coords += np.outer(axes[2], geometry[2])[None, None, :, :]
+        coords.shape = (-1, 3)
+    with _grid_coords_lock:
+        # the most recently used coordinates are at the end; coordinates larger than the cache are not kept
+        _grid_coords[key] = coords
+        while sum(cached.nbytes for cached in _grid_coords.values()) > GRID_COORDS_CACHE_BYTES:
+            _grid_coords.popitem(last=False)
+    return coords
+
 
 def crop_center(arr, new_size):
     size = arr.shape
@@ -56,6 +56,7 @@ from tvtk.api import tvtk
 import numpy as np
 import math as m
 from traits.api import *
+import src_py.utilities.utils as ut
 
 class DispalyParams:
     """
@@ -242,10 +243,8 @@ def get_coords(dims, geometry):
     dy = 1.0 / dims[0]
     dz = 1.0 / dims[2]
 
-    r = np.mgrid[(dims[1] - 1) * dx:-dx:-dx, 0:dims[0] * dy:dy, 0:dims[2] * dz:dz]
-    r.shape = 3, dims[0] * dims[1] * dims[2]
-    r = r.transpose()
-    return np.dot(r, geometry)
+    # the grid is generated and cached by utils, so the amplitudes and phases files share the coordinates
+    return ut.get_grid_coords((dims[1], dims[0], dims[2]), (dx, dy, dz), geometry)
 
 
 def write_array(sg, filename):
@@ -0,0 +1,92 @@
+import sys
+import types
+import importlib
+import numpy as np
+import pytest
+import src_py.controller
+
+
+class Config:
+    def __init__(self, **params):
+        self.__dict__.update(params)
+
+
+class Writer:
+    def __init__(self):
+        self.writes = []
+
+    def put(self, function, *args):
+        self.writes.append((function, args))
+
+
+@pytest.fixture
+def fake_rec(monkeypatch):
+    # the reconstruction module needs the libraries of the full installation, so it is replaced by a module that
+    # records the calls
+    rec = types.ModuleType('src_py.controller.reconstruction')
+    rec.calls = []
+    rec.read_config = lambda conf: Config(res_dir='/results') if conf == 'res.config' else Config()
+    rec.get_prepared_data = lambda config_map, scan, proc: np.ones((2, 2, 2))
+
+    def run_reconstruction(proc, data, conf, config_map, processes=None, cores=None, checkpoints=True):
+        rec.calls.append((conf, processes, cores, checkpoints))
+        return 'image', 'support', None, [0.5]
+
+    rec.run_reconstruction = run_reconstruction
+    rec.save_results = lambda *args: None
+    monkeypatch.setitem(sys.modules, 'src_py.controller.reconstruction', rec)
+    monkeypatch.setattr(src_py.controller, 'reconstruction', rec, raising=False)
+    return rec
+
+
+@pytest.fixture
+def batch(fake_rec, monkeypatch):
+    module = importlib.import_module('src_py.controller.batch')
+    monkeypatch.setattr(module, 'rec', fake_rec)
+    return module
+
+
+def test_read_manifest_skips_comments_and_empty_lines(batch, tmp_path):
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text('# scans\n/data/scan1.tif  a.config\n\n   \n/data/scan2.tif\tb.config\n')
+    assert batch.read_manifest(str(manifest)) == [('/data/scan1.tif', 'a.config'), ('/data/scan2.tif', 'b.config')]
+
+
+def test_read_manifest_rejects_malformed_line(batch, tmp_path):
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text('/data/scan1.tif\n')
+    with pytest.raises(ValueError):
+        batch.read_manifest(str(manifest))
+
+
+def test_scan_names_are_unique(batch):
+    jobs = [('/a/scan1.tif', 'c'), ('/b/data.tif', 'c'), ('/c/data.tif', 'c'), ('scan2', 'c')]
+    assert batch.get_scan_names(jobs) == ['scan1', 'data_1', 'data_2', 'scan2']
+
+
+def test_scan_dir_is_in_configured_results_directory(batch):
+    assert batch.get_scan_dir(Config(res_dir='/results'), 'scan1') == '/results/scan1'
+    assert batch.get_scan_dir(Config(), 'scan1') == 'scan1'
+
+
+def test_job_results_are_written_to_scan_dir(batch, fake_rec):
+    writer = Writer()
+    prepared = batch._prepare_job('numpy', ('/data/scan1.tif', 'res.config', 'scan1'))
+    result = batch._run_job('numpy', [0, 1], prepared, writer)
+    assert result['failure'] is None
+    assert result['res_dir'] == '/results/scan1'
+    assert result['error'] == 0.5
+    # the starts run in the worker process, on its cores, and the workers sharing the configuration do not write
+    # checkpoints
+    assert fake_rec.calls == [('res.config', 0, [0, 1], False)]
+    function, args = writer.writes[0]
+    assert function is fake_rec.save_results
+    assert args[-1] == '/results/scan1'
+
+
+def test_failed_preparation_is_reported(batch, fake_rec):
+    fake_rec.read_config = lambda conf: None
+    writer = Writer()
+    result = batch._run_job('numpy', None, batch._prepare_job('numpy', ('scan1', 'bad', 'scan1')), writer)
+    assert 'bad' in result['failure']
+    assert writer.writes == []
@@ -0,0 +1,41 @@
+import os
+import pytest
+import src_py.utilities.cpu_resources as cpu
+
+
+def test_cpu_resources_restores_binding_and_variables(monkeypatch):
+    cores = cpu.get_cores()
+    monkeypatch.setenv('OMP_NUM_THREADS', '7')
+    monkeypatch.delenv('MKL_NUM_THREADS', raising=False)
+    with cpu.cpu_resources(cores=cores[:1]) as threads:
+        assert threads == 1
+        assert cpu.get_cores() == cores[:1]
+        assert os.environ['MKL_NUM_THREADS'] == '1'
+    assert cpu.get_cores() == cores
+    assert os.environ['OMP_NUM_THREADS'] == '7'
+    assert 'MKL_NUM_THREADS' not in os.environ
+
+
+def test_cpu_resources_without_settings_changes_nothing(monkeypatch):
+    monkeypatch.delenv('OMP_NUM_THREADS', raising=False)
+    with cpu.cpu_resources() as threads:
+        assert threads == 0
+        assert 'OMP_NUM_THREADS' not in os.environ
+
+
+def test_binding_fails_without_support(monkeypatch):
+    monkeypatch.delattr(os, 'sched_setaffinity')
+    monkeypatch.setattr(cpu, 'psutil', None)
+    with pytest.raises(OSError):
+        cpu.set_cpu_resources(cores=[0])
+
+
+@pytest.mark.parametrize('parts, cores', [(2, [0, 1, 2, 3, 4]), (3, [4, 5]), (1, [3])])
+def test_partition_cores(parts, cores):
+    partitions = cpu.partition_cores(parts, cores)
+    assert len(partitions) == parts
+    if parts <= len(cores):
+        assert sum(partitions, []) == cores
+        assert max(map(len, partitions)) - min(map(len, partitions)) <= 1
+    else:
+        assert all(len(part) == 1 for part in partitions)
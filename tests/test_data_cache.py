@@ -0,0 +1,75 @@
+import os
+import errno
+import numpy as np
+import pytest
+import src_py.utilities.data_cache as dc
+
+
+class Config:
+    def __init__(self, **params):
+        self.__dict__.update(params)
+
+
+@pytest.fixture
+def raw_file(tmp_path):
+    filename = str(tmp_path / 'raw.tif')
+    with open(filename, 'wb') as f:
+        f.write(b'raw data')
+    return filename
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return dc.PreparedDataCache(str(tmp_path / 'cache'), 1 << 20)
+
+
+def test_key_depends_on_content_parameters_and_version(cache, raw_file, tmp_path, monkeypatch):
+    key = cache.get_key(raw_file, Config(binning=[1, 1, 1]), (2, 3, 5))
+    assert cache.get_key(raw_file, Config(binning=(1, 1, 1), res_dir='x'), (2, 3, 5)) == key
+    assert cache.get_key(raw_file, Config(binning=[2, 1, 1]), (2, 3, 5)) != key
+    assert cache.get_key(raw_file, Config(binning=[1, 1, 1]), (2, 3, 5, 7)) != key
+    other_file = str(tmp_path / 'other.tif')
+    with open(other_file, 'wb') as f:
+        f.write(b'other data')
+    assert cache.get_key(other_file, Config(binning=[1, 1, 1]), (2, 3, 5)) != key
+    monkeypatch.setattr(dc, 'PREPARATION_VERSION', dc.PREPARATION_VERSION + 1)
+    assert cache.get_key(raw_file, Config(binning=[1, 1, 1]), (2, 3, 5)) != key
+
+
+def test_get_returns_stored_data(cache):
+    data = np.arange(24, dtype=np.float32).reshape(2, 3, 4)
+    assert cache.get('key') is None
+    cache.put('key', data)
+    cached = cache.get('key')
+    assert np.array_equal(cached, data)
+    assert not cached.flags.writeable
+
+
+def test_put_removes_temporary_file_on_failure(cache, monkeypatch):
+    def fail(f, data):
+        raise IOError(errno.ENOSPC, 'no space left')
+    monkeypatch.setattr(dc.np, 'save', fail)
+    with pytest.raises(IOError):
+        cache.put('key', np.zeros(10))
+    assert os.listdir(cache.cache_dir) == []
+
+
+def test_evict_removes_least_recently_used(cache):
+    data = np.zeros(1000, dtype=np.float64)
+    for i, key in enumerate(('a', 'b', 'c')):
+        cache.put(key, data)
+        os.utime(cache._get_filename(key), (1000 + i, 1000 + i))
+    # the files are a bit larger than the data, so only two of them fit
+    cache.max_size = 2 * os.path.getsize(cache._get_filename('a')) + 100
+    os.utime(cache._get_filename('a'), (2000, 2000))
+    cache.evict()
+    assert sorted(os.listdir(cache.cache_dir)) == ['a.npy', 'c.npy']
+
+
+def test_evict_skips_files_removed_by_another_process(cache, monkeypatch):
+    cache.put('a', np.zeros(1000))
+    listdir = os.listdir
+    monkeypatch.setattr(dc.os, 'listdir', lambda path: listdir(path) + ['removed.npy'])
+    cache.max_size = 0
+    cache.evict()
+    assert listdir(cache.cache_dir) == []
@@ -0,0 +1,74 @@
+import sys
+import types
+import importlib
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def fm(monkeypatch):
+    # the configuration parser is not needed by the tested methods
+    monkeypatch.setitem(sys.modules, 'pylibconfig2', types.ModuleType('pylibconfig2'))
+    return importlib.import_module('src_py.controller.fast_module_numpy')
+
+
+class FakeReconstruction:
+    def __init__(self, data, guess, params, workers, progress):
+        self.checkpoints = True
+
+    def init(self, support=None):
+        pass
+
+    def iterate(self):
+        pass
+
+
+def test_set_checkpoints_disables_checkpoints_of_single_runs(fm, monkeypatch):
+    monkeypatch.setattr(fm, 'Reconstruction', FakeReconstruction)
+    monkeypatch.setattr(fm.PyBridge, '_get_params', lambda self, dims, config: None)
+    bridge = fm.PyBridge(1)
+    data = np.ones(8, dtype=fm.d_type)
+    bridge.start_calc_with_seed(data, (2, 2, 2), 'config', 1)
+    assert bridge.rec.checkpoints
+    bridge.set_checkpoints(False)
+    bridge.start_calc_with_seed(data, (2, 2, 2), 'config', 1)
+    assert not bridge.rec.checkpoints
+
+
+@pytest.mark.parametrize('shape, dtype', [((2, 2, 3), np.complex64), ((2, 2, 2), np.complex128)])
+def test_load_checkpoint_rejects_other_data(fm, tmp_path, shape, dtype):
+    rec = fm.Reconstruction.__new__(fm.Reconstruction)
+    rec.ds_image = np.zeros((2, 2, 2), dtype=np.complex64, order='F')
+    filename = str(tmp_path / 'checkpoint.npz')
+    with open(filename, 'wb') as f:
+        np.savez(f, image=np.zeros(shape, dtype=dtype))
+    with pytest.raises(ValueError):
+        rec.load_checkpoint(filename)
+
+
+class Config:
+    def __init__(self, **params):
+        self.__dict__.update(params)
+
+
+CONFIG = dict(algorithm_sequence=((1, ('ER', 4), ('HIO', 4)),), support_area=(4, 4, 4), support_type='GAUSS',
+              support_threshold=0.1, support_sigma=1, support_triggers=((1, 3),), avg_iterations=2, error_batch=2)
+
+
+def test_unknown_precision_is_rejected(fm):
+    with pytest.raises(ValueError):
+        fm.PyBridge(1, precision='half')
+
+
+@pytest.mark.parametrize('precision, dtype', [('float', np.float32), ('double', np.float64), ('mixed', np.float32)])
+def test_reconstruction_runs_in_bridge_precision(fm, monkeypatch, precision, dtype):
+    monkeypatch.setattr(fm.PyBridge, '_get_params',
+                        lambda self, dims, config: fm.Params(Config(precision=precision, **CONFIG), dims, self.d_type))
+    bridge = fm.PyBridge(1, precision=precision)
+    assert bridge.d_type == dtype
+    data = np.abs(np.fft.fftn(np.pad(np.ones((4, 4, 4)), 2)))
+    bridge.start_calc_with_seed(data.ravel(order='F'), (8, 8, 8), 'config', 1)
+    assert bridge.rec.ds_image.dtype == np.result_type(dtype, np.complex64)
+    assert bridge.rec.support.distribution.dtype == (np.float64 if precision != 'float' else dtype)
+    assert bridge.get_image_r().dtype == dtype
+    assert len(bridge.get_errors()) == 8
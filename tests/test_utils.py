@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+import src_py.utilities.utils as ut
+
+
+def next_supported(dim, step, primes):
+    while not ut.is_dim_supported(dim, primes):
+        dim += step
+    return dim
+
+
+@pytest.mark.parametrize('proc', ['cpu', 'opencl', 'cuda', 'numpy'])
+@pytest.mark.parametrize('step', [1, 2])
+def test_get_fft_dim_is_next_supported_dimension(proc, step):
+    primes = ut.FFT_PRIMES[proc]
+    for dim in range(1, 1100):
+        assert ut.get_fft_dim(dim, step, proc) == next_supported(dim, step, primes)
+
+
+def test_get_fft_dim_keeps_supported_dimensions():
+    for dim in (50, 64, 160, 250, 320, 500, 640, 1000):
+        assert ut.get_fft_dim(dim, 2, 'opencl') == dim
+
+
+def test_get_fft_dim_examples():
+    assert ut.get_fft_dim(97, 1, 'opencl') == 100
+    assert ut.get_fft_dim(97, 1, 'cpu') == 98
+    assert ut.get_fft_dim(66, 2, 'opencl') == 72
+    assert ut.get_fft_dim(65, 2, 'opencl') == 75
+
+
+def test_get_fft_dim_beyond_table():
+    dim = ut.SMOOTH_LIMIT + 1
+    assert ut.get_fft_dim(dim, 1, 'opencl') == next_supported(dim, 1, ut.FFT_PRIMES['opencl'])
+
+
+def reference_binning(array, binsizes):
+    # the binning by trimming, reshaping and summing, as done before the strided accumulation
+    data_dims = array.shape
+    for ax in range(len(binsizes)):
+        cut_slices = range(data_dims[ax] - data_dims[ax] % binsizes[ax], data_dims[ax])
+        array = np.delete(array, cut_slices, ax)
+    binned_array = array
+    new_shape = list(array.shape)
+    for ax in range(len(binsizes)):
+        if binsizes[ax] > 1:
+            new_shape[ax] = binsizes[ax]
+            new_shape.insert(ax, array.shape[ax] // binsizes[ax])
+            binned_array = np.reshape(binned_array, tuple(new_shape))
+            binned_array = np.sum(binned_array, axis=ax + 1)
+            new_shape = list(binned_array.shape)
+    return binned_array
+
+
+@pytest.mark.parametrize('binsizes', [[1, 1, 1], [2, 1, 1], [2, 3, 1], [3, 2, 4], [2, 2]])
+@pytest.mark.parametrize('dtype', [np.uint16, np.float32])
+def test_binning_matches_reshape_and_sum(binsizes, dtype):
+    array = np.random.RandomState(0).randint(0, 60000, (13, 10, 9)).astype(dtype)
+    binned = ut.binning(array, binsizes)
+    expected = reference_binning(array, binsizes)
+    assert binned.shape == expected.shape
+    assert binned.dtype == expected.dtype
+    assert np.allclose(binned, expected)
+
+
+@pytest.mark.parametrize('shape', [(20, 17, 12), (9, 14, 21)])
+@pytest.mark.parametrize('center_shift', [[0, 0, 0], [1, -2, 3]])
+@pytest.mark.parametrize('pad', [[0, 0, 0], [3, 5, 1]])
+@pytest.mark.parametrize('proc', ['opencl', 'cpu'])
+def test_center_pad_shift_matches_separate_steps(shape, center_shift, pad, proc):
+    random = np.random.RandomState(1)
+    array = random.random_sample(shape).astype(np.float32)
+    array[random.randint(shape[0]), random.randint(shape[1]), random.randint(shape[2])] = 2
+    expected = np.fft.fftshift(ut.zero_pad(ut.get_centered(array, center_shift), pad, proc))
+    result = ut.center_pad_shift(array, center_shift, pad, proc)
+    assert result.shape == expected.shape
+    assert np.array_equal(result, expected)
+
+
+@pytest.mark.parametrize('dims, steps', [((4, 5, 6), (1.0, 1.0, 1.0)), ((3, 2, 7), (0.5, 2.0, 1.5))])
+def test_get_grid_coords_matches_mgrid(dims, steps):
+    geometry = np.array([[1.0, 0.2, 0.0], [0.1, 0.9, 0.3], [0.0, -0.4, 1.1]])
+    dx, dy, dz = steps
+    r = np.mgrid[(dims[0] - 1) * dx:-dx:-dx, 0:dims[1] * dy:dy, 0:dims[2] * dz:dz]
+    r.shape = 3, dims[0] * dims[1] * dims[2]
+    assert np.allclose(ut.get_grid_coords(dims, steps, geometry), np.dot(r.transpose(), geometry))
+
+
+def test_get_grid_coords_cache_is_limited_by_bytes(monkeypatch):
+    monkeypatch.setattr(ut, '_grid_coords', ut.collections.OrderedDict())
+    # one grid of 4 * 5 * 6 points fits, two do not
+    monkeypatch.setattr(ut, 'GRID_COORDS_CACHE_BYTES', 4 * 5 * 6 * 3 * 8)
+    coords = ut.get_grid_coords((4, 5, 6), (1, 1, 1), np.eye(3))
+    assert ut.get_grid_coords((4, 5, 6), (1, 1, 1), np.eye(3)) is coords
+    ut.get_grid_coords((4, 5, 6), (2, 1, 1), np.eye(3))
+    assert len(ut._grid_coords) == 1
+    assert ut.get_grid_coords((4, 5, 6), (1, 1, 1), np.eye(3)) is not coords
+    ut.get_grid_coords((40, 50, 60), (1, 1, 1), np.eye(3))
+    assert len(ut._grid_coords) == 0